@@ -0,0 +1,113 @@
+"""
+AivkCache 与各模块自行在 fs.cache 下按键保存文件的对比
+  put / get     ENTRIES 个 4 KiB 条目的写入与读取（每次一个协程调用）
+  disk          MODULES 个模块缓存相同内容时的磁盘占用
+  startup       重启后得到缓存总大小：打开索引 vs 扫描目录
+  large read    读取 64 MiB 条目的前 4 KiB：mmap vs 整个读入
+
+运行：python benchmarks/bench_cache.py
+"""
+import asyncio
+import os
+from pathlib import Path
+import tempfile
+import time
+
+from aivk.base import AivkCache, AivkFS, AivkRoot
+
+ENTRIES = 2000
+MODULES = 4
+SIZE = 4096
+
+
+def walk_size(path: Path) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+async def naive(root: Path) -> dict[str, float]:
+    """
+    各模块在自己的 fs.cache 下按键保存文件
+    """
+    result: dict[str, float] = {}
+    start = time.perf_counter()
+    for m in range(MODULES):
+        cache = AivkFS.getFS(f"mod{m}").cache
+        cache.mkdir(parents=True, exist_ok=True)
+        for i in range(ENTRIES):
+            await asyncio.to_thread((cache / f"k{i}").write_bytes, i.to_bytes(4, "big") * (SIZE // 4))
+    result["put"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(ENTRIES):
+        await asyncio.to_thread((AivkFS.getFS("mod0").cache / f"k{i}").read_bytes)
+    result["get"] = time.perf_counter() - start
+    result["disk"] = walk_size(root / "home")
+    start = time.perf_counter()
+    walk_size(root / "home")
+    result["startup"] = time.perf_counter() - start
+    return result
+
+
+async def store(root: Path) -> dict[str, float]:
+    result: dict[str, float] = {}
+    start = time.perf_counter()
+    for m in range(MODULES):
+        cache = AivkFS.getFS(f"mod{m}").blobs
+        for i in range(ENTRIES):
+            await cache.put(f"k{i}", i.to_bytes(4, "big") * (SIZE // 4))
+    result["put"] = time.perf_counter() - start
+    cache = AivkFS.getFS("mod0").blobs
+    start = time.perf_counter()
+    for i in range(ENTRIES):
+        await cache.get(f"k{i}")
+    result["get"] = time.perf_counter() - start
+    result["disk"] = walk_size(root / "cache")
+    await AivkRoot.current().close()
+    start = time.perf_counter()
+    await AivkFS.getFS("mod0").blobs.usage()
+    result["startup"] = time.perf_counter() - start
+    return result
+
+
+async def large(root: Path) -> tuple[float, float]:
+    data = os.urandom(64 * 1024 ** 2)
+    cache = AivkFS.getFS("big").blobs
+    await cache.put("big", data)
+    path = AivkFS.getFS("big").cache / "big"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    start = time.perf_counter()
+    for _ in range(20):
+        view = await cache.get("big")
+        assert view is not None
+        bytes(view[:4096])
+        if isinstance(view, memoryview):
+            view.release()
+    mapped = (time.perf_counter() - start) / 20
+    start = time.perf_counter()
+    for _ in range(20):
+        (await asyncio.to_thread(path.read_bytes))[:4096]
+    full = (time.perf_counter() - start) / 20
+    return mapped, full
+
+
+def main() -> None:
+    results = {}
+    for name, bench in (("fs.cache files", naive), ("AivkCache", store)):
+        with tempfile.TemporaryDirectory() as tmp:
+            AivkFS.root = Path(tmp)
+            AivkFS.fs.clear()
+            results[name] = asyncio.run(bench(Path(tmp)))
+    print(f"{ENTRIES} entries x {MODULES} modules, {SIZE} bytes each")
+    print(f"{'':<16} {'put (ms)':>9} {'get (ms)':>9} {'disk (MB)':>10} {'startup (ms)':>13}")
+    for name, r in results.items():
+        print(f"{name:<16} {r['put'] * 1e3:>9.1f} {r['get'] * 1e3:>9.1f} {r['disk'] / 2**20:>10.1f} {r['startup'] * 1e3:>13.2f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        AivkFS.root = Path(tmp)
+        AivkFS.fs.clear()
+        mapped, full = asyncio.run(large(Path(tmp)))
+    print(f"64 MiB entry, first 4 KiB: mmap {mapped * 1e3:.2f} ms, read_bytes {full * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+配置编解码器吞吐量基准
+对每个已注册且可用的实现测量 encode / decode / validate 的 MB/s
+
+运行：python benchmarks/bench_codecs.py
+"""
+from bench_load import bench, make_document
+
+from aivk.config import AivkCodec, AivkConfigV1
+
+
+def main() -> None:
+    doc = make_document(1 << 20)
+    model = AivkConfigV1.model_validate(doc)
+    data = model.model_dump()
+
+    print(f"{'codec':<18} {'size':>8} {'encode MB/s':>12} {'decode MB/s':>12} {'validate MB/s':>14}")
+    for suffix, implementations in AivkCodec.implementations.items():
+        for name, implementation in implementations.items():
+            try:
+                codec = implementation()
+            except ImportError:
+                print(f"{suffix + ':' + name:<18} {'(未安装)':>8}")
+                continue
+            raw = codec.encode(data)
+            mb = len(raw) / 1e6
+            encode_t = bench(lambda: codec.encode(data))
+            decode_t = bench(lambda: codec.decode(raw))
+            validate_t = bench(lambda: codec.validate(AivkConfigV1, raw))
+            print(f"{suffix + ':' + name:<18} {mb:>7.2f}M {mb / encode_t:>12.1f} {mb / decode_t:>12.1f} {mb / validate_t:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+AivkFS.ctx 启动耗时
+cold     首次启动：创建虚拟环境（没有 uv 时回退到 venv 模块）
+warm     新进程再次启动：标记有效，跳过创建，首次激活
+re-enter 同一进程内再次进入：重放激活记录
+每种情况都在新的子进程中测量（re-enter 除外），包含解释器与 aivk 的导入时间
+
+运行：python benchmarks/bench_ctx.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = """
+import asyncio, time
+from aivk.base import AivkFS
+
+async def main():
+    start = time.perf_counter()
+    async with AivkFS.ctx():
+        pass
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    async with AivkFS.ctx():
+        pass
+    print(first, time.perf_counter() - start)
+
+asyncio.run(main())
+"""
+
+
+def run(root: str) -> tuple[float, float, float]:
+    env = dict(os.environ, AIVK_ROOT=root)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", SCRIPT], env=env, check=True, capture_output=True, text=True).stdout
+    total = time.perf_counter() - start
+    first, reenter = map(float, out.split())
+    return total, first, reenter
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as root:
+        print(f"{'case':<10} {'process (ms)':>13} {'ctx (ms)':>10}")
+        total, first, reenter = run(root)
+        print(f"{'cold':<10} {total * 1e3:>13.1f} {first * 1e3:>10.1f}")
+        total, first, _ = min(run(root) for _ in range(3))
+        print(f"{'warm':<10} {total * 1e3:>13.1f} {first * 1e3:>10.1f}")
+        print(f"{'re-enter':<10} {'':>13} {reenter * 1e3:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+AivkEnvs 为 N 个模块准备虚拟环境的耗时与磁盘占用
+每个模块安装同一组合成的 wheel（纯 Python 包，文件数与大小接近常见依赖）
+copy      每个环境各自复制一份（相当于逐个 pip install）
+hardlink  共享存储 + 硬链接
+耗时包含创建虚拟环境（--without-pip）
+
+运行：python benchmarks/bench_envs.py
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+import zipfile
+
+from aivk.base import AivkEnvs, AivkFS
+
+MODULES = 8
+WHEELS = 4
+FILES = 150  # 每个 wheel 的文件数
+SIZE = 16 * 1024  # 平均文件大小（字节）
+
+
+def make_wheels(root: Path) -> list[Path]:
+    rng = random.Random(0)
+    wheels = []
+    for w in range(WHEELS):
+        name = f"pkg{w}"
+        wheel = root / f"{name}-1.0-py3-none-any.whl"
+        with zipfile.ZipFile(wheel, "w") as zf:
+            for f in range(FILES):
+                zf.writestr(f"{name}/m{f}.py", rng.randbytes(rng.randint(SIZE // 2, SIZE * 3 // 2)))
+            zf.writestr(f"{name}-1.0.dist-info/METADATA", f"Name: {name}\nVersion: 1.0\n")
+        wheels.append(wheel)
+    return wheels
+
+
+async def provision(root: Path, mode: str, wheels: list[Path]) -> tuple[float, dict[str, int]]:
+    AivkFS.root = root
+    AivkFS.fs.clear()
+    AivkFS._venv_ready.clear()
+    AivkEnvs.link_mode = mode  # type: ignore[assignment]
+    start = time.perf_counter()
+    results = await AivkEnvs.provisionAll({f"mod{i}": wheels for i in range(MODULES)})
+    elapsed = time.perf_counter() - start
+    assert all(isinstance(v, Path) for v in results.values()), results
+    return elapsed, AivkEnvs.footprint()
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        wheels = make_wheels(Path(tmp))
+        print(f"{MODULES} modules x {WHEELS} wheels x {FILES} files")
+        print(f"{'mode':<10} {'time (ms)':>10} {'apparent (MB)':>14} {'on disk (MB)':>13}")
+        for mode in ("copy", "hardlink"):
+            root = Path(tmp) / mode
+            elapsed, usage = asyncio.run(provision(root, mode, wheels))
+            print(f"{mode:<10} {elapsed * 1e3:>10.1f} {usage['apparent'] / 2**20:>14.1f} {usage['actual'] / 2**20:>13.1f}")
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("AIVK_ROOT", tempfile.gettempdir())
+    main()
@@ -0,0 +1,56 @@
+"""
+配置保存的 fsync 策略开销
+对同一个小配置连续保存 N 次，比较原先的直接覆盖写与 never / always / batch 三种原子写入
+
+运行：python benchmarks/bench_fsync.py
+"""
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import aiofiles
+
+from aivk.base import AivkFS
+from aivk.config import AivkConfig, AivkConfigBase
+from aivk.config.atomic import AivkAtomicWriter
+
+N = 200
+
+
+async def overwrite(path: Path, data: dict) -> None:
+    # 原先的写法：直接以 'w' 打开目标文件
+    async with aiofiles.open(path, 'w', encoding='utf-8') as f:
+        await f.write(json.dumps(data, ensure_ascii=False, indent=4))
+
+
+async def run(mode: str) -> float:
+    config = await AivkConfig.getConfig(tree=f"bench.{mode}", default={"counter": 0, "name": "bench"})
+    start = time.perf_counter()
+    for i in range(N):
+        config.counter = i
+        if mode == "overwrite":
+            await overwrite(config.path, config.model_dump())
+        else:
+            await config.save()
+    # batch 模式把最后一轮 fsync 计入
+    await AivkConfigBase.flushAll()
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    # fsync 的开销取决于文件系统，可用 TMPDIR 指向真实磁盘
+    with tempfile.TemporaryDirectory() as tmp:
+        AivkFS.root = Path(tmp)
+        print(f"{'mode':<10} {'saves':>6} {'total (ms)':>11} {'per save (ms)':>14} {'fsyncs':>7}")
+        for mode in ("overwrite", "never", "always", "batch"):
+            if mode != "overwrite":
+                AivkAtomicWriter.configure(mode, interval=0.05)  # type: ignore[arg-type]
+            AivkAtomicWriter.stats.clear()
+            elapsed = await run(mode)
+            print(f"{mode:<10} {N:>6} {elapsed * 1e3:>11.1f} {elapsed / N * 1e3:>14.3f} {AivkAtomicWriter.stats['fsyncs']:>7}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
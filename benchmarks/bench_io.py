@@ -0,0 +1,49 @@
+"""
+启动时批量加载配置的 I/O 基准
+500 个小配置文件并发读取：aiofiles（每个 open / read / close 各一次默认 executor 切换）
+与 AivkIO.read（专用线程池，一次切换）比较，并输出线程池指标
+
+运行：python benchmarks/bench_io.py
+"""
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import aiofiles
+
+from aivk.base import AivkIO
+
+N = 500
+
+
+async def read_aiofiles(path: Path) -> bytes:
+    async with aiofiles.open(path, 'rb') as f:
+        return await f.read()
+
+
+async def burst(read, paths: list[Path]) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(read(path) for path in paths))
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(N):
+            path = Path(tmp) / f"mod{i}" / "config.json"
+            path.parent.mkdir()
+            path.write_text(json.dumps({"id": f"mod{i}", "level": i, "tags": ["a", "b"]}), encoding="utf-8")
+            paths.append(path)
+
+        print(f"{'reader':<10} {'files':>6} {'best (ms)':>10}")
+        for name, read in (("aiofiles", read_aiofiles), ("AivkIO", AivkIO.read)):
+            best = min([await burst(read, paths) for _ in range(5)])
+            print(f"{name:<10} {N:>6} {best * 1e3:>10.1f}")
+        print(AivkIO.metrics())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
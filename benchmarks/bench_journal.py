@@ -0,0 +1,45 @@
+"""
+journal 格式的小修改保存基准
+对不同大小的配置连续更新计数器 N 次，比较 json（整体重写）与 journal（只追加变化的键）
+
+运行：python benchmarks/bench_journal.py
+"""
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from bench_load import make_document
+
+from aivk.base import AivkFS
+from aivk.config import AivkConfig
+from aivk.config.journal import AivkJournal
+
+N = 500
+
+
+async def run(tree: str, format: str, doc: dict) -> float:
+    config = await AivkConfig.getConfig(tree=tree, format=format, default=dict(doc, counter=0))
+    start = time.perf_counter()
+    for i in range(N):
+        config.counter = i
+        await config.save()
+    await AivkJournal.drain()
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        AivkFS.root = Path(tmp)
+        print(f"{'size':>8} {'json (ms/save)':>15} {'journal (ms/save)':>18} {'speedup':>8} {'compactions':>12}")
+        for size in (4 << 10, 64 << 10, 512 << 10):
+            doc = make_document(size)
+            AivkJournal.stats.clear()
+            json_t = await run(f"bench.json{size}", "json", doc)
+            journal_t = await run(f"bench.journal{size}", "journal", doc)
+            print(f"{size >> 10:>7}K {json_t / N * 1e3:>15.3f} {journal_t / N * 1e3:>18.3f} "
+                  f"{json_t / journal_t:>7.1f}x {AivkJournal.stats['compactions']:>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+AivkConfigV1.load 解析 + 验证基准
+比较旧路径（json.loads / toml.loads -> model_validate）与当前的单次解析路径
+
+运行：python benchmarks/bench_load.py
+"""
+import asyncio
+import json
+import tempfile
+import time
+import tomllib
+from pathlib import Path
+from typing import Any, Callable
+
+import toml
+
+from aivk.config import AivkConfigV1
+
+
+def make_document(size: int) -> dict[str, Any]:
+    """
+    生成约 size 字节的配置文档
+    """
+    doc: dict[str, Any] = {}
+    i = 0
+    while len(json.dumps(doc)) < size:
+        doc[f"section{i}"] = {
+            "name": f"module-{i}",
+            "enabled": i % 2 == 0,
+            "level": i,
+            "ratio": i / 7,
+            "tags": [f"tag{j}" for j in range(8)],
+            "nested": {"host": "localhost", "port": 8000 + i, "paths": [f"/srv/{i}/{j}" for j in range(4)]},
+        }
+        i += 1
+    return doc
+
+
+def bench(fn: Callable[[], Any], repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    validator = AivkConfigV1.__pydantic_validator__
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        print(f"{'format':<6} {'size':>8} {'old (ms)':>10} {'new (ms)':>10} {'speedup':>8} {'load() (ms)':>12}")
+        for size in (1 << 20, 4 << 20):
+            doc = make_document(size)
+            json_path = root / f"bench{size}.json"
+            toml_path = root / f"bench{size}.toml"
+            json_path.write_text(json.dumps(doc, ensure_ascii=False, indent=4), encoding="utf-8")
+            toml_path.write_text(toml.dumps(doc), encoding="utf-8")
+            json_raw = json_path.read_bytes()
+            toml_raw = toml_path.read_bytes()
+
+            # 只比较解析 + 验证；load() 一列为完整加载（含读文件与脏检查快照）
+            cases = [
+                ("json", json_path,
+                 lambda: AivkConfigV1.model_validate(json.loads(json_raw.decode("utf-8"))),
+                 lambda: validator.validate_json(json_raw)),
+                ("toml", toml_path,
+                 lambda: AivkConfigV1.model_validate(toml.loads(toml_raw.decode("utf-8"))),
+                 lambda: validator.validate_python(tomllib.loads(toml_raw.decode("utf-8")))),
+            ]
+            for fmt, path, old, new in cases:
+                old_t, new_t = bench(old), bench(new)
+                load_t = bench(lambda p=path: asyncio.run(AivkConfigV1.load(p, {})), repeat=3)
+                print(f"{fmt:<6} {path.stat().st_size / 1e6:>7.1f}M {old_t * 1e3:>10.1f} {new_t * 1e3:>10.1f} "
+                      f"{old_t / new_t:>7.1f}x {load_t * 1e3:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
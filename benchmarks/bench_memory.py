@@ -0,0 +1,64 @@
+"""
+大量配置的内存占用基准
+以 tracemalloc 统计 N 个按租户划分的配置（键集合相同、默认配置相同）占用的内存：
+AivkConfigV1（完整 pydantic 模型）与 AivkCompactConfig
+
+运行：python benchmarks/bench_memory.py
+"""
+import gc
+import json
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+from aivk.config import AivkCompactConfig, AivkConfigV1
+
+DEFAULT = {"enabled": True, "quota": 100, "region": "default", "features": {"beta": False, "limits": {"rps": 10}}}
+
+
+def document(i: int) -> bytes:
+    return json.dumps({
+        "tenant": f"tenant-{i}",
+        "enabled": i % 3 != 0,
+        "quota": 100 + i % 50,
+        "region": ["eu", "us", "ap"][i % 3],
+        "owner": f"owner{i}@example.com",
+        "features": {"beta": i % 2 == 0, "limits": {"rps": 10 + i % 7, "burst": 20}},
+        "tags": ["a", "b"],
+    }).encode()
+
+
+def measure(n: int, build: Callable[[int, bytes], Any]) -> float:
+    raws = [document(i) for i in range(n)]
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    configs = [build(i, raw) for i, raw in enumerate(raws)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del configs
+    return used
+
+
+def full(i: int, raw: bytes) -> AivkConfigV1:
+    # 与 AivkConfigV1.load 相同的构建过程（验证 + 设置私有属性 + 脏检查快照）
+    config = AivkConfigV1.__pydantic_validator__.validate_json(raw)
+    return AivkConfigV1._loaded(config, dict(DEFAULT), "json", Path(f"/aivk/home/t{i}/etc/tenant.json"))
+
+
+def compact(i: int, raw: bytes) -> AivkCompactConfig:
+    return AivkCompactConfig(json.loads(raw), f"/aivk/home/t{i}/etc/tenant.json", "json", DEFAULT)
+
+
+def main() -> None:
+    print(f"{'configs':>8} {'AivkConfigV1 (MB)':>18} {'compact (MB)':>13} {'B/config':>16} {'ratio':>6}")
+    for n in (1_000, 10_000, 50_000):
+        full_b = measure(n, full)
+        compact_b = measure(n, compact)
+        print(f"{n:>8} {full_b / 1e6:>18.1f} {compact_b / 1e6:>13.1f} "
+              f"{full_b / n:>7.0f} -> {compact_b / n:>5.0f} {full_b / compact_b:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+多个根目录（租户）的内存占用：一个进程服务 N 个根目录 vs 每个根目录一个进程
+每个根目录加载 5 个 json 配置与 1 个 sqlite-kv 配置
+内存为各进程常驻内存（VmRSS）之和
+
+运行：python benchmarks/bench_roots.py [N]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = """
+import asyncio, sys
+from pathlib import Path
+from aivk.base import AivkRoot
+from aivk.config import AivkConfig
+
+async def tenant(path):
+    with AivkRoot.get(path).use():
+        for i in range(5):
+            await AivkConfig.getConfig(tree=f"app.c{i}", default={"tenant": str(path), "i": i})
+        await AivkConfig.getConfig(tree="app.kv", default={"tenant": str(path)}, format="sqlite-kv")
+
+async def main():
+    await asyncio.gather(*(tenant(Path(p)) for p in sys.argv[1:]))
+    rss = next(line for line in open("/proc/self/status") if line.startswith("VmRSS")).split()[1]
+    print(rss)
+    for p in sys.argv[1:]:
+        await AivkRoot.get(p).close()
+
+asyncio.run(main())
+"""
+
+
+def run(*roots: str) -> int:
+    out = subprocess.run([sys.executable, "-c", SCRIPT, *roots], check=True, capture_output=True, text=True).stdout
+    return int(out.split()[-1]) * 1024
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        roots = [os.path.join(tmp, f"tenant{i}") for i in range(n)]
+        start = time.perf_counter()
+        shared = run(*roots)
+        shared_time = time.perf_counter() - start
+        start = time.perf_counter()
+        separate = sum(run(root) for root in roots)
+        separate_time = time.perf_counter() - start
+    print(f"{n} roots")
+    print(f"{'layout':<20} {'RSS (MB)':>9} {'time (s)':>9}")
+    print(f"{'one process':<20} {shared / 2**20:>9.1f} {shared_time:>9.2f}")
+    print(f"{'process per root':<20} {separate / 2**20:>9.1f} {separate_time:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+启动快照的冷启动基准
+为 N 个模块各生成一个配置文件（AivkFS.root/home/<id>/etc/config.json），
+比较逐个读取文件与从启动快照加载的耗时
+
+运行：python benchmarks/bench_snapshot.py
+"""
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from bench_load import make_document
+
+from aivk.base import AivkFS
+from aivk.config import AivkConfig, AivkConfigBase, AivkLifecycle, AivkSnapshot
+
+
+async def cold_start(trees: list[str]) -> float:
+    # 模拟新进程：清空配置缓存、存活配置与内存中的快照
+    AivkConfig.config_dict.clear()
+    AivkLifecycle.live.clear()
+    AivkSnapshot.reset()
+    start = time.perf_counter()
+    await AivkConfig.getConfigs(trees)
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    print(f"{'modules':>8} {'files (ms)':>11} {'snapshot (ms)':>14} {'speedup':>8}")
+    for n in (100, 300, 500):
+        with tempfile.TemporaryDirectory() as tmp:
+            AivkFS.root = Path(tmp)
+            AivkFS.fs.clear()
+            trees = [f"mod{i}.config" for i in range(n)]
+            doc = make_document(2048)
+            await AivkConfig.getConfigs(trees, defaults={tree: doc for tree in trees})
+
+            AivkSnapshot.disable()
+            files = min([await cold_start(trees) for _ in range(5)])
+
+            AivkSnapshot.enable()
+            await cold_start(trees)
+            await AivkConfigBase.flushAll()  # 写入快照
+            snapshot = min([await cold_start(trees) for _ in range(5)])
+            assert AivkSnapshot.stats["hits"] == n
+            AivkSnapshot.disable()
+
+            print(f"{n:>8} {files * 1e3:>11.1f} {snapshot * 1e3:>14.1f} {files / snapshot:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
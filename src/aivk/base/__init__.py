@@ -1,7 +1,15 @@
+from .root import AivkRoot
 from .fs import AivkFS
 from .aivkmod import AivkMod
+from .io import AivkIO
+from .cache import AivkCache
+from .envs import AivkEnvs
 
 __all__ = [
+    "AivkRoot",
     "AivkFS",
     "AivkMod",
+    "AivkIO",
+    "AivkCache",
+    "AivkEnvs",
 ]
\ No newline at end of file
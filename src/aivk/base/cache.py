@@ -0,0 +1,344 @@
+"""
+按内容寻址的缓存存储
+各模块通过 AivkFS.getFS(id).blobs 按键读写缓存，内容相同的数据只保存一份：
+    <root>/cache/objects/<sha256[:2]>/<sha256>   数据（只读）
+    <root>/cache/index.db                         索引：模块、键 -> 内容哈希、大小、最近访问时间
+索引保存在 SQLite 中，重启后不需要扫描目录
+超出模块预算或全局预算时按最近最少使用淘汰；大的条目以 mmap 方式读取
+同一根目录的写入应来自同一进程（预算统计保存在进程内）
+"""
+from __future__ import annotations
+
+from collections import Counter
+import hashlib
+import mmap
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, ClassVar
+import uuid
+
+from logging import getLogger
+
+from .io import AivkIO
+from .root import AivkRoot
+
+if TYPE_CHECKING:
+    from .fs import AivkFS
+
+logger = getLogger("aivk.cache")
+
+
+class AivkCache:
+    """
+    模块的缓存
+    example:
+    >>> cache = AivkFS.getFS("mymod").blobs
+    >>> await cache.put("thumb/1", data)
+    >>> data = await cache.get("thumb/1")  # 不存在或已被淘汰时为 None
+    """
+    # 每个根目录的全局预算（字节，按去重后的大小计算）
+    limit: ClassVar[int] = 1024 ** 3
+    # 不小于该大小的条目以 mmap 读取（返回 memoryview）
+    mmap_threshold: ClassVar[int] = 1024 ** 2
+    # hits 命中 / misses 未命中 / puts 写入 / dedup 内容已存在的写入 / evictions 淘汰的条目
+    stats: ClassVar[Counter[str]] = Counter()
+
+    def __init__(self, fs: AivkFS, budget: int | None = None):
+        """
+        :param fs: 所属模块
+        :param budget: 模块预算（字节，按条目大小之和计算），None 表示只受全局预算限制
+        """
+        self.module = fs.id
+        self.budget = budget
+        self._root = fs._root
+
+    def __repr__(self) -> str:
+        return f"AivkCache({self.module!r}, budget={self.budget})"
+
+    @property
+    def index(self) -> _CacheIndex:
+        # 按路径区分：根目录的路径可能被修改（AivkFS.root = ...）
+        path = self._root.path / "cache"
+        return self._root.scoped(f"cache.index:{path}", lambda: _CacheIndex(path))
+
+    async def get(self, key: str) -> bytes | memoryview | None:
+        """
+        读取缓存
+        :return: 数据；不小于 mmap_threshold 时为 mmap 上的只读 memoryview；不存在时为 None
+        """
+        data = await AivkIO.run(self.index.get, self.module, key)
+        self.stats["hits" if data is not None else "misses"] += 1
+        return data
+
+    async def put(self, key: str, data: bytes) -> str:
+        """
+        写入缓存，超出预算时淘汰最近最少使用的条目
+        数据大于模块预算或全局预算时无法保存，抛出 ValueError（不淘汰其他条目）
+        :return: 内容哈希
+        """
+        limit = min(AivkCache.limit, self.budget) if self.budget is not None else AivkCache.limit
+        if len(data) > limit:
+            raise ValueError(f"缓存条目过大：{self.module} {key}，{len(data)} 字节，预算 {limit} 字节")
+        self.stats["puts"] += 1
+        return await AivkIO.run(self.index.put, self.module, key, data, self.budget)
+
+    async def delete(self, key: str) -> bool:
+        """
+        删除缓存
+        :return: 是否存在
+        """
+        return await AivkIO.run(self.index.delete, self.module, key)
+
+    async def clear(self) -> None:
+        """
+        删除模块的所有缓存
+        """
+        await AivkIO.run(self.index.clear, self.module)
+
+    async def usage(self) -> dict[str, int]:
+        """
+        :return: module 模块条目大小之和 / total 根目录去重后的大小 / entries 模块条目数
+        """
+        return await AivkIO.run(self.index.usage, self.module)
+
+    @classmethod
+    async def flushAll(cls) -> None:
+        """
+        写入所有已打开索引中尚未写入的访问时间
+        """
+        for root in (AivkRoot.default, *AivkRoot.roots.values()):
+            for index in _indexes(root):
+                await AivkIO.run(index.flush)
+
+
+class _CacheIndex:
+    """
+    根目录的缓存索引
+    所有方法都是同步的，由 AivkIO 线程池调用；内部以锁串行访问 SQLite 连接
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.objects = path / "objects"
+        path.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path / "index.db", check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "module TEXT NOT NULL, key TEXT NOT NULL, digest TEXT NOT NULL, size INTEGER NOT NULL, atime REAL NOT NULL, "
+            "PRIMARY KEY (module, key)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime);"
+            "CREATE INDEX IF NOT EXISTS entries_module_atime ON entries (module, atime);"
+            "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL, refs INTEGER NOT NULL) WITHOUT ROWID;"
+        )
+        # 读取时只记录访问时间，写入或淘汰前批量更新，读取不产生写事务
+        self.touched: dict[tuple[str, str], float] = {}
+        # 事务中不再被引用的数据，提交后才删除文件（回滚时索引仍引用它们）
+        self.unlinks: list[str] = []
+        self.total: int = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        self.modules: Counter[str] = Counter(dict(self.db.execute("SELECT module, SUM(size) FROM entries GROUP BY module")))
+
+    def blob(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
+
+    def get(self, module: str, key: str) -> bytes | memoryview | None:
+        with self.lock:
+            row = self.db.execute("SELECT digest, size FROM entries WHERE module = ? AND key = ?", (module, key)).fetchone()
+            if row is None:
+                return None
+            self.touched[(module, key)] = time.time()
+        digest, size = row
+        try:
+            if size < AivkCache.mmap_threshold:
+                return self.blob(digest).read_bytes()
+            with open(self.blob(digest), "rb") as f:
+                # mmap 在 memoryview 释放后随之关闭
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            logger.warning(f"缓存数据丢失，删除条目：{module} {key}")
+            # 只删除读到的条目：其间并发写入的新数据不受影响
+            self.delete(module, key, digest)
+            return None
+
+    def put(self, module: str, key: str, data: bytes, budget: int | None) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        size = len(data)
+        # 在锁外写临时文件，锁内只做重命名
+        target = self.blob(digest)
+        tmp: Path | None = None
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(f".{digest}.{uuid.uuid4().hex[:8]}.tmp")
+            tmp.write_bytes(data)
+            os.chmod(tmp, 0o444)
+        try:
+            with self.lock:
+                self._flush_touched()
+                self.db.execute("BEGIN")
+                try:
+                    old = self.db.execute("SELECT digest, size FROM entries WHERE module = ? AND key = ?", (module, key)).fetchone()
+                    if old is not None and old[0] == digest:
+                        self.db.execute("UPDATE entries SET atime = ? WHERE module = ? AND key = ?", (time.time(), module, key))
+                        self.db.execute("COMMIT")
+                        return digest
+                    if old is not None:
+                        self._remove(module, key, *old)
+                    if self._ref(digest, size):
+                        AivkCache.stats["dedup"] += 1
+                    if tmp is not None:
+                        # 内容相同，覆盖并发写入的同一数据无害
+                        os.replace(tmp, target)
+                        tmp = None
+                    elif not target.exists():
+                        # 锁外检查之后被淘汰
+                        _write_blob(target, data)
+                    self.db.execute("INSERT INTO entries VALUES (?, ?, ?, ?, ?)", (module, key, digest, size, time.time()))
+                    self.modules[module] += size
+                    self._evict(module, budget)
+                    self._commit()
+                except BaseException:
+                    self._rollback()
+                    raise
+        finally:
+            if tmp is not None:
+                tmp.unlink(missing_ok=True)
+        return digest
+
+    def delete(self, module: str, key: str, digest: str | None = None) -> bool:
+        """
+        :param digest: 只在条目仍是这份数据时删除
+        """
+        with self.lock:
+            row = self.db.execute("SELECT digest, size FROM entries WHERE module = ? AND key = ?", (module, key)).fetchone()
+            if row is None or (digest is not None and row[0] != digest):
+                return False
+            self.touched.pop((module, key), None)
+            self.db.execute("BEGIN")
+            try:
+                self._remove(module, key, *row)
+                self._commit()
+            except BaseException:
+                self._rollback()
+                raise
+            return True
+
+    def clear(self, module: str) -> None:
+        with self.lock:
+            rows = self.db.execute("SELECT key, digest, size FROM entries WHERE module = ?", (module,)).fetchall()
+            self.db.execute("BEGIN")
+            try:
+                for key, digest, size in rows:
+                    self.touched.pop((module, key), None)
+                    self._remove(module, key, digest, size)
+                self._commit()
+            except BaseException:
+                self._rollback()
+                raise
+
+    def usage(self, module: str) -> dict[str, int]:
+        with self.lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM entries WHERE module = ?", (module,)).fetchone()[0]
+            return {"module": self.modules[module], "total": self.total, "entries": entries}
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush_touched()
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush_touched()
+            self.db.close()
+
+    def _flush_touched(self) -> None:
+        if self.touched:
+            self.db.executemany(
+                "UPDATE entries SET atime = ? WHERE module = ? AND key = ?",
+                [(atime, module, key) for (module, key), atime in self.touched.items()],
+            )
+            self.touched.clear()
+
+    def _commit(self) -> None:
+        """
+        提交事务，然后删除不再被引用的数据
+        """
+        self.db.execute("COMMIT")
+        unlinks, self.unlinks = self.unlinks, []
+        for digest in unlinks:
+            self.blob(digest).unlink(missing_ok=True)
+
+    def _rollback(self) -> None:
+        self.db.execute("ROLLBACK")
+        self.unlinks.clear()
+        self._reload_totals()
+
+    def _ref(self, digest: str, size: int) -> bool:
+        """
+        增加数据的引用
+        :return: 数据是否已存在
+        """
+        if self.db.execute("UPDATE blobs SET refs = refs + 1 WHERE digest = ?", (digest,)).rowcount:
+            return True
+        self.db.execute("INSERT INTO blobs VALUES (?, ?, 1)", (digest, size))
+        self.total += size
+        return False
+
+    def _remove(self, module: str, key: str, digest: str, size: int) -> None:
+        """
+        删除条目，数据不再被引用时在提交后一并删除
+        """
+        self.db.execute("DELETE FROM entries WHERE module = ? AND key = ?", (module, key))
+        self.modules[module] -= size
+        self.db.execute("UPDATE blobs SET refs = refs - 1 WHERE digest = ?", (digest,))
+        if self.db.execute("DELETE FROM blobs WHERE digest = ? AND refs <= 0", (digest,)).rowcount:
+            self.total -= size
+            self.unlinks.append(digest)
+
+    def _evict(self, module: str, budget: int | None) -> None:
+        """
+        按最近访问时间淘汰，先满足模块预算，再满足全局预算
+        """
+        while budget is not None and self.modules[module] > budget:
+            row = self.db.execute(
+                "SELECT key, digest, size FROM entries WHERE module = ? ORDER BY atime LIMIT 1", (module,)
+            ).fetchone()
+            if row is None:
+                break
+            self._remove(module, *row)
+            AivkCache.stats["evictions"] += 1
+        while self.total > AivkCache.limit:
+            row = self.db.execute("SELECT module, key, digest, size FROM entries ORDER BY atime LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._remove(*row)
+            AivkCache.stats["evictions"] += 1
+
+    def _reload_totals(self) -> None:
+        self.total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        self.modules = Counter(dict(self.db.execute("SELECT module, SUM(size) FROM entries GROUP BY module")))
+
+
+def _write_blob(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        tmp.write_bytes(data)
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _indexes(root: AivkRoot) -> list[_CacheIndex]:
+    return [value for value in list(root.state.values()) if isinstance(value, _CacheIndex)]
+
+
+async def _close_root(root: AivkRoot) -> None:
+    for index in _indexes(root):
+        await AivkIO.run(index.close)
+
+
+AivkRoot.close_hooks.append(_close_root)
@@ -0,0 +1,363 @@
+"""
+模块虚拟环境管理
+每个模块使用自己的 fs.venv，包文件来自 AivkFS.root/store 下按内容寻址的共享存储：
+    store/objects/<sha256[:2]>/<sha256>   文件内容（只读）
+    store/packages/<wheel sha256>.json    wheel 清单：安装位置 -> (内容哈希, 权限)
+    store/downloads/<需求哈希>/           pip download 下载的 wheel
+安装时以硬链接（或 reflink / 复制）把对象放进各模块的虚拟环境，同一个文件在磁盘上只保存一份
+多个模块的环境可以并发安装
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path, PurePosixPath
+import shutil
+import stat
+import sys
+import threading
+import time
+from typing import Any, ClassVar, Iterable, Literal, Mapping
+import uuid
+import zipfile
+
+from logging import getLogger
+
+from .flight import single_flight
+from .fs import AivkFS
+from .io import AivkIO
+
+logger = getLogger("aivk.envs")
+
+LinkMode = Literal["hardlink", "reflink", "copy"]
+
+# 安装记录，重复安装同一组包时直接跳过
+INSTALLED = ".aivk-packages.json"
+# 重新安装期间保存上一次的安装记录，用于删除不再需要的文件
+STALE = ".aivk-packages.old.json"
+
+
+class AivkEnvs:
+    """
+    模块虚拟环境管理器
+    example:
+    >>> await AivkEnvs.provision("mymod", ["requests==2.32.3"])
+    >>> await AivkEnvs.provisionAll({"a": [wheel], "b": [wheel, other]})
+    """
+    # hardlink 失败时（如跨设备）依次回退到 reflink、复制
+    link_mode: ClassVar[LinkMode] = "hardlink"
+    # 正在导入的 wheel：路径 -> 清单哈希（同一个 wheel 并发安装时只导入一次）
+    _imports: ClassVar[dict[Path, asyncio.Future[str]]] = {}
+    # 正在下载的需求集合：下载目录 -> wheel 列表（相同的需求集合并发安装时只下载一次）
+    _downloads: ClassVar[dict[Path, asyncio.Future[list[Path]]]] = {}
+    # linked 链接的文件 / copied 复制的文件 / objects 新写入存储的对象 / skipped 已安装跳过的环境
+    stats: ClassVar[dict[str, int]] = {"linked": 0, "copied": 0, "objects": 0, "skipped": 0}
+    # stats 在 I/O 线程中更新
+    _stats_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def store(cls) -> Path:
+        """
+        共享包存储目录
+        """
+        return AivkFS.root / "store"
+
+    @staticmethod
+    def site_packages(venv: Path) -> Path:
+        """
+        虚拟环境的 site-packages（虚拟环境与当前解释器一致，见 AivkFS.ensureVenv）
+        """
+        if os.name == "nt":
+            return venv / "Lib" / "site-packages"
+        return venv / "lib" / f"python{sys.version_info[0]}.{sys.version_info[1]}" / "site-packages"
+
+    @classmethod
+    async def provision(cls, id: str, requirements: Iterable[str | Path]) -> Path:
+        """
+        为模块准备虚拟环境并安装依赖
+        :param id: 模块 id，虚拟环境为 AivkFS.getFS(id).venv
+        :param requirements: wheel 文件路径，或交给 pip download 解析的需求字符串
+        :return: 虚拟环境目录
+        """
+        start = time.perf_counter()
+        venv = AivkFS.getFS(id).venv
+        requirements = list(requirements)
+        await AivkFS.ensureVenv(venv, pip=False)
+
+        wheels = [Path(r) for r in requirements if isinstance(r, Path)]
+        specs = sorted(r for r in requirements if isinstance(r, str))
+        if specs:
+            wheels += await cls._download(specs)
+
+        digests = sorted(set(await asyncio.gather(*(cls._import(wheel) for wheel in wheels))))
+        installed = await AivkIO.run(_read_installed, venv)
+        if installed == digests:
+            cls._count("skipped")
+            return venv
+        await AivkIO.run(cls._link_all, venv, digests)
+        logger.info(f"模块 {id} 的虚拟环境已就绪：{len(digests)} 个包（{time.perf_counter() - start:.2f}s）")
+        return venv
+
+    @classmethod
+    async def provisionAll(cls, requirements: Mapping[str, Iterable[str | Path]], limit: int = 8) -> dict[str, Path | BaseException]:
+        """
+        并发准备多个模块的虚拟环境
+        :param requirements: 模块 id -> 依赖
+        :param limit: 同时安装的模块数上限
+        :return: 模块 id -> 虚拟环境目录；失败时为异常对象，不影响其他模块
+        """
+        semaphore = asyncio.Semaphore(limit)
+
+        async def one(id: str, reqs: Iterable[str | Path]) -> Path:
+            async with semaphore:
+                return await cls.provision(id, reqs)
+
+        ids = list(requirements)
+        results = await asyncio.gather(*(one(id, requirements[id]) for id in ids), return_exceptions=True)
+        for id, result in zip(ids, results):
+            if isinstance(result, BaseException):
+                logger.error(f"准备模块 {id} 的虚拟环境失败: {result}")
+        return dict(zip(ids, results))
+
+    @classmethod
+    async def _download(cls, specs: list[str]) -> list[Path]:
+        """
+        用 pip download 下载需求及其依赖的 wheel
+        相同的需求集合只下载一次；并发的相同下载合并，不会读到另一个 pip 写了一半的 wheel
+        """
+        key = hashlib.sha256("\n".join(specs).encode()).hexdigest()[:16]
+        dest = cls.store() / "downloads" / key
+        done = dest / ".complete"
+
+        async def download() -> list[Path]:
+            if not await AivkIO.run(done.exists):
+                await AivkFS._run(sys.executable, "-m", "pip", "download", "--only-binary=:all:", "-d", str(dest), *specs)
+                await AivkIO.run(done.touch)
+            return await AivkIO.run(lambda: sorted(dest.glob("*.whl")))
+
+        return await single_flight(cls._downloads, dest, download)
+
+    @classmethod
+    async def _import(cls, wheel: Path) -> str:
+        """
+        导入 wheel 到共享存储（同一个 wheel 的并发导入合并为一次）
+        :return: 清单哈希
+        """
+        wheel = wheel.resolve()
+        return await single_flight(cls._imports, wheel, lambda: AivkIO.run(cls._import_sync, wheel))
+
+    @classmethod
+    def _import_sync(cls, wheel: Path) -> str:
+        with open(wheel, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        manifest = cls.store() / "packages" / f"{digest}.json"
+        if manifest.is_file():
+            return digest
+
+        files: dict[str, tuple[str, int]] = {}
+        with zipfile.ZipFile(wheel) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                target = _target(info.filename)
+                if target is None:
+                    continue
+                data = zf.read(info)
+                h = hashlib.sha256(data).hexdigest()
+                mode = 0o555 if (info.external_attr >> 16) & 0o111 or target.startswith("bin/") else 0o444
+                cls._store_object(h, data, mode)
+                files[target] = (h, mode)
+        _write_atomic(manifest, json.dumps({"wheel": wheel.name, "files": files}).encode())
+        logger.debug(f"导入 {wheel.name}：{len(files)} 个文件")
+        return digest
+
+    @classmethod
+    def _store_object(cls, h: str, data: bytes, mode: int) -> None:
+        obj = cls.store() / "objects" / h[:2] / h
+        if obj.exists():
+            return
+        _write_atomic(obj, data, mode)
+        cls._count("objects")
+
+    @classmethod
+    def _count(cls, name: str) -> None:
+        with cls._stats_lock:
+            cls.stats[name] += 1
+
+    @classmethod
+    def _manifest(cls, digest: str) -> dict[str, tuple[str, int]]:
+        """
+        wheel 清单：安装位置 -> (内容哈希, 权限)
+        """
+        return json.loads((cls.store() / "packages" / f"{digest}.json").read_bytes())["files"]
+
+    @classmethod
+    def _link_all(cls, venv: Path, digests: list[str]) -> None:
+        """
+        把清单中的文件链接到虚拟环境，并删除之前安装、新的包集合中没有的文件
+        """
+        roots = {"site": cls.site_packages(venv), "bin": venv / ("Scripts" if os.name == "nt" else "bin"), "data": venv}
+        objects = cls.store() / "objects"
+        # 先把安装记录改名：中途失败时下次重新安装，且仍能清理上一次的文件
+        if (venv / INSTALLED).is_file():
+            os.replace(venv / INSTALLED, venv / STALE)
+        files: dict[str, tuple[str, int]] = {}
+        for digest in digests:
+            files.update(cls._manifest(digest))
+        for target, (h, _) in files.items():
+            kind, rel = target.split("/", 1)
+            dst = roots[kind] / _safe(rel)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            cls._link(objects / h[:2] / h, dst)
+        cls._remove_stale(venv, roots, files)
+        _write_atomic(venv / INSTALLED, json.dumps(digests).encode())
+
+    @classmethod
+    def _remove_stale(cls, venv: Path, roots: dict[str, Path], files: dict[str, tuple[str, int]]) -> None:
+        """
+        删除上一次安装的包中、本次不再需要的文件
+        """
+        previous = _read_stale(venv)
+        for digest in previous:
+            try:
+                manifest = cls._manifest(digest)
+            except (OSError, ValueError):
+                logger.warning(f"找不到旧的 wheel 清单 {digest}，跳过清理")
+                continue
+            for target in manifest:
+                if target in files:
+                    continue
+                kind, rel = target.split("/", 1)
+                try:
+                    (roots[kind] / _safe(rel)).unlink(missing_ok=True)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"删除旧文件失败 {target}: {e}")
+        (venv / STALE).unlink(missing_ok=True)
+
+    @classmethod
+    def _link(cls, src: Path, dst: Path) -> None:
+        """
+        按 link_mode 链接对象，失败时依次回退
+        """
+        dst.unlink(missing_ok=True)
+        modes: list[LinkMode] = ["hardlink", "reflink", "copy"]
+        for mode in modes[modes.index(cls.link_mode):]:
+            try:
+                if mode == "hardlink":
+                    os.link(src, dst)
+                elif mode == "reflink":
+                    _reflink(src, dst)
+                else:
+                    # 最后的回退，失败时（如 ENOSPC / EACCES）抛出
+                    shutil.copy2(src, dst)
+                    cls._count("copied")
+                    return
+            except OSError:
+                if mode == "copy":
+                    raise
+                continue
+            cls._count("linked")
+            return
+
+    @classmethod
+    def footprint(cls, *paths: Path) -> dict[str, int]:
+        """
+        磁盘占用（按 inode 去重）
+        :param paths: 要统计的目录，默认为共享存储与所有模块目录
+        :return: apparent 各文件大小之和 / actual 去重后的大小 / files 文件数
+        """
+        if not paths:
+            paths = (cls.store(), AivkFS.root / "home")
+        seen: set[tuple[int, int]] = set()
+        apparent = actual = files = 0
+        for root in paths:
+            for dirpath, _, filenames in os.walk(root):
+                for name in filenames:
+                    st = os.lstat(os.path.join(dirpath, name))
+                    if not stat.S_ISREG(st.st_mode):
+                        continue
+                    files += 1
+                    apparent += st.st_size
+                    if (st.st_dev, st.st_ino) not in seen:
+                        seen.add((st.st_dev, st.st_ino))
+                        actual += st.st_size
+        return {"apparent": apparent, "actual": actual, "files": files}
+
+
+def _safe(rel: str) -> str:
+    """
+    检查安装位置不会写到目录之外（zip slip）
+    """
+    path = PurePosixPath(rel)
+    if not rel or path.is_absolute() or "\\" in rel or ".." in path.parts or ":" in path.parts[0]:
+        raise ValueError(f"wheel 中的路径不安全: {rel!r}")
+    return rel
+
+
+def _target(name: str) -> str | None:
+    """
+    wheel 内的路径 -> 安装位置（site/ bin/ data/ 前缀）
+    不安全的路径（绝对路径、包含 ..）抛出 ValueError
+    """
+    _safe(name)
+    head, _, rest = name.partition("/")
+    if head.endswith(".data") and rest:
+        scheme, _, rel = rest.partition("/")
+        if scheme in ("purelib", "platlib"):
+            return f"site/{rel}"
+        if scheme == "scripts":
+            return f"bin/{rel}"
+        if scheme == "data":
+            return f"data/{rel}"
+        return None  # headers 不安装
+    return f"site/{name}"
+
+
+def _read_stale(venv: Path) -> list[str]:
+    """
+    上一次安装的包（开始重新安装时由安装记录改名而来）
+    """
+    try:
+        return json.loads((venv / STALE).read_bytes())
+    except (OSError, ValueError):
+        return []
+
+
+def _read_installed(venv: Path) -> Any:
+    try:
+        return json.loads((venv / INSTALLED).read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path: Path, data: bytes, mode: int | None = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        tmp.write_bytes(data)
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    """
+    写时复制克隆（Linux FICLONE，需要 btrfs / xfs 等文件系统支持）
+    """
+    if not sys.platform.startswith("linux"):
+        raise OSError("reflink is only supported on Linux")
+    import fcntl
+    FICLONE = 0x40049409
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            dst.unlink(missing_ok=True)
+            raise
+    shutil.copymode(src, dst)
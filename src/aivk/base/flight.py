@@ -0,0 +1,56 @@
+"""
+合并并发调用（single-flight）
+同一个键只有一个调用方真正执行，其余调用方等待并共享结果
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Hashable, MutableMapping, TypeVar
+
+R = TypeVar("R")
+
+
+async def single_flight(pending: MutableMapping[Hashable, asyncio.Future[R]],
+                        key: Hashable,
+                        load: Callable[[], Awaitable[R]],
+                        cached: Callable[[], R | None] | None = None
+                        ) -> R:
+    """
+    同一个键只会有一次 load 在进行，其余调用方共享结果或异常；不同的键互不阻塞
+    执行 load 的调用方被取消时，等待者不会收到 CancelledError，而是由其中一个重新执行
+    :param pending: 进行中的调用：键 -> future（由调用方持有，决定合并的范围）
+    :param key: 键
+    :param load: 实际执行的协程
+    :param cached: 重新执行前先检查的结果（如缓存），返回 None 表示没有
+    """
+    loop = asyncio.get_running_loop()
+    # 其他事件循环留下的 future 不能等待，视为没有进行中的调用
+    while (future := pending.get(key)) is not None and future.get_loop() is loop:
+        try:
+            # shield 防止单个调用方取消影响其他等待者
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            task = asyncio.current_task()
+            if not future.cancelled() or (task is not None and task.cancelling()):
+                # 本调用方被取消
+                raise
+            # 执行 load 的调用方被取消，重新检查后自行执行
+            if cached is not None and (result := cached()) is not None:
+                return result
+
+    future = pending[key] = loop.create_future()
+    try:
+        result = await load()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # 没有其他等待者时不输出未获取异常的警告
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        if pending.get(key) is future:
+            del pending[key]
@@ -3,10 +3,19 @@ import asyncio
 from contextlib import asynccontextmanager
 import os
 from pathlib import Path
+import json
 import runpy
+import site
 import subprocess
 import sys
 import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from .cache import AivkCache
+from .flight import single_flight
+from .io import AivkIO
+from .root import AivkRoot
 
 from logging import getLogger
 logger = getLogger("aivk.fs")
@@ -18,14 +27,44 @@ class AivkFSMeta(type):
         """
         return {k: v for k, v in os.environ.items() if k.startswith("AIVK_")}
 
+    @property
+    def root(cls) -> Path:
+        """
+        当前根目录，见 AivkRoot
+        """
+        return AivkRoot.current().path
+
+    @root.setter
+    def root(cls, path: Path) -> None:
+        AivkRoot.current().path = Path(path)
+
+    @property
+    def fs(cls) -> dict[str, AivkFS]:
+        """
+        当前根目录的 AivkFS 实例：模块 id -> AivkFS
+        """
+        return AivkRoot.current().fs
+
 class AivkFS(metaclass=AivkFSMeta):
-    root = Path(os.getenv("AIVK_ROOT", Path().home() / ".aivk"))
-    fs: dict[str, AivkFS] = {}
-    _venv_activated = False
+    # ctx 的引用计数与进入前被修改的状态（None 表示未进入）
+    _depth = 0
+    _saved: dict[str, Any] | None = None
+    _ctx_lock = threading.RLock()
+    VENV_MARKER = ".aivk-venv.json"  # 记录创建虚拟环境的解释器
+    # 进程内已验证的虚拟环境
+    _venv_ready: set[Path] = set()
+    _venv_pending: dict[Path, asyncio.Future[bool]] = {}
+    # 首次激活记录的修改：虚拟环境 -> (环境变量, sys.path 新增条目, sys.prefix)
+    _activation: dict[Path, tuple[dict[str, str], list[str], str]] = {}
+    # ctx 退出时依次 await 的钩子（如写入未保存的配置）
+    exit_hooks: list[Callable[[], Awaitable[Any]]] = []
+    # ctx 修改或恢复环境变量时递增，环境变量的缓存据此立即失效
+    env_version = 0
 
-    def __init__(self, id: str):
+    def __init__(self, id: str, root: AivkRoot | None = None):
         self.id = id
-        self.fs[id] = self
+        self._root = root or AivkRoot.current()
+        self._root.fs[id] = self
 
     def __repr__(self) -> str:
         info = f"\n\
@@ -43,9 +82,14 @@ cwd: {Path.cwd()}\n\
 
     @classmethod
     def getFS(cls, id: str) -> AivkFS:
-        if id not in cls.fs:
-            cls(id)
-        return cls.fs[id]
+        fs = AivkRoot.current().fs.get(id)
+        if fs is None:
+            fs = cls(id)
+        return fs
+
+    @property
+    def root(self) -> Path:
+        return self._root.path
 
     @property
     def home(self) -> Path:
@@ -63,6 +107,16 @@ cwd: {Path.cwd()}\n\
     def cache(self) -> Path:
         return self.home / "cache"
 
+    @property
+    def blobs(self) -> AivkCache:
+        """
+        模块的缓存存储（数据保存在根目录的 cache/objects 下，按内容去重）
+        """
+        blobs = self.__dict__.get("_blobs")
+        if blobs is None:
+            blobs = self._blobs = AivkCache(self)
+        return blobs
+
     @property
     def tmp(self) -> Path:
         return self.home / "tmp"
@@ -71,50 +125,259 @@ cwd: {Path.cwd()}\n\
     def venv(self) -> Path:
         return self.home / ".venv"
     
+    @staticmethod
+    def _venv_signature() -> dict[str, str]:
+        """
+        虚拟环境对应的解释器
+        """
+        return {"executable": os.path.realpath(sys.executable), "version": sys.version}
+
+    @classmethod
+    def _venv_valid(cls, venv: Path) -> bool:
+        """
+        标记文件与当前解释器一致时，虚拟环境可以直接使用
+        没有标记文件（旧版本创建的虚拟环境）时按 pyvenv.cfg 判断，一致则补写标记并保留
+        """
+        try:
+            marker = json.loads((venv / cls.VENV_MARKER).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            if not cls._venv_cfg_matches(venv):
+                return False
+            cls._write_venv_marker(venv)
+            logger.info(f"沿用已有的虚拟环境：{venv}")
+            return True
+        except (OSError, ValueError):
+            return False
+        return marker == cls._venv_signature() and (venv / "pyvenv.cfg").is_file()
+
+    @staticmethod
+    def _venv_cfg_matches(venv: Path) -> bool:
+        """
+        pyvenv.cfg 记录的解释器（home / version）是否为当前解释器
+        """
+        try:
+            lines = (venv / "pyvenv.cfg").read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return False
+        cfg = {}
+        for line in lines:
+            key, sep, value = line.partition("=")
+            if sep:
+                cfg[key.strip().lower()] = value.strip()
+        # venv 模块写 version，uv 写 version_info
+        version = cfg.get("version") or cfg.get("version_info") or ""
+        if version.split(".")[:3] != [str(v) for v in sys.version_info[:3]]:
+            return False
+        home = cfg.get("home")
+        if not home:
+            return False
+        base = getattr(sys, "_base_executable", sys.executable)
+        candidates = {os.path.dirname(base), os.path.dirname(os.path.realpath(base)),
+                      os.path.dirname(sys.executable), os.path.dirname(os.path.realpath(sys.executable))}
+        return home in candidates or os.path.realpath(home) in {os.path.realpath(c) for c in candidates}
+
+    @classmethod
+    def _write_venv_marker(cls, venv: Path) -> None:
+        (venv / cls.VENV_MARKER).write_text(json.dumps(cls._venv_signature()), encoding="utf-8")
+
+    @staticmethod
+    def _clear_venv(venv: Path) -> None:
+        """
+        移开与当前解释器不一致的旧虚拟环境（重命名为 <venv>.old-<时间戳>，不删除其中已安装的包）
+        只移开确实是虚拟环境的目录
+        """
+        if not venv.exists():
+            return
+        if not (venv / "pyvenv.cfg").is_file():
+            raise RuntimeError(f"{venv} 已存在且不是虚拟环境，拒绝覆盖")
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        old = venv.with_name(f"{venv.name}.old-{stamp}")
+        n = 1
+        while old.exists():
+            old = venv.with_name(f"{venv.name}.old-{stamp}-{n}")
+            n += 1
+        venv.rename(old)
+        logger.warning(f"虚拟环境与当前解释器不一致，已移至 {old}")
+
+    @classmethod
+    async def ensureVenv(cls, venv: Path, pip: bool = True) -> bool:
+        """
+        确保虚拟环境存在且与当前解释器一致
+        进程内验证过的虚拟环境不再访问文件系统
+        :param venv: 虚拟环境目录
+        :param pip: venv 模块创建时是否安装 pip（包由 AivkEnvs 链接时不需要）
+        :return: 是否新建
+        """
+        if venv in cls._venv_ready:
+            return False
+        # 同一虚拟环境的并发调用合并为一次，只有实际创建的调用方返回 True
+        mine = False
+
+        async def ensure() -> bool:
+            nonlocal mine
+            mine = True
+            return await cls._ensure_venv(venv, pip)
+
+        created = await single_flight(cls._venv_pending, venv, ensure)
+        return created and mine
+
+    @classmethod
+    async def _ensure_venv(cls, venv: Path, pip: bool) -> bool:
+        if await AivkIO.run(cls._venv_valid, venv):
+            cls._venv_ready.add(venv)
+            return False
+
+        start = time.perf_counter()
+        await AivkIO.run(cls._clear_venv, venv)
+        logger.info(f"创建虚拟环境：{venv}")
+        try:
+            await cls._run("uv", "venv", "-p", sys.executable, str(venv))
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.warning(f"uv 创建虚拟环境失败（{e}），改用 venv 模块")
+            await AivkIO.run(cls._clear_venv, venv)
+            await cls._run(sys.executable, "-m", "venv", *(() if pip else ("--without-pip",)), str(venv))
+        await AivkIO.run(cls._write_venv_marker, venv)
+        cls._venv_ready.add(venv)
+        logger.info(f"虚拟环境已创建：{venv}（{time.perf_counter() - start:.1f}s）")
+        return True
+
+    @staticmethod
+    async def _run(*cmd: str) -> None:
+        """
+        异步执行命令，逐行输出进度
+        """
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        assert proc.stdout is not None
+        async for line in proc.stdout:
+            logger.info(f"[{Path(cmd[0]).name}] {line.decode(errors='replace').rstrip()}")
+        code = await proc.wait()
+        if code:
+            raise subprocess.CalledProcessError(code, cmd)
+
+    @classmethod
+    def _activation_of(cls, venv: Path) -> tuple[dict[str, str], list[str], str]:
+        """
+        虚拟环境激活时对环境变量、sys.path、sys.prefix 的修改
+        首次调用时执行 activate_this.py 并记录修改（随后撤销，由 _apply 统一应用），
+        之后直接返回记录，不再访问文件系统
+        """
+        cached = cls._activation.get(venv)
+        if cached is not None:
+            return cached
+
+        env_before = os.environ.copy()
+        path_before = sys.path.copy()
+        prefix_before = sys.prefix
+        activate_this = venv / ("Scripts" if os.name == "nt" else "bin") / "activate_this.py"
+        try:
+            if activate_this.exists():
+                runpy.run_path(str(activate_this))
+            else:
+                # python -m venv 创建的虚拟环境没有 activate_this.py
+                bin_dir = venv / ("Scripts" if os.name == "nt" else "bin")
+                os.environ["PATH"] = os.pathsep.join([str(bin_dir), os.environ.get("PATH", "")])
+                os.environ["VIRTUAL_ENV"] = str(venv)
+                if os.name == "nt":
+                    site_packages = [venv / "Lib" / "site-packages"]
+                else:
+                    site_packages = list((venv / "lib").glob("python*/site-packages"))
+                for site_dir in site_packages:
+                    site.addsitedir(str(site_dir))
+                sys.prefix = str(venv)
+            env = {k: v for k, v in os.environ.items() if env_before.get(k) != v}
+            paths = [p for p in sys.path if p not in path_before]
+            prefix = sys.prefix
+        finally:
+            for k in [k for k in os.environ if k not in env_before]:
+                del os.environ[k]
+            os.environ.update({k: v for k, v in env_before.items() if os.environ.get(k) != v})
+            sys.path[:] = path_before
+            sys.prefix = prefix_before
+        cls._activation[venv] = (env, paths, prefix)
+        return env, paths, prefix
+
+    @classmethod
+    def _apply(cls, fs: AivkFS) -> None:
+        """
+        进入运行时上下文：切换工作目录并激活虚拟环境
+        只记录被修改的环境变量、新增的 sys.path 条目，开销与修改数量相关，与环境大小无关
+        """
+        env, paths, prefix = cls._activation_of(fs.venv)
+        cls._saved = {
+            "cwd": Path.cwd(),
+            "prefix": sys.prefix,
+            "env": {k: os.environ.get(k) for k in env},
+            "applied": env,
+            "paths": [p for p in paths if p not in sys.path],
+        }
+        os.chdir(fs.home)
+        os.environ.update(env)
+        cls.env_version += 1
+        sys.path[:0] = cls._saved["paths"]
+        sys.prefix = prefix
+
+    @classmethod
+    def _restore(cls) -> None:
+        """
+        退出运行时上下文：只恢复 _apply 修改过的键
+        期间被其他代码改动过的环境变量保留其他代码的值
+        """
+        saved = cls._saved
+        cls._saved = None
+        if saved is None:
+            return
+        for k, old in saved["env"].items():
+            if os.environ.get(k) != saved["applied"][k]:
+                continue
+            if old is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = old
+        cls.env_version += 1
+        added = set(saved["paths"])
+        if added:
+            sys.path[:] = [p for p in sys.path if p not in added]
+        sys.prefix = saved["prefix"]
+        os.chdir(saved["cwd"])
+
     @classmethod
     @asynccontextmanager
     async def ctx(cls, clear: bool = False):
         """
-        仅允许全局进入一次
+        进程全局的运行时上下文，可重入
+        首次进入时切换工作目录并激活虚拟环境；嵌套或并发的进入只增加引用计数
+        最后一个退出时执行退出钩子，并恢复被修改的状态
         """
-        async with asyncio.Lock():
-            with threading.Lock():
+        id = "aivk"
+        fs = cls.getFS(id)
+        # 创建虚拟环境不阻塞事件循环；已验证的虚拟环境直接跳过
+        await cls.ensureVenv(fs.venv)
+
+        with cls._ctx_lock:
+            if cls._saved is None:
                 logger.info("aivk 文件系统初始化")
-                id = "aivk"
-                fs = cls.getFS(id)
-                cwd = Path.cwd()
-                old_sys_path = sys.path.copy()
-                old_environ = os.environ.copy()
-    
-                os.chdir(fs.home)
-                activate_this = fs.venv / ("Scripts" if os.name == "nt" else "bin") / "activate_this.py"
-                
-                if not fs.venv.exists():
+                cls._apply(fs)
+                logger.info("aivk 文件系统已初始化")
+            cls._depth += 1
+        try:
+            yield fs
+        finally:
+            with cls._ctx_lock:
+                cls._depth -= 1
+                last = cls._depth == 0
+            if last:
+                for hook in cls.exit_hooks:
                     try:
-                        # 只允许第一个进入的线程/协程激活虚拟环境
-                        python_exe = sys.executable
-                        subprocess.run(
-                            ["uv", "venv", "-p", python_exe, str(fs.venv)],
-                            check=True
-                        )
+                        await hook()
                     except Exception as e:
-                        logger.error(f"激活虚拟环境失败: {e}")
-                        subprocess.run(
-                            ["python", "-m", "venv", str(fs.venv)],
-                            check=True
-                        )
+                        logger.error(f"退出钩子执行失败: {e}")
+                with cls._ctx_lock:
+                    # 执行钩子期间可能有新的进入
+                    if cls._depth == 0:
+                        cls._restore()
 
-                if not cls._venv_activated:
-                    if activate_this.exists():
-                        runpy.run_path(str(activate_this))
-                    cls._venv_activated = True
 
-                logger.info("aivk 文件系统已初始化")
-                try:
-                    yield fs
-                finally:
-                    os.chdir(cwd)
-                    sys.path[:] = old_sys_path
-                    os.environ.clear()
-                    os.environ.update(old_environ)
-                    cls._venv_activated = False
+# ctx 退出时写入缓存的访问时间
+AivkFS.exit_hooks.append(AivkCache.flushAll)
@@ -0,0 +1,145 @@
+"""
+配置与文件系统专用的 I/O 线程池
+与事件循环的默认 executor 分开，避免启动时大量配置读写与模块的阻塞任务互相争抢
+小文件的读写在一次线程切换内完成（aiofiles 的 open / read / write / close 各需一次）
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, ClassVar, TypeVar
+
+from logging import getLogger
+
+logger = getLogger("aivk.io")
+
+R = TypeVar("R")
+
+
+class AivkIO:
+    """
+    有界 I/O 线程池
+    """
+    workers: ClassVar[int] = min(8, (os.cpu_count() or 1) + 4)
+    _executor: ClassVar[ThreadPoolExecutor | None] = None
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+
+    # calls 完成的调用 / errors 抛出异常的调用
+    stats: ClassVar[Counter[str]] = Counter()
+    queued: ClassVar[int] = 0  # 已提交但尚未开始执行
+    running: ClassVar[int] = 0  # 正在执行
+    peak_queued: ClassVar[int] = 0  # 最大排队深度
+    wait_total: ClassVar[float] = 0.0  # 排队总耗时（秒）
+    wait_max: ClassVar[float] = 0.0  # 最长排队耗时（秒）
+    run_total: ClassVar[float] = 0.0  # 执行总耗时（秒）
+
+    @classmethod
+    def configure(cls, workers: int) -> None:
+        """
+        设置线程数，已有的线程池在当前任务完成后关闭
+        :param workers: 线程数
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be positive: {workers}")
+        with cls._lock:
+            cls.workers = workers
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        logger.debug(f"I/O 线程池大小：{workers}")
+
+    @classmethod
+    def executor(cls) -> ThreadPoolExecutor:
+        """
+        获取线程池（首次使用时创建）
+        """
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=cls.workers, thread_name_prefix="aivk-io")
+            return cls._executor
+
+    @classmethod
+    async def run(cls, func: Callable[..., R], *args: Any) -> R:
+        """
+        在 I/O 线程池中执行阻塞函数
+        :param func: 阻塞函数
+        :param args: 参数
+        """
+        submitted = time.perf_counter()
+        with cls._lock:
+            cls.queued += 1
+            cls.peak_queued = max(cls.peak_queued, cls.queued)
+
+        def call() -> R:
+            started = time.perf_counter()
+            with cls._lock:
+                cls.queued -= 1
+                cls.running += 1
+                wait = started - submitted
+                cls.wait_total += wait
+                cls.wait_max = max(cls.wait_max, wait)
+            try:
+                return func(*args)
+            except BaseException:
+                with cls._lock:
+                    cls.stats["errors"] += 1
+                raise
+            finally:
+                with cls._lock:
+                    cls.running -= 1
+                    cls.run_total += time.perf_counter() - started
+                    cls.stats["calls"] += 1
+
+        future = cls.executor().submit(call)
+        # 等待的任务在开始执行前被取消时，call 不会运行，由这里撤销排队计数
+        future.add_done_callback(cls._unqueue_cancelled)
+        return await asyncio.wrap_future(future)
+
+    @classmethod
+    def _unqueue_cancelled(cls, future: Future[Any]) -> None:
+        if future.cancelled():
+            with cls._lock:
+                cls.queued -= 1
+
+    @classmethod
+    async def read(cls, path: Path) -> bytes:
+        """
+        一次线程切换读取整个文件
+        """
+        return await cls.run(path.read_bytes)
+
+    @classmethod
+    def metrics(cls) -> dict[str, Any]:
+        """
+        线程池指标
+        :return: workers / queued 当前排队 / running 正在执行 / peak_queued 最大排队 /
+                 calls / errors / avg_wait_ms 平均排队 / max_wait_ms 最长排队 / avg_run_ms 平均执行
+        """
+        with cls._lock:
+            calls = cls.stats["calls"]
+            return {
+                "workers": cls.workers,
+                "queued": cls.queued,
+                "running": cls.running,
+                "peak_queued": cls.peak_queued,
+                "calls": calls,
+                "errors": cls.stats["errors"],
+                "avg_wait_ms": cls.wait_total / calls * 1e3 if calls else 0.0,
+                "max_wait_ms": cls.wait_max * 1e3,
+                "avg_run_ms": cls.run_total / calls * 1e3 if calls else 0.0,
+            }
+
+    @classmethod
+    def resetMetrics(cls) -> None:
+        """
+        清零累计指标（不影响正在排队/执行的计数）
+        """
+        with cls._lock:
+            cls.stats.clear()
+            cls.peak_queued = cls.queued
+            cls.wait_total = cls.wait_max = cls.run_total = 0.0
@@ -0,0 +1,125 @@
+"""
+AIVK 根目录（租户）
+一个进程可以同时服务多个相互隔离的根目录：每个根目录有自己的 AivkFS 实例、配置缓存与 SQLite 引擎，
+模块导入、I/O 线程池等进程级资源共享
+当前根目录保存在 contextvar 中，AivkFS.root / AivkFS.getFS / AivkConfig.getConfig 等按当前根目录工作，
+在 use() 中创建的任务继承该根目录，因此原有的模块代码不需要修改
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, ClassVar, Iterator, TypeVar
+
+from logging import getLogger
+
+if TYPE_CHECKING:
+    from .fs import AivkFS
+
+logger = getLogger("aivk.root")
+
+T = TypeVar("T")
+
+_current: ContextVar[AivkRoot | None] = ContextVar("aivk_root", default=None)
+
+
+class AivkRoot:
+    """
+    隔离的 AIVK 根目录
+    example:
+    >>> tenant = AivkRoot.get("/srv/aivk/tenant-1")
+    >>> with tenant.use():
+    ...     config = await AivkConfig.getConfig("aivk.app")  # 读写 /srv/aivk/tenant-1/etc/app.json
+    >>> await tenant.close()
+    """
+    __slots__ = ("path", "fs", "state")
+
+    # 路径 -> 根目录
+    roots: ClassVar[dict[Path, AivkRoot]] = {}
+    # 未进入任何 use() 时使用的根目录（AIVK_ROOT 或 ~/.aivk）
+    default: ClassVar[AivkRoot]
+    # close 时依次 await 的钩子（如写入该根目录下未保存的配置、释放引擎）
+    close_hooks: ClassVar[list[Callable[[AivkRoot], Awaitable[Any]]]] = []
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        # 模块 id -> AivkFS
+        self.fs: dict[str, AivkFS] = {}
+        # 其他模块按根目录保存的状态，见 scoped
+        self.state: dict[str, Any] = {}
+
+    def __repr__(self) -> str:
+        return f"AivkRoot({str(self.path)!r})"
+
+    @classmethod
+    def get(cls, path: Path | str) -> AivkRoot:
+        """
+        获取路径对应的根目录，同一路径返回同一实例
+        """
+        key = Path(path).absolute()
+        if key == cls.default.path.absolute():
+            return cls.default
+        root = cls.roots.get(key)
+        if root is None:
+            root = cls.roots[key] = cls(key)
+        return root
+
+    @classmethod
+    def current(cls) -> AivkRoot:
+        """
+        当前上下文的根目录
+        """
+        return _current.get() or cls.default
+
+    @classmethod
+    def of(cls, path: Path) -> AivkRoot | None:
+        """
+        包含该路径的根目录（多个时取最深的一个）
+        """
+        found: AivkRoot | None = None
+        for root in (cls.current(), cls.default, *cls.roots.values()):
+            if path.is_relative_to(root.path) and (found is None or len(root.path.parts) > len(found.path.parts)):
+                found = root
+        return found
+
+    @contextmanager
+    def use(self) -> Iterator[AivkRoot]:
+        """
+        在当前上下文（及其中创建的任务）中切换到该根目录，可嵌套
+        """
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def scoped(self, key: str, factory: Callable[[], T]) -> T:
+        """
+        按根目录保存的状态，首次访问时创建
+        :param key: 状态名
+        :param factory: 创建函数
+        """
+        try:
+            return self.state[key]
+        except KeyError:
+            value = self.state[key] = factory()
+            return value
+
+    async def close(self) -> None:
+        """
+        关闭根目录：执行关闭钩子，清空该根目录的状态
+        """
+        for hook in self.close_hooks:
+            try:
+                await hook(self)
+            except Exception as e:
+                logger.error(f"根目录 {self.path} 关闭钩子执行失败: {e}")
+        self.fs.clear()
+        self.state.clear()
+        if self is not AivkRoot.default:
+            AivkRoot.roots.pop(self.path, None)
+
+
+AivkRoot.default = AivkRoot(Path(os.getenv("AIVK_ROOT", Path().home() / ".aivk")))
@@ -1,6 +1,7 @@
 import asyncio
 from click import command
 from ...api import AivkFS
+from ...config import AivkConfigBase, AivkLifecycle, AivkSqlite
 from aivk.loader import AivkModLoader
 from logging import getLogger
 logger = getLogger("aivk.run")
@@ -16,6 +17,8 @@ def run() -> None:
     logger.debug("AivkModLoader 已注册到 AivkPM")
 
     async def main() -> None:
+        # SIGTERM 时先写入未保存的配置
+        AivkLifecycle.installSignals()
         logger.info("正在进入aivk 虚拟环境...")
         async with AivkFS.ctx() as fs:
             logger.info("Aivk 虚拟环境已进入")
@@ -24,5 +27,10 @@ def run() -> None:
             await asyncio.gather(*loader.aivk_pm.hook.onLoad(fs=fs))
         logger.info("已退出 Aivk 虚拟环境")
         await asyncio.gather(*reversed(loader.aivk_pm.hook.onUnload(fs=fs)))
+        # 写入模块卸载时修改的配置
+        report = await AivkConfigBase.flushAll()
+        if not report.ok:
+            logger.warning(f"部分配置未能写入：{report}")
+        await AivkSqlite.disposeAll()
 
     asyncio.run(main())
\ No newline at end of file
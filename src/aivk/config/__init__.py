@@ -1,9 +1,23 @@
 from .models import AivkConfig
 from .v1 import AivkConfigV1
 from .base import AivkConfigBase
+from .sqlite import AivkSqlite
+from .codec import AivkCodec
+from .lifecycle import AivkLifecycle
+from .snapshot import AivkSnapshot
+from .view import AivkConfigView
+from .compact import AivkCompactConfig
+from .layers import AivkResolvedView
 
 __all__ = [
     "AivkConfig",
     "AivkConfigV1",
     "AivkConfigBase",
+    "AivkSqlite",
+    "AivkCodec",
+    "AivkLifecycle",
+    "AivkSnapshot",
+    "AivkConfigView",
+    "AivkCompactConfig",
+    "AivkResolvedView",
 ]
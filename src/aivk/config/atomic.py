@@ -0,0 +1,164 @@
+"""
+原子写入配置文件
+先写同目录下的临时文件，再 os.replace 覆盖目标文件：崩溃或并发保存都不会留下截断/交错的配置
+fsync 策略：
+    never  不调用 fsync，只保证原子替换（进程崩溃安全，断电可能丢失最近的写入）
+    always 每次写入都 fsync 文件和目录
+    batch  写入后登记，每 interval 秒统一 fsync 一次
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+import os
+import threading
+from pathlib import Path
+from typing import ClassVar, Literal
+import uuid
+
+from logging import getLogger
+
+from ..base.io import AivkIO
+
+logger = getLogger("aivk.config.atomic")
+
+FsyncMode = Literal["never", "always", "batch"]
+
+
+class AivkAtomicWriter:
+    """
+    原子写入与 fsync 策略
+    """
+    mode: ClassVar[FsyncMode] = "never"
+    interval: ClassVar[float] = 1.0  # batch 模式下的 fsync 间隔
+    pending: ClassVar[set[Path]] = set()  # batch 模式下等待 fsync 的文件
+    # writes 写入次数 / fsyncs fsync 的文件数 / batches batch 模式的 fsync 轮数
+    stats: ClassVar[Counter[str]] = Counter()
+    _task: ClassVar[asyncio.Task[None] | None] = None
+
+    @classmethod
+    def configure(cls, mode: FsyncMode, interval: float | None = None) -> None:
+        """
+        设置 fsync 策略
+        :param mode: never / always / batch
+        :param interval: batch 模式下的 fsync 间隔（秒）
+        """
+        if mode not in ("never", "always", "batch"):
+            raise ValueError(f"Unsupported fsync mode: {mode}")
+        cls.mode = mode
+        if interval is not None:
+            cls.interval = interval
+        logger.debug(f"fsync 策略：{mode}，间隔 {cls.interval}s")
+
+    @classmethod
+    async def write(cls, path: Path, data: bytes) -> None:
+        """
+        原子写入文件
+        被取消时，线程中的写入在替换目标文件前放弃；已经开始替换的写入仍会完成
+        :param path: 目标文件
+        :param data: 文件内容
+        """
+        cancelled = threading.Event()
+        try:
+            await AivkIO.run(cls.write_sync, path, data, cls.mode == "always", cancelled)
+        except asyncio.CancelledError:
+            # 取消不会中断线程，由线程在 os.replace 之前检查
+            cancelled.set()
+            raise
+        cls.written(path)
+
+    @classmethod
+    def written(cls, path: Path) -> None:
+        """
+        记录一次已完成的 write_sync（fsync 参数需与当前策略一致）
+        统计写入次数，batch 模式下登记等待 fsync
+        """
+        cls.stats["writes"] += 1
+        if cls.mode == "always":
+            cls.stats["fsyncs"] += 1
+        elif cls.mode == "batch":
+            cls.pending.add(path)
+            loop = asyncio.get_running_loop()
+            if cls._task is None or cls._task.done() or cls._task.get_loop() is not loop:
+                cls._task = loop.create_task(cls._batch())
+
+    @staticmethod
+    def write_sync(path: Path, data: bytes, fsync: bool = False, cancelled: threading.Event | None = None) -> bool:
+        """
+        同步原子写入（在 I/O 线程池中执行）
+        目录不存在时创建
+        :param cancelled: 替换目标文件前检查，已设置时放弃写入并保留原文件
+        :return: 是否已写入
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            try:
+                # 保留原文件权限
+                os.chmod(tmp, os.stat(path).st_mode)
+            except FileNotFoundError:
+                pass
+            if cancelled is not None and cancelled.is_set():
+                tmp.unlink(missing_ok=True)
+                return False
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        if fsync:
+            _fsync_dir(path.parent)
+        return True
+
+    @classmethod
+    async def _batch(cls) -> None:
+        """
+        batch 模式：每 interval 秒 fsync 一次登记的文件
+        """
+        while cls.pending:
+            await asyncio.sleep(cls.interval)
+            await cls.sync()
+
+    @classmethod
+    async def sync(cls) -> None:
+        """
+        立即 fsync 所有登记的文件
+        程序退出前调用
+        """
+        if not cls.pending:
+            return
+        paths, cls.pending = cls.pending, set()
+        await AivkIO.run(_fsync_paths, paths)
+        cls.stats["fsyncs"] += len(paths)
+        cls.stats["batches"] += 1
+
+
+def _fsync_dir(directory: Path) -> None:
+    """
+    fsync 目录，使 rename 持久化（Windows 不支持打开目录）
+    """
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_paths(paths: set[Path]) -> None:
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    for directory in {path.parent for path in paths}:
+        _fsync_dir(directory)
@@ -1,14 +1,33 @@
 from abc import abstractmethod ,ABC
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import os
 from pathlib import Path
-from typing import Any, ClassVar, Self
-from pydantic import BaseModel, ConfigDict
+from typing import Any, AsyncIterator, Awaitable, Callable, ClassVar, Self
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 from logging import getLogger
 
-from ..base import AivkFS
+from ..base import AivkFS, AivkRoot
+from ..base.io import AivkIO
+from .atomic import AivkAtomicWriter
+from .codec import AivkCodec
+from .diff import MISSING, diff, get_path, related, set_path
+from .journal import AivkJournal
+from .layers import AivkResolvedView, env_items, env_layer, env_prefix, merge
+from .lifecycle import AivkFlushReport, AivkLifecycle
+from .snapshot import AivkSnapshot
+from .tree import tree_of
+from .view import AivkConfigView
+from .watch import AivkWatcher
 
 logger = getLogger("aivk.config.base")
 
+# 当前任务持有事务的配置（id），子任务继承，嵌套的事务据此并入外层
+_transactions: ContextVar[frozenset[int]] = ContextVar("aivk_config_transactions", default=frozenset())
+
 class AivkConfigBase(BaseModel, ABC):
     """
     Base configuration model for AIVK.
@@ -18,7 +37,24 @@ class AivkConfigBase(BaseModel, ABC):
     """
     _path : Path = AivkFS.root  # 默认配置文件路径
     _format: str = 'json'  # 默认文件格式
+    _persisted: dict[str, Any] | None = None  # 最近一次与文件同步时的数据，用于脏检查
+    _stat: tuple[int, int, int] | None = None  # 最近一次与文件同步时的 (mtime_ns, size, inode)
+    _write_delay: float | None = None  # 延迟写入（write-behind）时间，None 表示立即写入
+    _flush_task: asyncio.Task[None] | None = None  # 等待中的延迟写入任务
+    _tx_depth: int = 0  # 持有事务的任务中的嵌套层数，大于 0 时 save() 推迟到事务提交
+    _tx_lock: asyncio.Lock | None = None  # 串行执行不同任务的事务
+    _tx_outside: dict[str, Any] | None = None  # 事务进行中其他任务对顶层键的赋值，回滚时保留
+    _view: AivkConfigView | None = None  # 最近一次发布的只读快照
+    _resolved: tuple[int, Any, tuple[tuple[str, str], ...], AivkResolvedView] | None = None  # 分层解析缓存
+    _reload_callbacks: list[Callable[[Any], Awaitable[None]]] = PrivateAttr(default_factory=list)  # 热重载回调
+    _key_callbacks: dict[str, list[Callable[[Any, Any], Awaitable[None]]]] = PrivateAttr(default_factory=dict)  # 字段变化回调
     model_config: ClassVar[ConfigDict] = ConfigDict(extra='allow' )  # 允许额外字段
+
+    # 等待延迟写入的配置，关闭时由 flushAll 统一写入
+    pending: ClassVar[dict[int, "AivkConfigBase"]] = {}
+    # 写入统计：written 实际写入 / skipped 无变化跳过 / merged 合并到延迟写入
+    save_stats: ClassVar[Counter[str]] = Counter()
+
     @property
     def default(self) -> dict[Any, Any]:
         """
@@ -70,6 +106,283 @@ class AivkConfigBase(BaseModel, ABC):
         self._format = value  # 设置实例变量
         logger.debug(f"设置实例配置文件格式，_format = {value}")
 
+    @property
+    def write_delay(self) -> float | None:
+        """
+        获取延迟写入时间
+        :return: 秒，None 表示每次 save() 立即写入
+        """
+        return self._write_delay
+
+    @write_delay.setter
+    def write_delay(self, value: float | None) -> None:
+        """
+        设置延迟写入时间
+        开启后，delay 秒内的多次 save() 只会写入一次
+        :param value: 秒，None 关闭延迟写入
+        """
+        self._write_delay = value
+        logger.debug(f"设置实例延迟写入，_write_delay = {value}")
+
+    @property
+    def dirty(self) -> bool:
+        """
+        内存中的配置是否与文件不一致
+        """
+        return self._persisted is None or self.model_dump() != self._persisted
+
+    @property
+    def in_transaction(self) -> bool:
+        """
+        是否有任务处于该配置的 transaction() 中
+        """
+        return self._tx_depth > 0
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        # 事务进行中其他任务的顶层赋值不属于该事务，回滚时重新应用
+        # （嵌套值的原地修改无法区分来源，会随回滚一并恢复）
+        outside = self.__pydantic_private__.get("_tx_outside") if name[0] != "_" else None
+        if outside is not None and id(self) not in _transactions.get():
+            outside[name] = value
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name: str) -> None:
+        outside = self.__pydantic_private__.get("_tx_outside") if name[0] != "_" else None
+        if outside is not None and id(self) not in _transactions.get():
+            outside[name] = MISSING
+        super().__delattr__(name)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[Self]:
+        """
+        配置事务：块内的多次修改在提交时只验证一次、写入一次、通知一次
+        块内调用 save() 不会写入；净变化为空时不写入也不通知
+        块内抛出异常（包括提交时验证失败）时恢复内存中的配置，不触碰文件
+        同一任务中嵌套的事务并入最外层，只由最外层提交；不同任务的事务依次执行
+        example:
+        >>> async with config.transaction():
+        ...     config.host = "0.0.0.0"
+        ...     config.port = 8080
+        """
+        held = _transactions.get()
+        if id(self) in held:
+            # 嵌套事务：回滚只恢复本层的修改，由最外层提交
+            snapshot = self.model_dump()
+            self._tx_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._apply(self.model_dump(warnings=False), snapshot)
+                raise
+            finally:
+                self._tx_depth -= 1
+            return
+
+        if self._tx_lock is None:
+            self._tx_lock = asyncio.Lock()
+        async with self._tx_lock:
+            snapshot = self.model_dump()
+            token = _transactions.set(held | {id(self)})
+            self._tx_outside = {}
+            self._tx_depth += 1
+            try:
+                yield self
+                # 块内赋值未经验证，序列化时不输出类型警告
+                current = self.model_dump(warnings=False)
+                # 统一验证一次，并应用验证器的类型转换
+                validated = self.__pydantic_validator__.validate_python(current)
+                self._apply(current, validated.model_dump())
+            except BaseException:
+                self._apply(self.model_dump(warnings=False), snapshot)
+                # 其他任务在事务期间的赋值不属于本事务，不回滚
+                for name, value in self._tx_outside.items():
+                    if value is not MISSING:
+                        setattr(self, name, value)
+                    elif name in self.model_dump(warnings=False):
+                        delattr(self, name)
+                logger.debug(f"配置事务回滚：{self.path}")
+                raise
+            finally:
+                self._tx_depth -= 1
+                self._tx_outside = None
+                _transactions.reset(token)
+
+            changes = diff(snapshot, self.model_dump())
+            if not changes:
+                logger.debug(f"配置事务无变化：{self.path}")
+                return
+            await self.save()
+            # 延迟写入时 save() 不会立即发布，提交即发布
+            if self.dirty:
+                self._publish(self.model_dump())
+        # 回调中可以再开启事务
+        await self._notify(snapshot, changes)
+
+    def _mark_clean(self) -> None:
+        """
+        记录当前数据为已与文件同步的状态
+        同时记录文件指纹，供 reload 判断文件是否变化，并发布只读快照
+        """
+        self._persisted = self.model_dump()
+        self._stat = self._fingerprint()
+        self._publish(self._persisted)
+
+    @property
+    def snapshot(self) -> AivkConfigView:
+        """
+        最近一次发布的只读快照，读取无需加锁
+        加载、保存、重新加载、事务提交时发布；直接赋值但未保存的修改不可见
+        """
+        view = self._view
+        if view is None:
+            view = self._publish(self.model_dump())
+        return view
+
+    def resolve(self) -> AivkResolvedView:
+        """
+        分层解析：类默认值 -> getConfig 默认配置 -> 配置文件 -> AIVK_* 环境变量
+        文件层使用 snapshot（已保存/提交的数据）；结果缓存到任一层变化为止
+        example:
+        >>> resolved = config.resolve()
+        >>> resolved.db.pool_size, resolved.source("db.pool_size")
+        """
+        view = self.snapshot
+        default = self.default
+        try:
+            prefix = env_prefix(tree_of(self.path))
+        except ValueError:
+            prefix = None  # 不在 AivkFS.root 下的配置没有环境变量层
+        items = env_items(prefix) if prefix else ()
+
+        cached = self._resolved
+        if cached is not None and cached[0] == view.version and cached[1] is default and cached[2] == items:
+            return cached[3]
+
+        fields = type(self).model_fields
+        class_layer = {
+            name: field.get_default(call_default_factory=True)
+            for name, field in fields.items()
+            if not field.is_required()
+        }
+        # 未在文件中出现的声明字段来自类默认值
+        fields_set = self.model_fields_set
+        file_layer = {key: value for key, value in view._data.items() if key not in fields or key in fields_set}
+        doc, sources = merge([("class", class_layer), ("default", default), ("file", file_layer)])
+        if prefix and items:
+            merge([("env", env_layer(prefix, items, doc))], doc, sources)
+        resolved = AivkResolvedView(doc, sources, view.version)
+        self._resolved = (view.version, default, items, resolved)
+        return resolved
+
+    def _publish(self, doc: dict[str, Any]) -> AivkConfigView:
+        """
+        发布新的只读快照
+        :param doc: 发布后不再被修改的文档（写时复制）
+        """
+        previous = self._view
+        view = AivkConfigView(doc, previous.version + 1 if previous is not None else 1)
+        self._view = view
+        return view
+
+    def _fingerprint(self) -> tuple[int, int, int] | None:
+        """
+        获取配置文件指纹
+        :return: (mtime_ns, size, inode)，文件不存在时返回 None
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    @property
+    def stale(self) -> bool:
+        """
+        文件自上次加载/保存后是否可能被修改
+        """
+        return self._stat is None or self._fingerprint() != self._stat
+
+    @property
+    def reload_callbacks(self) -> list[Callable[[Self], Awaitable[None]]]:
+        """
+        获取热重载回调
+        """
+        return self._reload_callbacks
+
+    def onReload(self, func: Callable[[Self], Awaitable[None]]) -> Callable[[Self], Awaitable[None]]:
+        """
+        装饰器：注册热重载回调（支持多回调）
+        文件被外部修改并重新加载后，以配置实例为参数 await 回调
+        example:
+        >>> @config.onReload
+        ... async def changed(config): ...
+        """
+        self._reload_callbacks.append(func)
+        return func
+
+    def onChange(self, key: str) -> Callable[[Callable[[Any, Any], Awaitable[None]]], Callable[[Any, Any], Awaitable[None]]]:
+        """
+        装饰器：订阅指定字段的变化
+        reload 后只有该字段（或其子字段）的值发生变化时才以 (旧值, 新值) await 回调
+        字段不存在的一侧为 MISSING
+        example:
+        >>> @config.onChange("db.pool_size")
+        ... async def resize(old, new): ...
+        :param key: 点分字段路径
+        """
+        def decorator(func: Callable[[Any, Any], Awaitable[None]]) -> Callable[[Any, Any], Awaitable[None]]:
+            self._key_callbacks.setdefault(key, []).append(func)
+            return func
+        return decorator
+
+    def _apply(self, old: dict[str, Any], data: dict[str, Any]) -> dict[str, tuple[Any, Any]]:
+        """
+        将新文档应用到内存，只修改发生变化的路径
+        :param old: 当前内存中的文档（model_dump()）
+        :param data: 新的配置文档
+        :return: 变化的路径 -> (旧值, 新值)
+        """
+        changes = diff(old, data)
+        for path, (_, new) in changes.items():
+            set_path(self, path, new)
+        return changes
+
+    async def _notify(self, old: dict[str, Any], changes: dict[str, tuple[Any, Any]]) -> None:
+        """
+        调用与变化路径相关的字段订阅
+        :param old: 应用变化前的文档
+        :param changes: _apply 的返回值
+        """
+        if not changes or not self._key_callbacks:
+            return
+        for key, callbacks in list(self._key_callbacks.items()):
+            if not any(related(key, path) for path in changes):
+                continue
+            before, after = get_path(old, key), get_path(self, key)
+            if before == after:
+                continue
+            for callback in list(callbacks):
+                try:
+                    await callback(before, after)
+                except Exception as e:
+                    logger.error(f"字段 {key} 变化回调异常: {e}")
+
+    def watch(self, polling: bool = False) -> None:
+        """
+        开始监控配置文件，外部修改时自动 reload 并调用 onReload 回调
+        自己 save() 引起的修改不会触发回调
+        需要在事件循环中调用
+        :param polling: 强制使用轮询（未安装 watchdog 时自动使用轮询）
+        """
+        AivkWatcher.get(polling=polling).watch(self)
+
+    def unwatch(self) -> None:
+        """
+        停止监控配置文件
+        """
+        if AivkWatcher._instance is not None:
+            AivkWatcher._instance.unwatch(self)
+
     @classmethod
     @abstractmethod
     async def load(cls, path: Path, default: dict[Any, Any]) -> Self:
@@ -80,41 +393,171 @@ class AivkConfigBase(BaseModel, ABC):
         """
         ...
 
-    @abstractmethod
-    async def save(self) -> None:
+    @classmethod
+    async def _load_file(cls, path: Path, default: dict[Any, Any]) -> Self:
+        """
+        按文件后缀选择编解码器加载配置文件
+        文件不存在时写入默认配置
+        :param path: 配置文件路径
+        :param default: 默认配置字典
+        """
+        format = path.suffix.lstrip('.').lower()
+        if format == AivkJournal.format:
+            # journal 格式：重放追加的记录
+            data = await AivkJournal.load(path, default)
+            return cls._loaded(cls.__pydantic_validator__.validate_python(data), default, format, path)
+        codec = AivkCodec.get(format)
+
+        if AivkSnapshot.enabled:
+            # 文件指纹未变化时直接使用快照中的数据
+            data = await AivkSnapshot.get(path, cls)
+            if data is not None:
+                return cls._loaded(cls.__pydantic_validator__.validate_python(data), default, format, path)
+
+        # 读取（或新建）在 I/O 线程池中一次完成
+        raw, created = await AivkIO.run(_read_or_create, path, codec, default)
+        if created:
+            AivkAtomicWriter.written(path)
+        if raw.strip():
+            config = codec.validate(cls, raw)
+        else:  # 处理空文件情况
+            config = cls.__pydantic_validator__.validate_python(default)
+        return cls._loaded(config, default, format, path)
+
+    @classmethod
+    def _loaded(cls, config: Self, default: dict[Any, Any], format: str, path: Path) -> Self:
+        """
+        设置加载后的内部属性
+        """
+        config._default = default
+        config._format = format  # 保存格式信息
+        config._path = path  # 设置配置文件路径
+        config._mark_clean()
+        AivkLifecycle.register(config)
+        return config
+
+    async def save(self, force: bool = False) -> None:
         """
         异步保存配置
-        将内存值同步回文件
+        将内存值同步回文件；配置未变化时不会写入
+        开启延迟写入时，只安排一次稍后的写入，期间的其他 save() 被合并
+        :param force: 忽略脏检查与延迟写入，立即写入
         """
-        ...
+        if force:
+            await self.flush(force=True)
+            return
+
+        if id(self) in _transactions.get():
+            # 由本任务的事务提交时统一写入
+            self.save_stats["merged"] += 1
+            return
+
+        if self._tx_depth and self._tx_lock is not None:
+            # 其他任务的事务进行中：等待其提交或回滚后再写入，不写入事务的中间状态
+            async with self._tx_lock:
+                await self.save()
+            return
+
+        if not self.dirty:
+            self.save_stats["skipped"] += 1
+            logger.debug(f"配置未变化，跳过写入：{self.path}")
+            return
+
+        if self.write_delay is None:
+            await self.flush()
+            return
+
+        if self._flush_task is not None and not self._flush_task.done():
+            self.save_stats["merged"] += 1
+            return
+
+        self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush(self.write_delay))
+        self.pending[id(self)] = self
+
+    async def _delayed_flush(self, delay: float) -> None:
+        """
+        延迟写入任务
+        """
+        await asyncio.sleep(delay)
+        while self.in_transaction:
+            # 不写入事务中的中间状态
+            await asyncio.sleep(delay)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"延迟写入配置失败 {self.path}: {e}")
+
+    async def flush(self, force: bool = False) -> None:
+        """
+        立即写入等待中的修改
+        :param force: 即使配置未变化也写入
+        """
+        task, self._flush_task = self._flush_task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        self.pending.pop(id(self), None)
+
+        if not force and not self.dirty:
+            return
+        await self._write()
+        self._mark_clean()
+        self.save_stats["written"] += 1
+
+    @classmethod
+    async def flushAll(cls, timeout: float | None = None, root: AivkRoot | None = None) -> AivkFlushReport:
+        """
+        并发写入所有存活配置的未保存修改（包括等待中的延迟写入），并 fsync batch 模式下登记的文件
+        开启启动快照时同时更新快照
+        AivkFS.ctx 退出时自动调用；模块 onUnload 之后、程序退出前也应调用
+        :param timeout: 期限（秒），None 使用 AivkLifecycle.timeout
+        :param root: 只写入属于该根目录的配置，并只更新该根目录的快照（关闭一个 AivkRoot 时）
+        :return: 写入报告（已写入 / 失败 / 超时）
+        """
+        report = await AivkLifecycle.flush(list(cls.pending.values()), timeout, root)
+        if AivkSnapshot.enabled:
+            try:
+                await AivkSnapshot.save(root)
+            except Exception as e:
+                logger.error(f"写入配置快照失败: {e}")
+        return report
+
+    async def _write(self) -> None:
+        """
+        将内存值写入文件
+        按文件格式选择编解码器（journal 格式追加记录），子类可覆盖以支持非文件存储
+        """
+        if self.format == AivkJournal.format:
+            # 只追加变化的顶层键
+            await AivkJournal.save(self)
+            return
+        codec = AivkCodec.get(self.format)
+        # 原子替换，崩溃或并发保存不会留下截断的文件
+        await AivkAtomicWriter.write(self.path, codec.encode(self.model_dump()))
 
     @abstractmethod
-    async def reload(self) -> None:
+    async def reload(self, force: bool = False) -> None:
         """
         异步重新加载配置
         从文件中读取最新配置并更新内存
+        文件未变化且内存未修改时直接返回
+        :param force: 忽略文件指纹，强制重新加载
         """
         ...
 
-    def __del__(self):
-        """
-        对象销毁时调用，保存配置
-        """
-        try:
-            # 注意：析构函数中不能使用await，这里保持同步版本作为备份
-            # 建议在主程序中手动调用async save()
-            import asyncio
-            try:
-                loop = asyncio.get_running_loop()
-                # 检查事件循环是否正在运行且未关闭
-                if loop and not loop.is_closed() and loop.is_running():
-                    # 如果有运行中的事件循环，创建任务
-                    loop.create_task(self.save())
-                else:
-                    logger.debug("析构时事件循环不可用，跳过异步保存")
-            except RuntimeError:
-                # 没有运行中的事件循环，跳过保存
-                logger.debug("析构时无法异步保存配置，请确保在程序结束前手动调用save()")
-            logger.debug("对象销毁时尝试自动保存配置")
-        except Exception as e:
-            logger.debug(f"析构时保存配置失败: {e}")
+
+def _read_or_create(path: Path, codec: AivkCodec, default: dict[Any, Any]) -> tuple[bytes, bool]:
+    """
+    读取配置文件，不存在时写入默认配置
+    :return: (文件内容, 是否新建)
+    """
+    try:
+        return path.read_bytes(), False
+    except FileNotFoundError:
+        raw = codec.encode(default)
+        AivkAtomicWriter.write_sync(path, raw, AivkAtomicWriter.mode == "always")
+        return raw, True
+
+
+# AivkFS.ctx 退出时写入未保存的配置
+AivkFS.exit_hooks.append(AivkConfigBase.flushAll)
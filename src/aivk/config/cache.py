@@ -0,0 +1,196 @@
+"""
+AivkConfig 的配置缓存
+默认不限制大小，与原来的 dict 行为一致；可设置 LRU 上限、TTL 与弱引用
+被淘汰的配置会先写入未保存的修改，独立的 SQLite 引擎会被释放
+被淘汰但仍被持有的配置总是以弱引用保留，再次获取时返回同一实例，不会出现两个互相覆盖的实例
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter, OrderedDict
+import time
+from typing import Any, Iterator
+from weakref import WeakValueDictionary
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from logging import getLogger
+
+from .base import AivkConfigBase
+from .sqlite import AivkSqlite
+
+logger = getLogger("aivk.config.cache")
+
+
+class AivkConfigCache:
+    """
+    tree#format -> 配置 / 引擎
+    :param max_entries: 强引用条目上限，None 表示不限制
+    :param ttl: 条目存活秒数，None 表示不过期
+    :param weak: SQLite 引擎淘汰后是否也以弱引用保留（配置总是保留弱引用）
+    """
+    def __init__(self, max_entries: int | None = None, ttl: float | None = None, weak: bool = False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.weak = weak
+        self.entries: OrderedDict[str, tuple[AivkConfigBase | AsyncEngine, float]] = OrderedDict()
+        self.weak_entries: WeakValueDictionary[str, Any] = WeakValueDictionary()
+        # hits 命中 / misses 未命中 / evictions 因容量淘汰 / expirations 因 TTL 过期
+        self.stats: Counter[str] = Counter()
+        self.tasks: set[asyncio.Task[None]] = set()
+        self._swept_at = time.monotonic()
+
+    def policy(self, max_entries: int | None = None, ttl: float | None = None, weak: bool = False) -> None:
+        """
+        设置缓存策略，超出新上限的条目立即淘汰
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.weak = weak
+        if not weak:
+            for key in [key for key, value in self.weak_entries.items() if isinstance(value, AsyncEngine)]:
+                self.weak_entries.pop(key, None)
+        self._shrink()
+
+    def _expired(self, expires_at: float) -> bool:
+        return expires_at <= time.monotonic()
+
+    def _lookup(self, key: str) -> AivkConfigBase | AsyncEngine | None:
+        """
+        查找条目，不计入统计
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            if not self._expired(entry[1]):
+                self.entries.move_to_end(key)
+                return entry[0]
+            del self.entries[key]
+            self.stats["expirations"] += 1
+            self._release(key, entry[0])
+            # 不保留强引用：弱引用只返回仍被其他地方持有的配置
+            del entry
+        value = self.weak_entries.pop(key, None)
+        if value is not None:
+            # 仍被持有，重新放回强引用区
+            self[key] = value
+            return value
+        return None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._lookup(key)
+        if value is None:
+            self.stats["misses"] += 1
+            return default
+        self.stats["hits"] += 1
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._lookup(key) is not None
+
+    def __getitem__(self, key: str) -> AivkConfigBase | AsyncEngine:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: AivkConfigBase | AsyncEngine) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        self.weak_entries.pop(key, None)
+        self._shrink()
+
+    def __delitem__(self, key: str) -> None:
+        del self.entries[key]
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        entry = self.entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.entries))
+
+    def keys(self) -> list[str]:
+        return list(self.entries)
+
+    def values(self) -> list[AivkConfigBase | AsyncEngine]:
+        return [value for value, _ in self.entries.values()]
+
+    def items(self) -> list[tuple[str, AivkConfigBase | AsyncEngine]]:
+        return [(key, value) for key, (value, _) in self.entries.items()]
+
+    def clear(self) -> None:
+        """
+        清空缓存，不写入也不释放
+        """
+        self.entries.clear()
+        self.weak_entries.clear()
+        self.stats.clear()
+
+    def _shrink(self) -> None:
+        """
+        清除过期的条目，并按 LRU 淘汰超出上限的条目
+        """
+        self._sweep()
+        if self.max_entries is None:
+            return
+        while len(self.entries) > self.max_entries:
+            key, (value, _) = self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+            self._release(key, value)
+
+    def _sweep(self) -> None:
+        """
+        清除过期的条目（每个 TTL 周期最多扫描一次），未再访问的条目不会一直占用缓存
+        """
+        if self.ttl is None:
+            return
+        now = time.monotonic()
+        if now - self._swept_at < self.ttl:
+            return
+        self._swept_at = now
+        for key in [key for key, (_, expires_at) in self.entries.items() if expires_at <= now]:
+            value, _ = self.entries.pop(key)
+            self.stats["expirations"] += 1
+            self._release(key, value)
+
+    def _release(self, key: str, value: AivkConfigBase | AsyncEngine) -> None:
+        """
+        淘汰条目：写入未保存的修改 / 释放引擎
+        配置总是保留弱引用，引擎只在弱引用模式下保留
+        无需写入或释放时不创建任务，不延长条目的存活时间
+        """
+        logger.debug(f"淘汰配置缓存：{key}")
+        if self.weak or not isinstance(value, AsyncEngine):
+            self.weak_entries[key] = value
+        if not ((not AivkSqlite.isShared(value)) if isinstance(value, AsyncEngine) else value.dirty):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            logger.warning(f"淘汰 {key} 时没有运行中的事件循环，未写入/释放")
+            return
+        task = loop.create_task(self._close(key, value))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _close(self, key: str, value: AivkConfigBase | AsyncEngine) -> None:
+        try:
+            if isinstance(value, AsyncEngine):
+                # 共享引擎的句柄与其他配置树共用连接池，不单独释放
+                if not AivkSqlite.isShared(value):
+                    await value.dispose()
+            elif value.dirty:
+                await value.flush()
+        except Exception as e:
+            logger.error(f"淘汰 {key} 时写入/释放失败: {e}")
+
+    async def drain(self) -> None:
+        """
+        等待所有淘汰任务完成
+        """
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks), return_exceptions=True)
@@ -0,0 +1,174 @@
+"""
+配置文件编解码器
+按文件后缀注册，配置类通过后缀找到编解码器读写文件
+同一后缀可以有多个实现（如 json 的 stdlib / orjson），运行时选择，未安装时回退到标准库
+"""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import json
+import tomllib
+from typing import Any, ClassVar, TypeVar
+
+import toml
+from pydantic import BaseModel
+
+from logging import getLogger
+
+logger = getLogger("aivk.config.codec")
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class AivkCodec(ABC):
+    """
+    配置编解码器
+    子类实现 encode / decode；有更快的字节路径时覆盖 validate
+    同一后缀的不同实现应输出相同格式的内容（如 json 均缩进 2 格），切换实现不改变写入的文件
+    """
+    suffix: ClassVar[str] = ""
+    name: ClassVar[str] = "stdlib"
+
+    # 后缀 -> 当前使用的编解码器
+    codecs: ClassVar[dict[str, AivkCodec]] = {}
+    # 后缀 -> 实现名 -> 编解码器类（实例化时抛出 ImportError 表示依赖未安装）
+    implementations: ClassVar[dict[str, dict[str, type[AivkCodec]]]] = {}
+
+    @abstractmethod
+    def encode(self, data: dict[Any, Any]) -> bytes:
+        """
+        配置文档 -> 文件内容
+        """
+
+    @abstractmethod
+    def decode(self, raw: bytes) -> dict[Any, Any]:
+        """
+        文件内容 -> 配置文档
+        """
+
+    def validate(self, model: type[M], raw: bytes) -> M:
+        """
+        文件内容 -> 配置实例
+        默认先 decode 再验证，子类可以直接从字节验证
+        """
+        return model.__pydantic_validator__.validate_python(self.decode(raw))
+
+    @classmethod
+    def register(cls, codec: type[AivkCodec], use: bool = False) -> type[AivkCodec]:
+        """
+        注册编解码器实现（可作为类装饰器）
+        按 codec.suffix / codec.name 登记，同一后缀第一个可用的实现默认启用
+        :param codec: 编解码器类
+        :param use: 立即启用该实现
+        """
+        cls.implementations.setdefault(codec.suffix, {})[codec.name] = codec
+        if use or codec.suffix not in cls.codecs:
+            cls.use(codec.suffix, codec.name, quiet=not use)
+        return codec
+
+    @classmethod
+    def use(cls, suffix: str, name: str, quiet: bool = False) -> bool:
+        """
+        选择后缀使用的实现，依赖未安装时保持当前实现
+        example:
+        >>> AivkCodec.use("json", "orjson")
+        :param quiet: 依赖未安装时不输出警告
+        :return: 是否切换成功
+        """
+        implementation = cls.implementations.get(suffix, {}).get(name)
+        if implementation is None:
+            raise ValueError(f"Unknown codec for {suffix}: {name}")
+        try:
+            codec = implementation()
+        except ImportError as e:
+            current = cls.codecs.get(suffix)
+            message = f"编解码器 {suffix}:{name} 不可用（{e}），继续使用 {current.name if current else None}"
+            if quiet:
+                logger.debug(message)
+            else:
+                logger.warning(message)
+            return False
+        cls.codecs[suffix] = codec
+        logger.debug(f"{suffix} 使用编解码器 {name}")
+        return True
+
+    @classmethod
+    def get(cls, suffix: str) -> AivkCodec:
+        """
+        获取后缀对应的编解码器
+        """
+        codec = cls.codecs.get(suffix)
+        if codec is None:
+            raise ValueError(f"Unsupported file format: {suffix}. Supported formats are: {', '.join(cls.codecs)}.")
+        return codec
+
+    @classmethod
+    def supports(cls, suffix: str) -> bool:
+        """
+        后缀是否有可用的编解码器
+        """
+        return suffix in cls.codecs
+
+
+class JsonCodec(AivkCodec):
+    suffix = "json"
+
+    def encode(self, data: dict[Any, Any]) -> bytes:
+        # 与 orjson 一致（orjson 只支持缩进 2 格）
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def decode(self, raw: bytes) -> dict[Any, Any]:
+        return json.loads(raw)
+
+    def validate(self, model: type[M], raw: bytes) -> M:
+        # 直接从字节解析并验证，不生成中间 dict
+        return model.__pydantic_validator__.validate_json(raw)
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+
+    def encode(self, data: dict[Any, Any]) -> bytes:
+        return self.orjson.dumps(data, option=self.orjson.OPT_INDENT_2 | self.orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, raw: bytes) -> dict[Any, Any]:
+        return self.orjson.loads(raw)
+
+    def validate(self, model: type[M], raw: bytes) -> M:
+        # orjson 解析比 pydantic 的 JSON 解析器更快，先解析再验证
+        return AivkCodec.validate(self, model, raw)
+
+
+class TomlCodec(AivkCodec):
+    suffix = "toml"
+
+    def encode(self, data: dict[Any, Any]) -> bytes:
+        return toml.dumps(data).encode("utf-8")
+
+    def decode(self, raw: bytes) -> dict[Any, Any]:
+        return tomllib.loads(raw.decode("utf-8"))
+
+
+class MsgpackCodec(AivkCodec):
+    suffix = "msgpack"
+    name = "msgpack"
+
+    def __init__(self):
+        import msgpack
+        self.msgpack = msgpack
+
+    def encode(self, data: dict[Any, Any]) -> bytes:
+        return self.msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, raw: bytes) -> dict[Any, Any]:
+        return self.msgpack.unpackb(raw, raw=False)
+
+
+AivkCodec.register(JsonCodec)
+AivkCodec.register(OrjsonCodec)
+AivkCodec.register(TomlCodec)
+AivkCodec.register(MsgpackCodec)
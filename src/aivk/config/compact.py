@@ -0,0 +1,264 @@
+"""
+紧凑配置表示
+面向大量（上万个）以读为主的配置，例如按租户划分的配置
+与 AivkConfigV1 相比：
+    - 不保存脏检查快照、回调列表等私有属性，只有固定的槽位
+    - 键名驻留（sys.intern），键集合相同的配置共享同一个形状（键 -> 下标）
+    - 值按下标保存在 tuple 中
+    - 内容相同的默认配置只保存一份
+形状与默认配置只由弱引用登记，不再被任何配置使用时随之释放
+属性访问方式与 AivkConfigV1 一致；需要事务、监控等完整功能时用 toConfig() 转换
+脏检查只跟踪顶层赋值：修改嵌套的值后需要重新赋值该顶层键
+"""
+from __future__ import annotations
+
+import copy
+import json
+from pathlib import Path
+import sys
+from typing import Any, ClassVar, Iterator, Mapping
+from weakref import WeakValueDictionary
+
+from logging import getLogger
+
+from ..base.io import AivkIO
+from .atomic import AivkAtomicWriter
+from .base import AivkConfigBase, _read_or_create
+from .codec import AivkCodec
+from .lifecycle import AivkLifecycle
+from .v1 import AivkConfigV1
+
+logger = getLogger("aivk.config.compact")
+
+
+class _Shape:
+    """
+    键集合相同的配置共享的布局
+    """
+    __slots__ = ("keys", "index", "__weakref__")
+
+    def __init__(self, keys: tuple[str, ...]):
+        self.keys = keys
+        self.index = {key: i for i, key in enumerate(keys)}
+
+
+class _Default(Mapping[str, Any]):
+    """
+    内容相同的配置共享的只读默认配置
+    """
+    __slots__ = ("_data", "__weakref__")
+
+    def __init__(self, data: dict[str, Any]):
+        self._data = data
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return repr(self._data)
+
+
+class AivkCompactConfig:
+    """
+    紧凑的只读为主配置
+    example:
+    >>> configs = await AivkConfig.getConfigs(trees, base=AivkCompactConfig)
+    >>> configs[0].name, configs[0]["name"]
+    """
+    __slots__ = ("_shape", "_values", "_path", "_format", "_default", "_dirty", "__weakref__")
+
+    _shape: _Shape
+    _values: tuple[Any, ...]
+    _path: str
+    _format: str
+    _default: _Default
+    _dirty: bool
+
+    # 键元组 -> 形状
+    shapes: ClassVar[WeakValueDictionary[tuple[str, ...], _Shape]] = WeakValueDictionary()
+    # 默认配置内容 -> 共享的只读默认配置
+    # getConfig 写入的 id / created_at 因配置而异，这类默认配置不会被共享，只随配置释放
+    defaults: ClassVar[WeakValueDictionary[str, _Default]] = WeakValueDictionary()
+
+    def __init__(self, data: dict[str, Any], path: Path | str = "", format: str = "json", default: dict[str, Any] | None = None):
+        data = _intern_keys(data)
+        object.__setattr__(self, "_shape", self._shape_of(tuple(data)))
+        object.__setattr__(self, "_values", tuple(data.values()))
+        object.__setattr__(self, "_path", str(path))
+        object.__setattr__(self, "_format", sys.intern(format))
+        object.__setattr__(self, "_default", self._share_default(default or {}))
+        object.__setattr__(self, "_dirty", False)
+
+    @classmethod
+    def _shape_of(cls, keys: tuple[str, ...]) -> _Shape:
+        shape = cls.shapes.get(keys)
+        if shape is None:
+            shape = cls.shapes[keys] = _Shape(keys)
+        return shape
+
+    @classmethod
+    def _share_default(cls, default: dict[str, Any]) -> _Default:
+        key = json.dumps(default, sort_keys=True, default=str)
+        shared = cls.defaults.get(key)
+        if shared is None:
+            shared = cls.defaults[key] = _Default(_intern_keys(copy.deepcopy(default)))
+        return shared
+
+    @classmethod
+    async def load(cls, path: Path, default: dict[Any, Any]) -> AivkCompactConfig:
+        """
+        异步加载配置，文件不存在时写入默认配置
+        只支持有编解码器的文件格式
+        :param path: 配置文件路径
+        :param default: 默认配置字典
+        """
+        format = path.suffix.lstrip('.').lower()
+        codec = AivkCodec.get(format)
+        raw, created = await AivkIO.run(_read_or_create, path, codec, default)
+        if created:
+            AivkAtomicWriter.written(path)
+        data = codec.decode(raw) if raw.strip() else copy.deepcopy(default)
+        return cls(data, path, format, default)
+
+    @classmethod
+    def fromConfig(cls, config: AivkConfigBase) -> AivkCompactConfig:
+        """
+        AivkConfigBase -> 紧凑配置
+        """
+        return cls(config.model_dump(), config.path, config.format, config.default)
+
+    def toConfig(self, base: type[AivkConfigBase] | None = None) -> AivkConfigBase:
+        """
+        紧凑配置 -> 完整配置类（可使用事务、监控、快照等功能）
+        :param base: 配置类，默认 AivkConfigV1
+        """
+        if base is None:
+            base = AivkConfigV1
+        config = base.__pydantic_validator__.validate_python(self.model_dump())
+        return base._loaded(config, copy.deepcopy(dict(self._default)), self._format, self.path)
+
+    @property
+    def path(self) -> Path:
+        return Path(self._path)
+
+    @property
+    def format(self) -> str:
+        return self._format
+
+    @property
+    def default(self) -> Mapping[str, Any]:
+        """
+        共享的只读默认配置
+        """
+        return self._default
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        i = self._shape.index.get(name)
+        if i is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        return self._values[i]
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name.startswith("_"):
+            raise AttributeError(f"'{type(self).__name__}' object attribute '{name}' is read-only")
+        shape = self._shape
+        i = shape.index.get(name)
+        if i is None:
+            # 新增键：切换到新的形状
+            object.__setattr__(self, "_shape", self._shape_of((*shape.keys, sys.intern(name))))
+            object.__setattr__(self, "_values", (*self._values, value))
+        else:
+            object.__setattr__(self, "_values", (*self._values[:i], value, *self._values[i + 1:]))
+        self._mark_dirty()
+
+    def __delattr__(self, name: str) -> None:
+        shape = self._shape
+        i = shape.index.get(name)
+        if i is None:
+            raise AttributeError(name)
+        object.__setattr__(self, "_shape", self._shape_of(shape.keys[:i] + shape.keys[i + 1:]))
+        object.__setattr__(self, "_values", self._values[:i] + self._values[i + 1:])
+        self._mark_dirty()
+
+    def _mark_dirty(self) -> None:
+        """
+        首次修改时登记到存活配置表，退出时由 flushAll 写入
+        只读的配置不登记，不占用登记表
+        """
+        if not self._dirty:
+            object.__setattr__(self, "_dirty", True)
+            AivkLifecycle.register(self)  # type: ignore[arg-type]
+
+    def __getitem__(self, key: str) -> Any:
+        i = self._shape.index.get(key)
+        if i is None:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._shape.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._shape.keys)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return f"AivkCompactConfig({self._path!r}, {dict(zip(self._shape.keys, self._values))!r})"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        i = self._shape.index.get(key)
+        return default if i is None else self._values[i]
+
+    def model_dump(self) -> dict[str, Any]:
+        """
+        可修改的配置文档（深拷贝）
+        """
+        return copy.deepcopy(dict(zip(self._shape.keys, self._values)))
+
+    async def save(self, force: bool = False) -> None:
+        """
+        写入修改；未修改时不写入
+        :param force: 即使未修改也写入
+        """
+        if not force and not self._dirty:
+            return
+        codec = AivkCodec.get(self._format)
+        await AivkAtomicWriter.write(self.path, codec.encode(dict(zip(self._shape.keys, self._values))))
+        object.__setattr__(self, "_dirty", False)
+
+    async def flush(self, force: bool = False) -> None:
+        await self.save(force)
+
+    async def reload(self, force: bool = False) -> None:
+        """
+        从文件重新加载（丢弃未保存的修改）
+        """
+        reloaded = await self.load(self.path, dict(self._default))
+        object.__setattr__(self, "_shape", reloaded._shape)
+        object.__setattr__(self, "_values", reloaded._values)
+        object.__setattr__(self, "_dirty", False)
+
+
+def _intern_keys(value: Any) -> Any:
+    """
+    递归驻留 dict 的字符串键
+    """
+    if isinstance(value, dict):
+        return {sys.intern(k) if isinstance(k, str) else k: _intern_keys(v) for k, v in value.items()}  # type: ignore[misc]
+    if isinstance(value, list):
+        return [_intern_keys(v) for v in value]  # type: ignore[misc]
+    return value
@@ -0,0 +1,87 @@
+"""
+配置文档结构化比较
+以点分路径（如 db.pool_size）表示字段，只深入两边都是 dict 的节点
+"""
+from typing import Any
+
+from pydantic import BaseModel
+
+
+class _Missing:
+    """
+    表示路径不存在（新增或删除的字段）
+    """
+    def __repr__(self) -> str:
+        return "MISSING"
+
+MISSING: Any = _Missing()
+
+
+def diff(old: dict[str, Any], new: dict[str, Any], prefix: str = "") -> dict[str, tuple[Any, Any]]:
+    """
+    比较两个配置文档
+    相同的子树直接跳过（dict 比较在 C 层完成），只为变化的叶子生成路径
+    :param old: 旧文档
+    :param new: 新文档
+    :param prefix: 路径前缀
+    :return: 点分路径 -> (旧值, 新值)，不存在的一侧为 MISSING
+    """
+    changes: dict[str, tuple[Any, Any]] = {}
+    if old == new:
+        return changes
+    for key in old.keys() | new.keys():
+        before = old.get(key, MISSING)
+        after = new.get(key, MISSING)
+        if before == after:
+            continue
+        path = f"{prefix}{key}"
+        if isinstance(before, dict) and isinstance(after, dict):
+            changes.update(diff(before, after, f"{path}."))  # type: ignore[arg-type]
+        else:
+            changes[path] = (before, after)
+    return changes
+
+
+def get_path(doc: Any, path: str) -> Any:
+    """
+    按点分路径取值
+    :return: 值，路径不存在时返回 MISSING
+    """
+    node = doc
+    for part in path.split("."):
+        if isinstance(node, dict):
+            node = node.get(part, MISSING)  # type: ignore[union-attr]
+        elif isinstance(node, BaseModel):
+            node = getattr(node, part, MISSING)
+        else:
+            return MISSING
+        if node is MISSING:
+            return MISSING
+    return node
+
+
+def set_path(target: Any, path: str, value: Any) -> None:
+    """
+    按点分路径原地修改，value 为 MISSING 时删除
+    中间节点可以是 dict 或 pydantic 模型
+    """
+    *parents, leaf = path.split(".")
+    node = target
+    for part in parents:
+        node = node[part] if isinstance(node, dict) else getattr(node, part)
+    if isinstance(node, dict):
+        if value is MISSING:
+            node.pop(leaf, None)  # type: ignore[union-attr]
+        else:
+            node[leaf] = value
+    elif value is MISSING:
+        delattr(node, leaf)
+    else:
+        setattr(node, leaf, value)
+
+
+def related(key: str, path: str) -> bool:
+    """
+    订阅的键与变化路径是否相关（相等、祖先或后代）
+    """
+    return key == path or key.startswith(f"{path}.") or path.startswith(f"{key}.")
@@ -0,0 +1,193 @@
+"""
+journal 配置格式
+适合频繁小修改的配置（计数器、游标、最近一次时间等）
+文件为 JSON Lines：
+    {"c": {...}}                 检查点，完整文档
+    {"s": {...}, "d": [...]}     一次保存：修改的顶层键 / 删除的顶层键
+保存时只追加变化的顶层键；加载时从最后一个检查点开始重放
+文件超过阈值后在后台压缩为一个新的检查点（原子替换）
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from logging import getLogger
+
+from ..base.io import AivkIO
+from .atomic import AivkAtomicWriter
+from .diff import MISSING
+
+if TYPE_CHECKING:
+    from .base import AivkConfigBase
+
+logger = getLogger("aivk.config.journal")
+
+
+class AivkJournal:
+    """
+    journal 存储
+    """
+    format = "journal"
+    threshold: ClassVar[int] = 64 * 1024  # 超过该大小且超过检查点两倍时压缩（字节）
+    bases: ClassVar[dict[Path, int]] = {}  # 路径 -> 最近一次检查点的大小
+    locks: ClassVar[dict[Path, asyncio.Lock]] = {}  # 同一文件的追加与压缩互斥
+    tasks: ClassVar[set[asyncio.Task[None]]] = set()  # 后台压缩任务
+    # appends 追加 / compactions 压缩 / torn 丢弃的不完整记录
+    stats: ClassVar[Counter[str]] = Counter()
+
+    @classmethod
+    def _lock(cls, path: Path) -> asyncio.Lock:
+        lock = cls.locks.get(path)
+        if lock is None:
+            lock = cls.locks[path] = asyncio.Lock()
+        return lock
+
+    @classmethod
+    async def load(cls, path: Path, default: dict[Any, Any]) -> dict[Any, Any]:
+        """
+        读取并重放 journal，文件不存在时以默认配置作为检查点新建
+        :param path: 配置文件路径
+        :param default: 默认配置字典
+        """
+        async with cls._lock(path):
+            data, created = await AivkIO.run(cls._load_sync, path, default)
+        if created:
+            AivkAtomicWriter.written(path)
+        return data
+
+    @classmethod
+    def _load_sync(cls, path: Path, default: dict[Any, Any]) -> tuple[dict[Any, Any], bool]:
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            cls._checkpoint(path, default)
+            return json.loads(json.dumps(default)), True
+
+        data: dict[Any, Any] = {}
+        base = 0
+        offset = 0
+        for line in raw.splitlines(keepends=True):
+            start, offset = offset, offset + len(line)
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                if not line.endswith(b"\n"):
+                    # 追加时崩溃留下的不完整记录，截掉以便继续追加
+                    cls.stats["torn"] += 1
+                    logger.warning(f"丢弃不完整的 journal 记录：{path}")
+                    os.truncate(path, start)
+                    break
+                raise
+            if "c" in record:
+                data = record["c"]
+                base = len(line)
+            else:
+                data.update(record.get("s", {}))
+                for key in record.get("d", ()):
+                    data.pop(key, None)
+        cls.bases[path] = base
+        return data, False
+
+    @classmethod
+    def _checkpoint(cls, path: Path, data: dict[Any, Any]) -> int:
+        """
+        以 data 为检查点原子重写文件
+        :return: 文件大小
+        """
+        raw = _line({"c": data})
+        AivkAtomicWriter.write_sync(path, raw, AivkAtomicWriter.mode == "always")
+        cls.bases[path] = len(raw)
+        return len(raw)
+
+    @classmethod
+    async def save(cls, config: AivkConfigBase) -> None:
+        """
+        追加与上次同步相比变化的顶层键
+        超过阈值时安排后台压缩
+        """
+        path = config.path
+        data = config.model_dump()
+        previous = config._persisted
+        if previous is None:
+            record: dict[str, Any] = {"c": data}
+        else:
+            record = {}
+            changed = {key: value for key, value in data.items() if previous.get(key, MISSING) != value}
+            removed = [key for key in previous if key not in data]
+            if changed:
+                record["s"] = changed
+            if removed:
+                record["d"] = removed
+            if not record:
+                return
+
+        async with cls._lock(path):
+            size = await AivkIO.run(cls._append_sync, path, _line(record), data)
+        AivkAtomicWriter.written(path)
+        cls.stats["appends"] += 1
+
+        if size > max(cls.threshold, 2 * cls.bases.get(path, 0)):
+            task = asyncio.get_running_loop().create_task(cls.compact(config))
+            cls.tasks.add(task)
+            task.add_done_callback(cls.tasks.discard)
+
+    @classmethod
+    def _append_sync(cls, path: Path, raw: bytes, data: dict[Any, Any]) -> int:
+        """
+        追加一条记录，文件不存在时写入检查点
+        :return: 文件大小
+        """
+        if not path.is_file():
+            return cls._checkpoint(path, data)
+        with open(path, 'ab') as f:
+            f.write(raw)
+            if AivkAtomicWriter.mode == "always":
+                f.flush()
+                os.fsync(f.fileno())
+            return f.tell()
+
+    @classmethod
+    async def compact(cls, config: AivkConfigBase) -> None:
+        """
+        把 journal 压缩为一个检查点
+        重放当前文件得到文档，因此不会丢失其他进程追加的记录
+        """
+        path = config.path
+        async with cls._lock(path):
+            before = config._fingerprint()
+            try:
+                size = await AivkIO.run(cls._compact_sync, path)
+            except Exception as e:
+                logger.error(f"压缩 journal 失败 {path}: {e}")
+                return
+            # 压缩不改变内容，只更新指纹，避免被视为外部修改
+            if before is not None and before == config._stat:
+                config._stat = config._fingerprint()
+        cls.stats["compactions"] += 1
+        logger.debug(f"journal 已压缩：{path}，{size} 字节")
+
+    @classmethod
+    def _compact_sync(cls, path: Path) -> int:
+        if not path.is_file():
+            return 0
+        data, _ = cls._load_sync(path, {})
+        return cls._checkpoint(path, data)
+
+    @classmethod
+    async def drain(cls) -> None:
+        """
+        等待所有后台压缩完成
+        """
+        while cls.tasks:
+            await asyncio.gather(*list(cls.tasks), return_exceptions=True)
+
+
+def _line(record: dict[str, Any]) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
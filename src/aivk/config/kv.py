@@ -0,0 +1,150 @@
+"""
+sqlite-kv 配置格式
+配置文档按顶层键逐行保存在共享的 aivk.db 中：(tree, key) -> JSON 值
+保存时只写入发生变化的键，同一模块的所有配置可以一次查询读出
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from logging import getLogger
+
+from ..base import AivkFS, AivkRoot
+from .sqlite import AivkSqlite
+from .tree import tree_of
+
+logger = getLogger("aivk.config.kv")
+
+
+class AivkKVStore:
+    """
+    sqlite-kv 存储
+    配置类通过文件路径定位配置树，路径与 AivkConfig._resolve_path 生成的一致
+    """
+    format = "sqlite-kv"
+    table = "aivk_config_kv"
+    # 已创建的配置树：文档为空（所有键都被删除）时仍能与从未创建区分
+    trees_table = "aivk_config_kv_trees"
+    _ready: set[AsyncEngine] = set()
+    # loadModule 预取的文档，load 时优先使用
+    _prefetched: dict[tuple[Path, str], dict[str, Any]] = {}  # (根目录, 配置树) -> 文档
+
+    @classmethod
+    async def _engine(cls, path: Path | None = None) -> AsyncEngine:
+        """
+        获取共享引擎，首次使用时建表
+        :param path: 配置路径，使用其所在根目录的数据库；None 表示当前根目录
+        """
+        root = AivkRoot.of(path) if path is not None else None
+        engine = AivkSqlite.getEngine((root.path if root else AivkFS.root) / "aivk.db")
+        if engine not in cls._ready:
+            async with engine.begin() as conn:
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {cls.table} ("
+                    "tree TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                    "PRIMARY KEY (tree, key)) WITHOUT ROWID"
+                ))
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {cls.trees_table} (tree TEXT PRIMARY KEY) WITHOUT ROWID"
+                ))
+            cls._ready.add(engine)
+        return engine
+
+    @classmethod
+    async def load(cls, path: Path, default: dict[Any, Any]) -> dict[str, Any]:
+        """
+        读取配置文档，配置树从未创建时写入默认配置（已创建但文档为空时返回空文档）
+        :param path: 配置路径
+        :param default: 默认配置
+        """
+        tree = tree_of(path)
+        root = AivkRoot.of(path)
+        prefetched = cls._prefetched.pop((root.path if root else AivkFS.root, tree), None)
+        if prefetched is not None:
+            return prefetched
+
+        engine = await cls._engine(path)
+        async with engine.connect() as conn:
+            rows = await conn.execute(
+                text(f"SELECT key, value FROM {cls.table} WHERE tree = :tree"),
+                {"tree": tree},
+            )
+            data = {key: json.loads(value) for key, value in rows}
+            if data:
+                return data
+            created = (await conn.execute(
+                text(f"SELECT 1 FROM {cls.trees_table} WHERE tree = :tree"),
+                {"tree": tree},
+            )).first() is not None
+        if created:
+            return data
+        await cls.save(path, default, None)
+        return dict(default)
+
+    @classmethod
+    async def save(cls, path: Path, data: dict[str, Any], previous: dict[str, Any] | None) -> int:
+        """
+        写入配置文档
+        :param path: 配置路径
+        :param data: 当前文档
+        :param previous: 上次同步时的文档，None 表示整体覆盖
+        :return: 写入和删除的键数量
+        """
+        tree = tree_of(path)
+        if previous is None:
+            changed = list(data)
+            removed: list[str] = []
+        else:
+            changed = [key for key, value in data.items() if key not in previous or previous[key] != value]
+            removed = [key for key in previous if key not in data]
+        if previous is not None and not changed and not removed:
+            return 0
+
+        engine = await cls._engine(path)
+        async with engine.begin() as conn:
+            await conn.execute(text(f"INSERT OR IGNORE INTO {cls.trees_table} (tree) VALUES (:tree)"), {"tree": tree})
+            if previous is None:
+                await conn.execute(text(f"DELETE FROM {cls.table} WHERE tree = :tree"), {"tree": tree})
+            if removed:
+                await conn.execute(
+                    text(f"DELETE FROM {cls.table} WHERE tree = :tree AND key = :key"),
+                    [{"tree": tree, "key": key} for key in removed],
+                )
+            if changed:
+                await conn.execute(
+                    text(
+                        f"INSERT INTO {cls.table} (tree, key, value) VALUES (:tree, :key, :value) "
+                        "ON CONFLICT (tree, key) DO UPDATE SET value = excluded.value"
+                    ),
+                    [{"tree": tree, "key": key, "value": json.dumps(data[key], ensure_ascii=False)} for key in changed],
+                )
+        logger.debug(f"sqlite-kv 写入 {tree}：更新 {len(changed)} 个键，删除 {len(removed)} 个键")
+        return len(changed) + len(removed)
+
+    @classmethod
+    async def loadModule(cls, id: str, prefetch: bool = False) -> dict[str, dict[str, Any]]:
+        """
+        一次查询读取模块的所有配置
+        :param id: 模块 id
+        :param prefetch: 是否留给之后的 load 使用（AivkConfig.getModuleConfigs 内部使用）
+        :return: 配置树 -> 配置文档
+        """
+        engine = await cls._engine()
+        async with engine.connect() as conn:
+            rows = await conn.execute(
+                # 按主键范围扫描：'/' 紧跟在 '.' 之后
+                text(f"SELECT tree, key, value FROM {cls.table} WHERE tree >= :lo AND tree < :hi"),
+                {"lo": f"{id}.", "hi": f"{id}/"},
+            )
+            docs: dict[str, dict[str, Any]] = {}
+            for tree, key, value in rows:
+                docs.setdefault(tree, {})[key] = json.loads(value)
+        if prefetch:
+            root = AivkFS.root
+            cls._prefetched.update({(root, tree): doc for tree, doc in docs.items()})
+        return docs
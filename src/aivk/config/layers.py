@@ -0,0 +1,199 @@
+"""
+分层配置解析
+按优先级从低到高合并：类默认值 -> getConfig 默认配置 -> 配置文件 -> AIVK_* 环境变量
+dict 逐层深度合并，其他值整体覆盖；结果缓存，只有某一层变化时才重新合并
+环境变量命名：AIVK_<配置树>___<键>[__<子键>...]，均为大写
+配置树中的 . 换成 __，配置树与键之间为 ___，因此 a_b.c 与 a.b_c、load.db 与 load.db.meta 互不冲突
+（配置树的各段不应以 _ 开头或结尾；- 与 _ 视为相同）
+example:
+    配置树 load.meta 的 db.pool_size -> AIVK_LOAD__META___DB__POOL_SIZE=20
+    值按 JSON 解析（20 -> 20，true -> True），解析失败时作为字符串
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Any, Iterable, Literal
+
+from ..base import AivkFS
+from .view import AivkConfigView
+
+Layer = Literal["class", "default", "file", "env"]
+
+
+class AivkResolvedView(AivkConfigView):
+    """
+    合并后的只读配置视图，记录每个键来自哪一层
+    example:
+    >>> resolved = config.resolve()
+    >>> resolved.db.pool_size, resolved.source("db.pool_size")
+    (20, 'env')
+    """
+    __slots__ = ("_sources",)
+
+    _sources: dict[str, Layer]
+
+    def __init__(self, data: dict[str, Any], sources: dict[str, Layer], version: int = 0):
+        super().__init__(data, version)
+        object.__setattr__(self, "_sources", sources)
+
+    @property
+    def sources(self) -> dict[str, Layer]:
+        """
+        点分路径 -> 提供该值的层（只包含叶子）
+        """
+        return dict(self._sources)
+
+    def source(self, key: str) -> Layer | None:
+        """
+        提供该键的层；键为 dict 时返回其中优先级最高的层
+        :param key: 点分路径
+        """
+        layer = self._sources.get(key)
+        if layer is not None:
+            return layer
+        prefix = f"{key}."
+        found = [layer for path, layer in self._sources.items() if path.startswith(prefix)]
+        return max(found, key=LAYERS.index) if found else None
+
+
+LAYERS: list[Layer] = ["class", "default", "file", "env"]
+
+
+def merge(layers: Iterable[tuple[Layer, dict[str, Any]]],
+          doc: dict[str, Any] | None = None,
+          sources: dict[str, Layer] | None = None) -> tuple[dict[str, Any], dict[str, Layer]]:
+    """
+    按顺序深度合并各层，不修改各层的数据
+    :param doc: 在已有的合并结果上继续合并（原地修改）
+    :param sources: doc 对应的来源记录
+    :return: (合并后的文档, 点分路径 -> 层)
+    """
+    doc = {} if doc is None else doc
+    sources = {} if sources is None else sources
+    for layer, data in layers:
+        _merge_into(doc, sources, data, layer, "")
+    return doc, sources
+
+
+def _merge_into(doc: dict[str, Any], sources: dict[str, Layer], data: dict[str, Any], layer: Layer, prefix: str) -> None:
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        current = doc.get(key)
+        if isinstance(value, dict):
+            if not isinstance(current, dict):
+                _drop(sources, path)
+                current = doc[key] = {}
+            _merge_into(current, sources, value, layer, f"{path}.")  # type: ignore[arg-type]
+        else:
+            if isinstance(current, dict):
+                _drop(sources, path)
+            doc[key] = value
+            sources[path] = layer
+
+
+def _drop(sources: dict[str, Layer], path: str) -> None:
+    """
+    整体覆盖时移除被覆盖子树的来源记录
+    """
+    prefix = f"{path}."
+    for p in [p for p in sources if p == path or p.startswith(prefix)]:
+        del sources[p]
+
+
+def env_prefix(tree: str) -> str:
+    """
+    配置树 -> 环境变量前缀
+    example:
+    >>> env_prefix("load.meta")
+    'AIVK_LOAD__META___'
+    """
+    return f"AIVK_{tree.replace('-', '_').replace('.', '__').upper()}___"
+
+
+class _EnvIndex:
+    """
+    AIVK_* 环境变量的缓存
+    每轮事件循环最多检查一次 os.environ 是否变化（C 层的 dict 比较，不逐个解码），
+    AivkFS.ctx 修改环境变量时立即失效；同一轮内的查找只是一次 dict 查询
+    """
+    raw: dict[Any, Any] | None = None  # 上次检查时 os.environ 底层数据的副本
+    version = -1  # 上次检查时的 AivkFS.env_version
+    checked = False  # 本轮事件循环是否已检查
+    aivk: dict[str, str] = {}
+    prefixes: dict[str, tuple[tuple[str, str], ...]] = {}
+
+    @classmethod
+    def refresh(cls) -> None:
+        if cls.checked and cls.version == AivkFS.env_version:
+            return
+        data = getattr(os.environ, "_data", None)
+        if data is None or cls.raw is None or data != cls.raw:
+            cls.raw = dict(data) if data is not None else None
+            cls.aivk = AivkFS.env
+            cls.prefixes = {}
+        cls.version = AivkFS.env_version
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 没有事件循环时每次都检查
+        cls.checked = True
+        loop.call_soon(cls.expire)
+
+    @classmethod
+    def expire(cls) -> None:
+        cls.checked = False
+
+
+def env_items(prefix: str) -> tuple[tuple[str, str], ...]:
+    """
+    前缀匹配的环境变量（排序后的元组，可直接作为缓存键比较）
+    os.environ 的变化在下一轮事件循环可见，AivkFS.ctx 的修改立即可见
+    """
+    _EnvIndex.refresh()
+    items = _EnvIndex.prefixes.get(prefix)
+    if items is None:
+        items = _EnvIndex.prefixes[prefix] = tuple(sorted((k, v) for k, v in _EnvIndex.aivk.items() if k.startswith(prefix)))
+    return items
+
+
+def env_layer(prefix: str, items: tuple[tuple[str, str], ...], doc: dict[str, Any]) -> dict[str, Any]:
+    """
+    环境变量 -> 配置文档
+    键名按已有的键（不区分大小写）还原，不存在时使用小写
+    :param doc: 低优先级各层合并后的文档，用于还原键名
+    """
+    layer: dict[str, Any] = {}
+    for name, raw in items:
+        parts = [part for part in name[len(prefix):].split("__") if part]
+        if not parts:
+            continue
+        node: dict[str, Any] = layer
+        existing: Any = doc
+        for i, part in enumerate(parts):
+            key = _match_key(existing, part)
+            existing = existing.get(key) if isinstance(existing, dict) else None  # type: ignore[union-attr]
+            if i == len(parts) - 1:
+                node[key] = _parse(raw)
+            else:
+                child = node.get(key)
+                if not isinstance(child, dict):
+                    child = node[key] = {}
+                node = child  # type: ignore[assignment]
+    return layer
+
+
+def _match_key(existing: Any, part: str) -> str:
+    if isinstance(existing, dict):
+        for key in existing:  # type: ignore[union-attr]
+            if isinstance(key, str) and key.upper() == part:
+                return key
+    return part.lower()
+
+
+def _parse(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
@@ -0,0 +1,134 @@
+"""
+配置生命周期：在确定的时机统一写入未保存的修改
+取代原先在 __del__ 中安排 save() 的做法（GC 时机不可控，没有事件循环时静默丢失）
+写入时机：AivkFS.ctx 退出、模块 onUnload 之后（AivkConfigBase.flushAll）、收到 SIGTERM
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+import signal
+from typing import TYPE_CHECKING, ClassVar, Iterable
+from weakref import WeakValueDictionary
+
+from logging import getLogger
+
+from ..base import AivkRoot
+from .atomic import AivkAtomicWriter
+
+if TYPE_CHECKING:
+    from .base import AivkConfigBase
+
+logger = getLogger("aivk.config.lifecycle")
+
+
+class AivkFlushReport:
+    """
+    一次统一写入的结果
+    """
+    def __init__(self):
+        self.flushed: list[Path] = []  # 已写入
+        self.failed: dict[Path, BaseException] = {}  # 写入失败
+        self.timed_out: list[Path] = []  # 超过期限被取消（原子写入，文件保持旧内容）
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed and not self.timed_out
+
+    def __repr__(self) -> str:
+        return f"AivkFlushReport(flushed={len(self.flushed)}, failed={len(self.failed)}, timed_out={len(self.timed_out)})"
+
+
+class AivkLifecycle:
+    """
+    存活配置登记表
+    只保存弱引用，不延长配置的生命周期
+    """
+    live: ClassVar[WeakValueDictionary[int, AivkConfigBase]] = WeakValueDictionary()
+    timeout: ClassVar[float] = 10.0  # 统一写入的默认期限（秒）
+    tasks: ClassVar[set[asyncio.Task[None]]] = set()
+
+    @classmethod
+    def register(cls, config: AivkConfigBase) -> None:
+        """
+        登记已加载的配置
+        """
+        cls.live[id(config)] = config
+
+    @classmethod
+    async def flush(cls, extra: Iterable[AivkConfigBase] = (), timeout: float | None = None, root: AivkRoot | None = None) -> AivkFlushReport:
+        """
+        并发写入所有有未保存修改的存活配置
+        :param extra: 额外需要写入的配置（如等待中的延迟写入）
+        :param timeout: 期限（秒），None 使用 AivkLifecycle.timeout；超时的写入被取消并记入报告
+            I/O 线程无法中断：超时时尚未替换目标文件的写入被放弃（保留原文件），
+            正在替换的写入仍可能完成，因此 timed_out 中的文件可能已是新内容
+        :param root: 只写入属于该根目录的配置（关闭一个 AivkRoot 时；不包括嵌套在其中的其他根目录），None 表示全部
+        """
+        timeout = cls.timeout if timeout is None else timeout
+        report = AivkFlushReport()
+        configs = {id(config): config for config in (*cls.live.values(), *extra)}
+        if root is not None:
+            configs = {key: config for key, config in configs.items() if AivkRoot.of(config.path) is root}
+        dirty = [config for config in configs.values() if getattr(config, "_flush_task", None) is not None or config.dirty]
+
+        if dirty:
+            logger.debug(f"写入 {len(dirty)} 个未保存的配置")
+            tasks = {asyncio.ensure_future(config.flush()): config for config in dirty}
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+            for task, config in tasks.items():
+                if task in pending:
+                    report.timed_out.append(config.path)
+                elif task.cancelled():
+                    # 被其他地方取消（如写入任务本身被取消）
+                    report.failed[config.path] = asyncio.CancelledError()
+                elif (e := task.exception()) is not None:
+                    report.failed[config.path] = e
+                else:
+                    report.flushed.append(config.path)
+
+        await AivkAtomicWriter.sync()
+
+        for path, e in report.failed.items():
+            logger.error(f"写入配置失败 {path}: {e}")
+        for path in report.timed_out:
+            logger.error(f"写入配置超时 {path}")
+        if dirty:
+            logger.info(f"配置已写入：{report}")
+        return report
+
+    @classmethod
+    def installSignals(cls) -> bool:
+        """
+        收到 SIGTERM 时先写入未保存的配置，再按默认行为退出
+        需要在事件循环中调用；平台不支持时返回 False
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, cls._on_signal, signal.SIGTERM)
+        except (NotImplementedError, RuntimeError, ValueError) as e:
+            logger.debug(f"无法注册 SIGTERM 处理: {e}")
+            return False
+        return True
+
+    @classmethod
+    def _on_signal(cls, signum: int) -> None:
+        loop = asyncio.get_running_loop()
+        # 恢复默认处理，再次收到信号时直接退出
+        loop.remove_signal_handler(signum)
+        task = loop.create_task(cls._terminate(signum))
+        cls.tasks.add(task)
+        task.add_done_callback(cls.tasks.discard)
+
+    @classmethod
+    async def _terminate(cls, signum: int) -> None:
+        logger.info(f"收到信号 {signal.Signals(signum).name}，写入未保存的配置")
+        try:
+            await cls.flush()
+        finally:
+            os.kill(os.getpid(), signum)
@@ -2,15 +2,21 @@ from __future__ import annotations
 
 from pathlib import Path
 import asyncio
-from typing import Any, Literal, TypeVar, overload, Generic
+from typing import Any, Awaitable, Callable, Iterable, Literal, TypeVar, overload, Generic
 
-from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine
 
 from logging import getLogger
 from datetime import datetime
 
-from ..base import AivkFS
+from ..base import AivkFS, AivkRoot
+from ..base.flight import single_flight
 from .base import AivkConfigBase
+from .cache import AivkConfigCache
+from .codec import AivkCodec
+from .journal import AivkJournal
+from .kv import AivkKVStore
+from .sqlite import AivkSqlite
 
 # 直接导入 AivkConfigV1 以改善类型推断
 from .v1 import AivkConfigV1
@@ -27,17 +33,26 @@ class AivkConfigMeta(type):
     """
     def __new__(mcs, name: str, bases: tuple[type,...], namespace: dict[str, Any]):
         cls = super().__new__(mcs, name, bases, namespace)
-        
-        # 初始化类级别的属性
-        if not hasattr(cls, 'async_lock'):
-            cls.async_lock = asyncio.Lock()
-        if not hasattr(cls, 'engine'):
-            cls.engine = None
-        if not hasattr(cls, 'config_dict'):
-            cls.config_dict = {}
         logger.debug(f"Creating AivkConfig class: {name}")
         return cls
 
+    # 配置缓存、进行中的加载、SQLite 引擎按当前根目录（AivkRoot）区分
+    @property
+    def config_dict(cls) -> AivkConfigCache:
+        return AivkRoot.current().scoped("config.cache", AivkConfigCache)
+
+    @property
+    def inflight(cls) -> dict[str, asyncio.Future[AivkConfigBase | AsyncEngine]]:
+        return AivkRoot.current().scoped("config.inflight", dict)
+
+    @property
+    def engine(cls) -> AsyncEngine | None:
+        return AivkRoot.current().state.get("config.engine")
+
+    @engine.setter
+    def engine(cls, engine: AsyncEngine | None) -> None:
+        AivkRoot.current().state["config.engine"] = engine
+
     def __setattr__(cls, name: str, value: Any) -> None:
         return super().__setattr__(name, value)
     
@@ -49,9 +64,9 @@ class AivkConfig(Generic[T], metaclass=AivkConfigMeta):
     Aivk配置类
     用于管理AIVK的配置文件和模块配置。
     """
-    async_lock: asyncio.Lock
     engine: AsyncEngine
-    config_dict: dict[str, AivkConfigBase | AsyncEngine]
+    config_dict: AivkConfigCache
+    inflight: dict[str, asyncio.Future[AivkConfigBase | AsyncEngine]]
 
     def __delattr__(self, name: str) -> None:
         """
@@ -96,7 +111,7 @@ class AivkConfig(Generic[T], metaclass=AivkConfigMeta):
     async def getConfig(cls, 
                         tree: str = "aivk.meta", 
                         default: dict[Any, Any] = {} , 
-                        format: Literal["json", "toml"] = "json", 
+                        format: Literal["json", "toml", "msgpack", "sqlite-kv", "journal"] = "json", 
                         base: type[AivkConfigV1] = AivkConfigV1
                         ) -> AivkConfigV1: ...
 
@@ -104,7 +119,7 @@ class AivkConfig(Generic[T], metaclass=AivkConfigMeta):
     async def getConfig(cls, 
                         tree: str = "aivk.meta", 
                         default: dict[Any, Any] = {} , 
-                        format : Literal["json", "toml", "sqlite"] = "json", 
+                        format : Literal["json", "toml", "msgpack", "sqlite", "sqlite-kv", "journal"] | str = "json", 
                         base: type[AivkConfigBase] | None = None
                         ) -> AivkConfigBase | AsyncEngine:
         """
@@ -114,11 +129,151 @@ class AivkConfig(Generic[T], metaclass=AivkConfigMeta):
         >>> root_config = await AivkConfig.getConfig('aivk.meta') # /etc/meta.json
         >>> load_config = await AivkConfig.getConfig('load.meta') # /home/load/etc/meta.json    
         >>> any_config = await AivkConfig.getConfig('id.file_name') # /home/id/file_name.json
+        >>> kv_config = await AivkConfig.getConfig('id.file_name', format='sqlite-kv') # aivk.db 中的一组行
         
+        """
+        return await cls._get_config(tree, default, format, base)
+
+    @classmethod
+    async def getConfigs(cls,
+                         trees: Iterable[str | tuple[str, str]],
+                         defaults: dict[str, dict[Any, Any]] | None = None,
+                         format: Literal["json", "toml", "msgpack", "sqlite", "sqlite-kv", "journal"] | str = "json",
+                         base: type[AivkConfigBase] | None = None,
+                         limit: int = 16
+                         ) -> list[AivkConfigBase | AsyncEngine | Exception]:
+        """
+        批量获取AIVK配置
+        按传入顺序返回结果；单个配置出错时对应位置返回异常对象，不影响其余配置
+        example:
+        >>> meta, db = await AivkConfig.getConfigs(['load.meta', ('load.db', 'toml')])
+        :param trees: 配置树列表，元素可以是 tree 或 (tree, format)
+        :param defaults: tree -> 默认配置
+        :param format: 未单独指定格式时使用的格式
+        :param base: 配置类
+        :param limit: 同时进行的加载数量上限
+        """
+        defaults = defaults or {}
+        requests = [(tree, format) if isinstance(tree, str) else tree for tree in trees]
+
+        # 统一创建目录，每个目录只创建一次
+        dirs = {
+            cls._resolve_path(tree, fmt).parent
+            for tree, fmt in requests
+            if AivkCodec.supports(fmt) and cls._validate_tree(tree)
+        }
+        for d in dirs:
+            d.mkdir(parents=True, exist_ok=True)
+
+        semaphore = asyncio.Semaphore(limit)
+
+        async def get(tree: str, fmt: Any) -> AivkConfigBase | AsyncEngine:
+            # 缓存命中不占用并发名额
+            if f"{tree}#{fmt}" in cls.config_dict:
+                return cls.config_dict[f"{tree}#{fmt}"]
+            async with semaphore:
+                return await cls._get_config(tree, dict(defaults.get(tree, {})), fmt, base, mkdir=False)
+
+        results = await asyncio.gather(*(get(tree, fmt) for tree, fmt in requests), return_exceptions=True)
+        for (tree, fmt), result in zip(requests, results):
+            if isinstance(result, Exception):
+                logger.warning(f"批量加载配置失败 {tree}#{fmt}: {result}")
+            elif isinstance(result, BaseException):
+                raise result
+        return results  # type: ignore[return-value]
+
+    @classmethod
+    async def getModuleConfigs(cls,
+                               id: str,
+                               base: type[AivkConfigBase] | None = None
+                               ) -> dict[str, AivkConfigBase]:
+        """
+        一次查询读取模块在 sqlite-kv 中的所有配置
+        example:
+        >>> configs = await AivkConfig.getModuleConfigs('load')
+        >>> configs['load.meta']
+        :param id: 模块 id
+        :param base: 配置类
+        :return: 配置树 -> 配置
+        """
+        docs = await AivkKVStore.loadModule(id, prefetch=True)
+        try:
+            results = await cls.getConfigs(list(docs), format=AivkKVStore.format, base=base)
+        finally:
+            # 已缓存的配置不会消费预取的文档
+            for tree in docs:
+                AivkKVStore._prefetched.pop((AivkFS.root, tree), None)
+        configs: dict[str, AivkConfigBase] = {}
+        for tree, result in zip(docs, results):
+            if isinstance(result, AivkConfigBase):
+                configs[tree] = result
+        return configs
+
+    @classmethod
+    def setCachePolicy(cls,
+                       max_entries: int | None = None,
+                       ttl: float | None = None,
+                       weak: bool = False
+                       ) -> None:
+        """
+        设置配置缓存策略
+        被淘汰的配置会先写入未保存的修改；SQLite 句柄共享连接池，不会被释放
+        :param max_entries: 最多缓存的配置数量（LRU），None 表示不限制
+        :param ttl: 缓存存活秒数，None 表示不过期
+        :param weak: SQLite 引擎淘汰后也保留弱引用；被淘汰但仍被持有的配置总是返回同一实例
+        """
+        cls.config_dict.policy(max_entries=max_entries, ttl=ttl, weak=weak)
+
+    @classmethod
+    def cacheStats(cls) -> dict[str, int]:
+        """
+        获取配置缓存统计
+        :return: size / hits / misses / evictions / expirations
+        """
+        stats = cls.config_dict.stats
+        return {
+            "size": len(cls.config_dict),
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "evictions": stats["evictions"],
+            "expirations": stats["expirations"],
+        }
+
+    @classmethod
+    def _resolve_path(cls, tree: str, format: str) -> Path:
+        """
+        配置树 -> 配置文件路径
+        :param tree: 配置树名称
+        :param format: 文件格式
+        """
+        id , *_path = tree.split('.')
+        fs: AivkFS = AivkFS.getFS(id)
+        _path[-1] = f"{_path[-1]}.{format}"
+        relative_path = '/'.join(_path)
+        return fs.etc / relative_path
+
+    @classmethod
+    async def _get_config(cls,
+                          tree: str,
+                          default: dict[Any, Any],
+                          format: str,
+                          base: type[AivkConfigBase] | None,
+                          mkdir: bool = True
+                          ) -> AivkConfigBase | AsyncEngine:
+        """
+        getConfig / getConfigs 的共同实现
+        :param mkdir: 是否在加载前创建目录，批量加载时由调用方统一创建
         """
         if not cls._validate_tree(tree):
             raise ValueError(f"Invalid tree format: {tree}")
-        
+
+        config_key = f"{tree}#{format}"
+
+        # 缓存命中无需加锁
+        cached = cls.config_dict.get(config_key)
+        if cached is not None:
+            return cached
+
         # 运行时导入默认配置类，避免循环依赖
         if base is None:
             base = AivkConfigV1
@@ -130,40 +285,58 @@ class AivkConfig(Generic[T], metaclass=AivkConfigMeta):
             default["id"] = f"{tree}#{format}"
             default["created_at"] = datetime.now().isoformat()
 
-        id , *_path = tree.split('.')
-
         # 生成配置文件路径
-        fs: AivkFS = AivkFS.getFS(id)
-        _path[-1] = f"{_path[-1]}.{format}"
-        relative_path = '/'.join(_path) 
-        cfg_path = fs.etc / relative_path
-
-        if format == "json" or format == "toml":
-            # 对于 JSON/TOML 格式，先检查缓存
-            async with cls.async_lock:
-                config_key = f"{tree}#{format}"
-                if config_key in cls.config_dict:
-                    return cls.config_dict[config_key]
-                # 确保目录存在
-                fs.etc.mkdir(parents=True, exist_ok=True)
+        cfg_path = cls._resolve_path(tree, format)
+
+        if AivkCodec.supports(format) or format in (AivkKVStore.format, AivkJournal.format):
+            async def load() -> AivkConfigBase:
+                # 确保目录存在（sqlite-kv 保存在 aivk.db 中，不需要目录）
+                if mkdir and format != AivkKVStore.format:
+                    cfg_path.parent.mkdir(parents=True, exist_ok=True)
                 # 异步加载配置
-                config = await base.load(path=cfg_path, default=default)
-                cls.config_dict[config_key] = config
-                return config
+                return await base.load(path=cfg_path, default=default)
         elif format == "sqlite":
-            # SQLite格式 (异步处理)
-            db_path: Path = AivkFS.root / "aivk.db"
-            # 确保目录存在
-            db_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            async with cls.async_lock:
-                config_key = f"{tree}#{format}"
-                if config_key in cls.config_dict:
-                    return cls.config_dict[config_key]
-                
-                # 使用异步引擎
-                engine: AsyncEngine = create_async_engine(f"sqlite+aiosqlite:///{db_path.as_posix()}")
-                cls.config_dict[config_key] = engine
-                return engine
+            async def load() -> AsyncEngine:
+                # SQLite格式 (异步处理)
+                db_path: Path = AivkFS.root / "aivk.db"
+                # 所有配置树共享同一个引擎（连接池），返回带 aivk_tree 选项的句柄
+                cls.engine = AivkSqlite.getEngine(db_path)
+                return AivkSqlite.getHandle(db_path, tree)
         else:
-            raise ValueError(f"Unsupported format: {format}")
\ No newline at end of file
+            raise ValueError(f"Unsupported format: {format}")
+
+        return await cls._single_flight(config_key, load)
+
+    @classmethod
+    async def _single_flight(cls,
+                             config_key: str,
+                             load: Callable[[], Awaitable[AivkConfigBase | AsyncEngine]]
+                             ) -> AivkConfigBase | AsyncEngine:
+        """
+        按 tree#format 合并并发加载
+        同一个键只会有一次加载在进行，其余请求共享结果；不同的键互不阻塞
+        进行加载的调用方被取消时，等待者不会收到 CancelledError，而是由其中一个重新加载
+        :param config_key: 配置键
+        :param load: 实际的加载协程
+        """
+        async def load_and_cache() -> AivkConfigBase | AsyncEngine:
+            config = await load()
+            cls.config_dict[config_key] = config
+            return config
+
+        return await single_flight(cls.inflight, config_key, load_and_cache, lambda: cls.config_dict.get(config_key))
+
+
+async def _close_root(root: AivkRoot) -> None:
+    """
+    关闭根目录：写入其下未保存的配置，等待缓存淘汰任务，释放其数据库引擎
+    """
+    await AivkConfigBase.flushAll(root=root)
+    cache: AivkConfigCache | None = root.state.get("config.cache")
+    if cache is not None:
+        await cache.drain()
+    for engine in await AivkSqlite.disposeRoot(root.path):
+        AivkKVStore._ready.discard(engine)
+
+
+AivkRoot.close_hooks.append(_close_root)
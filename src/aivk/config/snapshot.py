@@ -0,0 +1,284 @@
+"""
+启动快照
+把已加载配置的验证后数据与源文件指纹保存在一个 JSON 文件中
+下次启动时，文件指纹未变化的配置直接从快照构建，不再逐个读取、解析配置文件
+快照位于可写的 AIVK 根目录下，因此只使用 JSON（不使用 pickle），读取快照不会执行代码；
+不能无损转换为 JSON 的配置不记录
+每个根目录（AivkRoot）有自己的快照文件与条目，只记录该根目录下的配置
+默认关闭：AivkSnapshot.enable() 或设置环境变量 AIVK_CONFIG_SNAPSHOT=1
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from logging import getLogger
+
+from ..base import AivkRoot
+from ..base.io import AivkIO
+from .atomic import AivkAtomicWriter
+from .codec import AivkCodec
+from .lifecycle import AivkLifecycle
+
+if TYPE_CHECKING:
+    from .base import AivkConfigBase
+
+logger = getLogger("aivk.config.snapshot")
+
+# 快照格式版本，结构变化时递增，旧快照被忽略
+VERSION = 2
+
+Fingerprint = tuple[int, int, int]
+STATE = "config.snapshot"
+
+
+class _SnapshotState:
+    """
+    一个根目录的快照
+    条目：配置文件路径 -> (文件指纹, 配置类, 验证后的数据)
+    """
+    __slots__ = ("entries", "loaded", "changed", "lock")
+
+    def __init__(self):
+        self.entries: dict[str, tuple[Fingerprint, str, str]] = {}
+        self.loaded = False
+        self.changed = False
+        self.lock: asyncio.Lock | None = None
+
+
+class AivkSnapshot:
+    """
+    配置启动快照
+    数据单独序列化为 JSON 字符串，每次命中都反序列化出新的对象，配置之间不共享可变值
+    """
+    enabled: ClassVar[bool] = os.getenv("AIVK_CONFIG_SNAPSHOT") == "1"
+    path: ClassVar[Path | None] = None  # 默认根目录的快照文件，None 表示 <root>/cache/config.snapshot
+    # hits 命中 / misses 无条目 / stale 指纹不一致 / saves 写入快照
+    stats: ClassVar[Counter[str]] = Counter()
+    # 等待 stat 的路径，同一轮事件循环内的查找合并为一次 I/O 线程调用
+    _stat_pending: ClassVar[dict[str, asyncio.Future[Fingerprint | None]]] = {}
+    _stat_tasks: ClassVar[set[asyncio.Task[None]]] = set()
+
+    @classmethod
+    def enable(cls, path: Path | None = None) -> None:
+        """
+        开启启动快照
+        :param path: 默认根目录的快照文件，默认 <root>/cache/config.snapshot
+        """
+        cls.enabled = True
+        cls.path = path
+        cls.reset()
+
+    @classmethod
+    def disable(cls) -> None:
+        cls.enabled = False
+        cls.reset()
+
+    @classmethod
+    def reset(cls) -> None:
+        """
+        丢弃内存中（所有根目录）的快照，下次使用时重新读取快照文件
+        """
+        for root in (AivkRoot.default, *AivkRoot.roots.values()):
+            root.state.pop(STATE, None)
+        cls.stats.clear()
+
+    @staticmethod
+    def _state(root: AivkRoot) -> _SnapshotState:
+        return root.scoped(STATE, _SnapshotState)
+
+    @classmethod
+    def entries(cls, root: AivkRoot | None = None) -> dict[str, tuple[Fingerprint, str, str]]:
+        """
+        根目录的快照条目
+        :param root: 默认为当前根目录
+        """
+        return cls._state(root or AivkRoot.current()).entries
+
+    @classmethod
+    def file(cls, root: AivkRoot | None = None) -> Path:
+        """
+        快照文件路径
+        :param root: 默认为当前根目录
+        """
+        root = root or AivkRoot.current()
+        if cls.path is not None and root is AivkRoot.default:
+            return cls.path
+        return root.path / "cache" / "config.snapshot"
+
+    @staticmethod
+    def _kind(config_cls: type[Any]) -> str:
+        return f"{config_cls.__module__}.{config_cls.__qualname__}"
+
+    @classmethod
+    async def _ensure_loaded(cls, root: AivkRoot) -> _SnapshotState:
+        """
+        首次使用时读取根目录的快照文件（并发调用只读取一次）
+        """
+        state = cls._state(root)
+        if state.loaded:
+            return state
+        if state.lock is None:
+            state.lock = asyncio.Lock()
+        async with state.lock:
+            if not state.loaded:
+                state.entries = await AivkIO.run(_read_snapshot, cls.file(root))
+                state.loaded = True
+                logger.debug(f"读取配置快照：{root.path}，{len(state.entries)} 个条目")
+        return state
+
+    @classmethod
+    async def get(cls, path: Path, config_cls: type[AivkConfigBase]) -> dict[str, Any] | None:
+        """
+        获取快照中的配置数据
+        :param path: 配置文件路径
+        :param config_cls: 配置类，与快照记录的类不同时视为未命中
+        :return: 验证后的数据；没有条目或文件指纹不一致时返回 None
+        """
+        state = await cls._ensure_loaded(AivkRoot.of(path) or AivkRoot.current())
+        key = str(path)
+        entry = state.entries.get(key)
+        if entry is None:
+            cls.stats["misses"] += 1
+            return None
+        fingerprint, kind, data = entry
+        if kind != cls._kind(config_cls) or await cls._fingerprint(key) != fingerprint:
+            # 文件已变化，回退到读取文件
+            state.entries.pop(key, None)
+            state.changed = True
+            cls.stats["stale"] += 1
+            return None
+        cls.stats["hits"] += 1
+        return json.loads(data)
+
+    @classmethod
+    async def _fingerprint(cls, key: str) -> Fingerprint | None:
+        """
+        文件指纹；同一轮事件循环内的请求合并为一次 AivkIO 调用
+        """
+        future = cls._stat_pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not cls._stat_pending:
+                loop.call_soon(cls._stat_batch)
+            future = cls._stat_pending[key] = loop.create_future()
+        return await asyncio.shield(future)
+
+    @classmethod
+    def _stat_batch(cls) -> None:
+        pending, cls._stat_pending = cls._stat_pending, {}
+
+        async def run() -> None:
+            try:
+                results = await AivkIO.run(_stat_many, list(pending))
+            except BaseException as e:
+                for future in pending.values():
+                    if not future.done():
+                        future.set_exception(e)
+                raise
+            for key, future in pending.items():
+                if not future.done():
+                    future.set_result(results[key])
+
+        task = asyncio.get_running_loop().create_task(run())
+        cls._stat_tasks.add(task)
+        task.add_done_callback(cls._stat_tasks.discard)
+
+    @classmethod
+    def record(cls, config: AivkConfigBase, state: _SnapshotState) -> None:
+        """
+        记录与文件一致的配置
+        """
+        if config.dirty or getattr(config, "_stat", None) is None or getattr(config, "_persisted", None) is None:
+            return
+        key = str(config.path)
+        data = _encode(config._persisted)
+        if data is None:
+            return
+        entry = (tuple(config._stat), cls._kind(type(config)), data)
+        if state.entries.get(key) != entry:
+            state.entries[key] = entry
+            state.changed = True
+
+    @classmethod
+    async def save(cls, root: AivkRoot | None = None) -> bool:
+        """
+        把存活且与文件一致的配置写入各自根目录的快照（保留本次未加载配置的条目）
+        快照内容未变化时不写入
+        :param root: 只写入该根目录的快照；None 表示当前根目录与所有已使用快照的根目录
+        :return: 是否写入
+        """
+        if root is not None:
+            roots = [root]
+        else:
+            roots = [AivkRoot.current()]
+            roots += [r for r in (AivkRoot.default, *AivkRoot.roots.values()) if STATE in r.state and r not in roots]
+        live = list(AivkLifecycle.live.values())
+        written = False
+        for r in roots:
+            state = await cls._ensure_loaded(r)
+            for config in live:
+                if AivkCodec.supports(config.format) and AivkRoot.of(config.path) is r:
+                    cls.record(config, state)
+            if not state.changed:
+                continue
+            raw = json.dumps({"version": VERSION, "entries": state.entries}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            await AivkAtomicWriter.write(cls.file(r), raw)
+            state.changed = False
+            cls.stats["saves"] += 1
+            written = True
+            logger.debug(f"写入配置快照：{r.path}，{len(state.entries)} 个条目，{len(raw)} 字节")
+        return written
+
+
+def _encode(data: Any) -> str | None:
+    """
+    数据 -> JSON 字符串；不能无损往返（如 datetime、非字符串键、tuple）时返回 None
+    """
+    try:
+        raw = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+    return raw if json.loads(raw) == data else None
+
+
+def _stat_many(keys: list[str]) -> dict[str, Fingerprint | None]:
+    fingerprints: dict[str, Fingerprint | None] = {}
+    for key in keys:
+        try:
+            st = os.stat(key)
+        except OSError:
+            fingerprints[key] = None
+        else:
+            fingerprints[key] = (st.st_mtime_ns, st.st_size, st.st_ino)
+    return fingerprints
+
+
+def _read_snapshot(path: Path) -> dict[str, tuple[Fingerprint, str, str]]:
+    """
+    读取快照文件，文件不存在、损坏或版本不符时返回空快照
+    """
+    try:
+        raw = path.read_bytes()
+    except FileNotFoundError:
+        return {}
+    try:
+        snapshot = json.loads(raw)
+    except ValueError as e:
+        logger.warning(f"配置快照损坏，忽略：{path}: {e}")
+        return {}
+    if not isinstance(snapshot, dict) or snapshot.get("version") != VERSION or not isinstance(snapshot.get("entries"), dict):
+        logger.debug(f"配置快照版本不符，忽略：{path}")
+        return {}
+    entries: dict[str, tuple[Fingerprint, str, str]] = {}
+    for key, entry in snapshot["entries"].items():
+        try:
+            fingerprint, kind, data = entry
+            entries[key] = (tuple(int(v) for v in fingerprint), str(kind), str(data))  # type: ignore[assignment]
+        except (TypeError, ValueError):
+            continue
+    return entries
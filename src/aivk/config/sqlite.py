@@ -0,0 +1,130 @@
+"""
+进程内共享的 SQLite 引擎
+每个数据库文件只创建一个 AsyncEngine（一个连接池），各配置树拿到的是共享连接池的句柄
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from logging import getLogger
+
+logger = getLogger("aivk.config.sqlite")
+
+
+class AivkSqlite:
+    """
+    SQLite 引擎管理
+    sqlite数据库有且只有一个喵
+    """
+    # 每个连接建立时执行的 PRAGMA
+    pragmas: dict[str, Any] = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+    }
+    # 连接池参数，传给 create_async_engine
+    pool: dict[str, Any] = {
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+    }
+    engines: dict[Path, AsyncEngine] = {}
+
+    @classmethod
+    def configure(cls,
+                  pragmas: dict[str, Any] | None = None,
+                  **pool: Any
+                  ) -> None:
+        """
+        修改默认 PRAGMA 与连接池参数
+        只影响之后创建的引擎
+        example:
+        >>> AivkSqlite.configure(pragmas={"busy_timeout": 10000}, pool_size=10)
+        :param pragmas: 覆盖的 PRAGMA，值为 None 表示不设置该项
+        :param pool: pool_size / max_overflow / pool_timeout 等
+        """
+        if pragmas:
+            cls.pragmas = {**cls.pragmas, **pragmas}
+        cls.pool = {**cls.pool, **pool}
+
+    @classmethod
+    def getEngine(cls, db_path: Path) -> AsyncEngine:
+        """
+        获取数据库文件的共享引擎，不存在时创建
+        :param db_path: 数据库文件路径
+        """
+        key = db_path.absolute()
+        engine = cls.engines.get(key)
+        if engine is not None:
+            return engine
+
+        key.parent.mkdir(parents=True, exist_ok=True)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{key.as_posix()}", **cls.pool)
+        pragmas = {k: v for k, v in cls.pragmas.items() if v is not None}
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+        cls.engines[key] = engine
+        logger.debug(f"创建共享 SQLite 引擎：{key}")
+        return engine
+
+    @classmethod
+    def getHandle(cls, db_path: Path, tree: str) -> AsyncEngine:
+        """
+        获取配置树的引擎句柄
+        句柄与共享引擎使用同一个连接池，可通过 execution_options["aivk_tree"] 取得配置树
+        :param db_path: 数据库文件路径
+        :param tree: 配置树名称
+        """
+        return cls.getEngine(db_path).execution_options(aivk_tree=tree)
+
+    @staticmethod
+    def tablePrefix(tree: str) -> str:
+        """
+        配置树对应的表名前缀，用于在同一个数据库中隔离各配置树的表
+        example:
+        >>> AivkSqlite.tablePrefix("load.meta")
+        'load__meta__'
+        """
+        return f"{tree.replace('.', '__')}__"
+
+    @staticmethod
+    def isShared(engine: AsyncEngine) -> bool:
+        """
+        引擎是否为共享引擎的句柄（句柄不应单独释放）
+        """
+        return "aivk_tree" in engine.get_execution_options()
+
+    @classmethod
+    async def disposeAll(cls) -> None:
+        """
+        释放所有共享引擎
+        程序退出前调用
+        """
+        engines = list(cls.engines.values())
+        cls.engines.clear()
+        for engine in engines:
+            await engine.dispose()
+
+    @classmethod
+    async def disposeRoot(cls, root: Path) -> list[AsyncEngine]:
+        """
+        释放该目录下数据库文件的共享引擎
+        关闭一个 AivkRoot 时调用
+        :return: 已释放的引擎
+        """
+        keys = [key for key in cls.engines if key.is_relative_to(root.absolute())]
+        engines = [cls.engines.pop(key) for key in keys]
+        for engine in engines:
+            await engine.dispose()
+        return engines
@@ -0,0 +1,24 @@
+"""
+配置树
+配置树是点分的名称：<模块 id>.<etc 下的相对路径（不含后缀）>，与 AivkConfig._resolve_path 互为逆运算
+"""
+from pathlib import Path
+
+from ..base import AivkFS, AivkRoot
+
+
+def tree_of(path: Path) -> str:
+    """
+    配置路径 -> 配置树
+    路径所在的根目录按 AivkRoot.of 确定，不在任何根目录下时使用当前根目录
+    example:
+    >>> tree_of(AivkFS.getFS("load").etc / "db" / "meta.sqlite-kv")
+    'load.db.meta'
+    """
+    root = AivkRoot.of(path)
+    parts = path.with_suffix("").relative_to(root.path if root else AivkFS.root).parts
+    if parts[0] == "home":
+        id, rest = parts[1], parts[3:]
+    else:
+        id, rest = "aivk", parts[1:]
+    return ".".join((id, *rest))
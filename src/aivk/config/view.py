@@ -0,0 +1,84 @@
+"""
+配置的只读快照视图
+加载、保存、重新加载、事务提交后发布新的视图（写时复制：发布的文档之后不再被修改）
+读者只需读取一次 config.snapshot 引用，不需要加锁，也不会看到应用到一半的修改
+"""
+from __future__ import annotations
+
+from collections.abc import Mapping
+import copy
+from typing import Any, Iterator
+
+
+class AivkConfigView(Mapping[str, Any]):
+    """
+    不可变的配置视图
+    支持属性访问与下标访问；嵌套的 dict 返回视图，list 返回 tuple
+    与方法同名的键（如 version / get / keys）请使用下标访问
+    example:
+    >>> view = config.snapshot
+    >>> view.db.pool_size, view["db"]["pool_size"], view.version
+    """
+    __slots__ = ("_data", "_version")
+
+    _data: dict[str, Any]
+    _version: int
+
+    def __init__(self, data: dict[str, Any], version: int = 0):
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_version", version)
+
+    @property
+    def version(self) -> int:
+        """
+        视图版本，每次发布递增
+        """
+        return self._version
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return _freeze(self._data[name], self._version)
+        except KeyError:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'") from None
+
+    def __getitem__(self, key: str) -> Any:
+        return _freeze(self._data[key], self._version)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, AivkConfigView):
+            return self._data == other._data
+        if isinstance(other, Mapping):
+            return self._data == other
+        return NotImplemented
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise TypeError(f"'{type(self).__name__}' is read-only")
+
+    def __delattr__(self, name: str) -> None:
+        raise TypeError(f"'{type(self).__name__}' is read-only")
+
+    def __repr__(self) -> str:
+        return f"AivkConfigView(v{self._version}, {self._data!r})"
+
+    def toDict(self) -> dict[str, Any]:
+        """
+        可修改的深拷贝
+        """
+        return copy.deepcopy(self._data)
+
+
+def _freeze(value: Any, version: int) -> Any:
+    if isinstance(value, dict):
+        return AivkConfigView(value, version)  # type: ignore[arg-type]
+    if isinstance(value, list):
+        return tuple(_freeze(item, version) for item in value)  # type: ignore[misc]
+    return value
@@ -0,0 +1,201 @@
+"""
+配置文件热重载监控
+所有配置共享一个监控器：每个目录只注册一次，防抖在 asyncio 事件循环上完成
+安装了 watchdog 时使用系统文件事件，否则退回到事件循环内的轮询
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from logging import getLogger
+
+try:
+    from watchdog.observers import Observer
+except ImportError:  # 未安装 watchdog 时使用轮询
+    Observer = None
+
+if TYPE_CHECKING:
+    from .base import AivkConfigBase
+
+logger = getLogger("aivk.config.watch")
+
+
+class _EventForwarder:
+    """
+    watchdog 事件处理器
+    在 watchdog 线程中只做过滤，然后把文件路径转交给事件循环
+    """
+    def __init__(self, watcher: AivkWatcher):
+        self.watcher = watcher
+
+    def dispatch(self, event: Any) -> None:
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path and os.fsdecode(path) in self.watcher.configs:
+                self.watcher.loop.call_soon_threadsafe(self.watcher.notify, os.fsdecode(path))
+
+
+class AivkWatcher:
+    """
+    共享的配置文件监控器
+    每个事件循环一个实例，请使用 AivkWatcher.get() 获取
+    """
+    delay: float = 0.5  # 防抖时间
+    interval: float = 1.0  # 轮询间隔（未安装 watchdog 时）
+    _instance: AivkWatcher | None = None
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, polling: bool = False):
+        self.loop = loop
+        self.polling = polling or Observer is None
+        self.configs: dict[str, AivkConfigBase] = {}  # 文件路径 -> 配置
+        self.dirs: dict[str, Any] = {}  # 目录 -> watchdog 监控句柄 / 轮询任务
+        self.files: dict[str, set[str]] = {}  # 目录 -> 该目录下被监控的文件
+        self.timers: dict[str, asyncio.TimerHandle] = {}  # 文件路径 -> 防抖定时器
+        self.tasks: set[asyncio.Task[None]] = set()  # 进行中的重新加载
+        self.observer: Any = None
+
+    @classmethod
+    def get(cls, polling: bool = False) -> AivkWatcher:
+        """
+        获取当前事件循环的监控器
+        :param polling: 强制使用轮询
+        """
+        loop = asyncio.get_running_loop()
+        if cls._instance is None or cls._instance.loop is not loop:
+            if cls._instance is not None:
+                cls._instance.close()
+            cls._instance = cls(loop, polling=polling)
+        return cls._instance
+
+    @staticmethod
+    def _key(path: Path) -> str:
+        return os.path.abspath(path)
+
+    def watch(self, config: AivkConfigBase) -> None:
+        """
+        开始监控配置文件
+        """
+        path = self._key(config.path)
+        directory = os.path.dirname(path)
+        self.configs[path] = config
+        self.files.setdefault(directory, set()).add(path)
+
+        if directory in self.dirs:
+            return
+        if self.polling:
+            self.dirs[directory] = self.loop.create_task(self._poll(directory))
+        else:
+            if self.observer is None:
+                self.observer = Observer()
+                self.observer.daemon = True
+                self.observer.start()
+                logger.info("启动共享配置文件监控器")
+            self.dirs[directory] = self.observer.schedule(_EventForwarder(self), directory, recursive=False)
+        logger.debug(f"添加目录监控: {directory}")
+
+    def unwatch(self, config: AivkConfigBase) -> None:
+        """
+        停止监控配置文件，目录下没有其他配置时移除目录监控
+        """
+        path = self._key(config.path)
+        if self.configs.get(path) is not config:
+            return
+        del self.configs[path]
+        timer = self.timers.pop(path, None)
+        if timer is not None:
+            timer.cancel()
+
+        directory = os.path.dirname(path)
+        files = self.files.get(directory, set())
+        files.discard(path)
+        if files:
+            return
+        self.files.pop(directory, None)
+        handle = self.dirs.pop(directory, None)
+        if isinstance(handle, asyncio.Task):
+            handle.cancel()
+        elif handle is not None and self.observer is not None:
+            self.observer.unschedule(handle)
+        logger.debug(f"移除目录监控: {directory}")
+
+        if not self.configs:
+            self.close()
+
+    def close(self) -> None:
+        """
+        停止所有监控
+        """
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
+        for handle in self.dirs.values():
+            if isinstance(handle, asyncio.Task):
+                handle.cancel()
+        self.dirs.clear()
+        self.files.clear()
+        self.configs.clear()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+            logger.info("停止共享配置文件监控器")
+        if AivkWatcher._instance is self:
+            AivkWatcher._instance = None
+
+    def notify(self, path: str) -> None:
+        """
+        文件发生变化（在事件循环线程中调用）
+        防抖：delay 时间内的多次变化只触发一次重新加载
+        """
+        timer = self.timers.get(path)
+        if timer is not None:
+            timer.cancel()
+        self.timers[path] = self.loop.call_later(self.delay, self._fire, path)
+
+    def _fire(self, path: str) -> None:
+        self.timers.pop(path, None)
+        task = self.loop.create_task(self._trigger(path))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _trigger(self, path: str) -> None:
+        config = self.configs.get(path)
+        if config is None:
+            return
+        while config.in_transaction:
+            # 等待事务提交，避免重新加载覆盖未提交的修改
+            await asyncio.sleep(self.delay)
+        # 文件指纹与最近一次加载/保存一致，说明是自己 save() 引起的事件
+        if not config.stale:
+            return
+        try:
+            await config.reload()
+        except Exception as e:
+            logger.error(f"热重载配置失败 {path}: {e}")
+            return
+        for callback in list(config.reload_callbacks):
+            try:
+                await callback(config)
+            except Exception as e:
+                logger.error(f"热重载回调异常 {path}: {e}")
+
+    async def _poll(self, directory: str) -> None:
+        """
+        轮询目录下被监控的文件
+        只比较文件指纹，变化时交给 notify 防抖
+        """
+        seen: dict[str, tuple[int, int, int] | None] = {}
+        while True:
+            await asyncio.sleep(self.interval)
+            for path in list(self.files.get(directory, ())):
+                config = self.configs.get(path)
+                if config is None:
+                    continue
+                fingerprint = config._fingerprint()
+                last = seen.get(path, config._stat)
+                seen[path] = fingerprint
+                if fingerprint != last:
+                    self.notify(path)
@@ -4,20 +4,43 @@
 """
 import pytest
 import asyncio
+import gc
+import os
+import signal
+import sys
 import tempfile
+import threading
+import time
 import shutil
 from pathlib import Path
-from typing import Optional
+from typing import Any, ClassVar, Optional, Self
 import json
+from collections import Counter
 import toml
 
 from sqlalchemy.ext.asyncio import AsyncEngine
-from sqlalchemy import text
+from sqlalchemy import event, text
 from sqlmodel import SQLModel, Field, select
 
 from aivk.config.models import AivkConfig
 from aivk.config.v1 import AivkConfigV1
-from aivk.base import AivkFS
+from aivk.config.base import AivkConfigBase
+from aivk.config.watch import AivkWatcher
+from aivk.config.diff import MISSING, diff
+from aivk.config.sqlite import AivkSqlite
+from aivk.config.kv import AivkKVStore
+from aivk.config.tree import tree_of
+from aivk.config.layers import env_prefix
+from aivk.config.codec import AivkCodec, JsonCodec
+from aivk.config.atomic import AivkAtomicWriter
+from aivk.config.lifecycle import AivkLifecycle
+from aivk.config.snapshot import AivkSnapshot
+from aivk.config.journal import AivkJournal
+from aivk.config.view import AivkConfigView
+from aivk.config.compact import AivkCompactConfig
+from aivk.base import AivkFS, AivkIO, AivkEnvs, AivkRoot, AivkCache
+from aivk.base.cache import _CacheIndex
+import zipfile
 
 from logging import getLogger
 logger = getLogger("test_aivk_config")
@@ -31,6 +54,33 @@ class TestTable(SQLModel, table=True):
     name: str = Field(index=True)
     value: int
 
+class SlowConfig(AivkConfigV1):
+    """模拟慢速加载的配置类，用于并发加载测试"""
+
+    delay: ClassVar[float] = 0.2
+    load_count: ClassVar[int] = 0
+
+    @classmethod
+    async def load(cls, path: Path, default: dict[Any, Any]) -> Self:
+        SlowConfig.load_count += 1
+        await asyncio.sleep(cls.delay)
+        return await super().load(path, default)
+
+
+class SlowWriteConfig(AivkConfigV1):
+    """模拟慢速写入的配置类，用于写入期限测试"""
+
+    async def _write(self) -> None:
+        await asyncio.sleep(5)
+        await super()._write()
+
+
+class PortConfig(AivkConfigV1):
+    """带类型字段的配置类，用于事务验证测试"""
+
+    port: int = 0
+
+
 class TestAivkConfig:
     """AivkConfig 配置类测试"""
 
@@ -47,10 +97,17 @@ class TestAivkConfig:
         # 清空缓存
         AivkFS.fs.clear()
         AivkConfig.config_dict.clear()
+        AivkConfigBase.pending.clear()
+        AivkConfigBase.save_stats.clear()
+        AivkLifecycle.live.clear()
+        AivkJournal.stats.clear()
         
         yield
         
         # 清理测试环境
+        AivkConfig.setCachePolicy()
+        AivkSqlite.engines.clear()
+        AivkSnapshot.disable()
         AivkFS.root = self.original_root
         AivkFS.fs.clear()
         AivkConfig.config_dict.clear()
@@ -430,6 +487,1708 @@ class TestAivkConfig:
         assert config2_data['custom'] == "value"
         assert config2_data['number'] == 999
 
+    @pytest.mark.asyncio
+    async def test_parallel_cold_loads(self):
+        """测试不同配置树并行冷加载，总耗时约等于一次加载"""
+        SlowConfig.load_count = 0
+        trees = [f"parallel{i}.config" for i in range(10)]
+
+        start = time.perf_counter()
+        configs = await asyncio.gather(*(
+            AivkConfig.getConfig(tree=tree, default={"index": i}, base=SlowConfig)
+            for i, tree in enumerate(trees)
+        ))
+        elapsed = time.perf_counter() - start
+
+        assert SlowConfig.load_count == len(trees)
+        assert [c.model_dump()["index"] for c in configs] == list(range(10))
+        # 串行加载需要 10 * delay，并行应接近一次 delay
+        assert elapsed < SlowConfig.delay * 3
+
+    @pytest.mark.asyncio
+    async def test_concurrent_same_tree_single_flight(self):
+        """测试同一配置树的并发请求共享一次加载"""
+        SlowConfig.load_count = 0
+
+        configs = await asyncio.gather(*(
+            AivkConfig.getConfig(tree="flight.config", default={"v": 1}, base=SlowConfig)
+            for _ in range(20)
+        ))
+
+        assert SlowConfig.load_count == 1
+        assert all(c is configs[0] for c in configs)
+        assert not AivkConfig.inflight
+
+        # 缓存命中不再触发加载
+        again = await AivkConfig.getConfig(tree="flight.config", base=SlowConfig)
+        assert again is configs[0]
+        assert SlowConfig.load_count == 1
+
+    @pytest.mark.asyncio
+    async def test_single_flight_error_shared(self):
+        """测试加载失败时所有等待者都收到异常，且不写入缓存"""
+        fs = AivkFS.getFS("broken")
+        fs.etc.mkdir(parents=True, exist_ok=True)
+        (fs.etc / "config.json").write_text("{not json", encoding="utf-8")
+
+        results = await asyncio.gather(*(
+            AivkConfig.getConfig(tree="broken.config", default={"v": 1}, base=SlowConfig)
+            for _ in range(3)
+        ), return_exceptions=True)
+
+        assert all(isinstance(r, ValueError) for r in results)
+        assert "broken.config#json" not in AivkConfig.config_dict
+        assert not AivkConfig.inflight
+
+    @pytest.mark.asyncio
+    async def test_single_flight_loader_cancelled(self):
+        """测试进行加载的调用方被取消时，等待者重新加载而不是收到 CancelledError"""
+        SlowConfig.load_count = 0
+        loader = asyncio.create_task(AivkConfig.getConfig(tree="flight.cancel", default={"v": 1}, base=SlowConfig))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(AivkConfig.getConfig(tree="flight.cancel", default={"v": 1}, base=SlowConfig))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        loader.cancel()
+        configs = await asyncio.gather(*waiters)
+
+        assert loader.cancelled()
+        assert all(c is configs[0] for c in configs)
+        assert SlowConfig.load_count == 2
+        assert not AivkConfig.inflight
+
+        # 等待者自身被取消时照常收到 CancelledError
+        AivkConfig.config_dict.clear()
+        loader = asyncio.create_task(AivkConfig.getConfig(tree="flight.cancel", base=SlowConfig))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(AivkConfig.getConfig(tree="flight.cancel", base=SlowConfig))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        assert await loader is not None
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    @pytest.mark.asyncio
+    async def test_get_configs_batch(self):
+        """测试批量获取配置，结果按传入顺序返回"""
+        trees = ["batch.alpha", ("batch.beta", "toml"), "batch.sub.gamma"]
+        defaults = {
+            "batch.alpha": {"name": "alpha"},
+            "batch.beta": {"name": "beta"},
+            "batch.sub.gamma": {"name": "gamma"},
+        }
+
+        results = await AivkConfig.getConfigs(trees, defaults=defaults, limit=2)
+
+        assert [r.model_dump()["name"] for r in results] == ["alpha", "beta", "gamma"]
+        assert results[1].format == "toml"
+        fs = AivkFS.getFS("batch")
+        assert (fs.etc / "alpha.json").exists()
+        assert (fs.etc / "beta.toml").exists()
+        assert (fs.etc / "sub" / "gamma.json").exists()
+
+        # 与单个获取共享缓存
+        assert await AivkConfig.getConfig("batch.alpha") is results[0]
+
+    @pytest.mark.asyncio
+    async def test_get_configs_errors_per_tree(self):
+        """测试批量获取时错误按配置树单独返回"""
+        fs = AivkFS.getFS("partial")
+        fs.etc.mkdir(parents=True, exist_ok=True)
+        (fs.etc / "bad.json").write_text("{not json", encoding="utf-8")
+
+        results = await AivkConfig.getConfigs(
+            ["partial.good", "partial.bad", "invalid_tree", ("partial.other", "yaml")],
+            defaults={"partial.good": {"ok": True}},
+        )
+
+        assert isinstance(results[0], AivkConfigV1)
+        assert results[0].model_dump()["ok"] is True
+        assert isinstance(results[1], ValueError)
+        assert isinstance(results[2], ValueError)
+        assert isinstance(results[3], ValueError)
+
+    @pytest.mark.asyncio
+    async def test_save_skips_unchanged_config(self):
+        """测试配置未变化时 save() 不写入文件"""
+        config = await AivkConfig.getConfig(tree="dirty.config", default={"count": 0})
+        assert not config.dirty
+
+        # 外部改写文件，未修改的配置保存时不应覆盖它
+        config.path.write_text('{"count": 100}', encoding="utf-8")
+        await config.save()
+        assert json.loads(config.path.read_text(encoding="utf-8"))["count"] == 100
+        assert AivkConfigBase.save_stats["skipped"] == 1
+
+        config.count = 1
+        assert config.dirty
+        await config.save()
+        assert json.loads(config.path.read_text(encoding="utf-8"))["count"] == 1
+        assert not config.dirty
+        assert AivkConfigBase.save_stats["written"] == 1
+
+        # 强制写入忽略脏检查
+        await config.save(force=True)
+        assert AivkConfigBase.save_stats["written"] == 2
+
+    @pytest.mark.asyncio
+    async def test_write_behind_merges_saves(self):
+        """测试延迟写入将多次 save() 合并为一次写入"""
+        config = await AivkConfig.getConfig(tree="behind.config", default={"count": 0})
+        config.write_delay = 0.05
+
+        for i in range(1, 11):
+            config.count = i
+            await config.save()
+
+        # 延迟时间内尚未写入
+        assert json.loads(config.path.read_text(encoding="utf-8"))["count"] == 0
+        assert AivkConfigBase.save_stats["merged"] == 9
+
+        await asyncio.sleep(0.15)
+        assert json.loads(config.path.read_text(encoding="utf-8"))["count"] == 10
+        assert AivkConfigBase.save_stats["written"] == 1
+        assert not AivkConfigBase.pending
+
+    @pytest.mark.asyncio
+    async def test_flush_all_writes_pending(self):
+        """测试 flushAll 立即写入所有等待中的配置"""
+        configs = [
+            await AivkConfig.getConfig(tree=f"flushall.config{i}", default={"v": 0})
+            for i in range(3)
+        ]
+        for config in configs:
+            config.write_delay = 60
+            config.v = 1
+            await config.save()
+        assert len(AivkConfigBase.pending) == 3
+
+        await AivkConfigBase.flushAll()
+
+        assert not AivkConfigBase.pending
+        for config in configs:
+            assert json.loads(config.path.read_text(encoding="utf-8"))["v"] == 1
+        assert AivkConfigBase.save_stats["written"] == 3
+
+    @pytest.mark.asyncio
+    async def test_reload_skips_unchanged_file(self, monkeypatch: pytest.MonkeyPatch):
+        """测试文件未变化时 reload 不重新解析"""
+        config = await AivkConfig.getConfig(tree="stat.config", default={"v": 1})
+
+        calls = 0
+        original_load = AivkConfigV1.load.__func__
+
+        async def counting_load(cls, path, default):
+            nonlocal calls
+            calls += 1
+            return await original_load(cls, path, default)
+
+        monkeypatch.setattr(AivkConfigV1, "load", classmethod(counting_load))
+
+        await config.reload()
+        assert calls == 0
+
+        await config.reload(force=True)
+        assert calls == 1
+
+        # 文件被外部修改后重新加载
+        config.path.write_text('{"v": 22}', encoding="utf-8")
+        await config.reload()
+        assert calls == 2
+        assert config.v == 22
+
+        # 保存后记录新的指纹，不会触发重新加载
+        config.v = 3
+        await config.save()
+        await config.reload()
+        assert calls == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("polling", [False, True])
+    async def test_watch_hot_reload(self, polling: bool, monkeypatch: pytest.MonkeyPatch):
+        """测试热重载：外部修改触发回调，自己保存不触发"""
+        monkeypatch.setattr(AivkWatcher, "delay", 0.05)
+        monkeypatch.setattr(AivkWatcher, "interval", 0.02)
+        config = await AivkConfig.getConfig(tree="watch.config", default={"v": 1})
+
+        seen: list[int] = []
+
+        @config.onReload
+        async def changed(cfg: AivkConfigV1) -> None:
+            seen.append(cfg.v)
+
+        config.watch(polling=polling)
+        try:
+            await asyncio.sleep(0.1)
+
+            # 短时间内多次外部修改只触发一次重新加载
+            for v in (2, 3, 4):
+                config.path.write_text(json.dumps({"v": v, "pad": "x" * v}), encoding="utf-8")
+                await asyncio.sleep(0.01)
+            for _ in range(100):
+                if seen:
+                    break
+                await asyncio.sleep(0.02)
+            await asyncio.sleep(0.15)
+            assert seen == [4]
+            assert config.v == 4
+
+            # 自己保存引起的修改不会回弹为重新加载
+            config.v = 5
+            await config.save()
+            await asyncio.sleep(0.3)
+            assert seen == [4]
+        finally:
+            config.unwatch()
+
+        assert AivkWatcher._instance is None
+
+    def test_diff_only_changed_paths(self):
+        """测试结构化比较只返回变化的路径"""
+        old = {"db": {"pool_size": 5, "host": "a"}, "keep": [1, 2], "gone": 1}
+        new = {"db": {"pool_size": 10, "host": "a"}, "keep": [1, 2], "added": {"x": 1}}
+
+        assert diff(old, new) == {
+            "db.pool_size": (5, 10),
+            "gone": (1, MISSING),
+            "added": (MISSING, {"x": 1}),
+        }
+        assert diff(old, old) == {}
+
+    @pytest.mark.asyncio
+    async def test_reload_key_subscriptions(self):
+        """测试 reload 只应用变化的字段并通知对应订阅"""
+        keys = {f"key{i}": i for i in range(200)}
+        config = await AivkConfig.getConfig(
+            tree="subscribe.config",
+            default={"db": {"pool_size": 5, "host": "localhost"}, **keys},
+        )
+        db = config.db
+
+        events: list[tuple[str, Any, Any]] = []
+
+        @config.onChange("db.pool_size")
+        async def pool(old: Any, new: Any) -> None:
+            events.append(("db.pool_size", old, new))
+
+        @config.onChange("db")
+        async def whole_db(old: Any, new: Any) -> None:
+            events.append(("db", old["pool_size"], new["pool_size"]))
+
+        @config.onChange("db.host")
+        async def host(old: Any, new: Any) -> None:
+            events.append(("db.host", old, new))
+
+        @config.onChange("key7")
+        async def key7(old: Any, new: Any) -> None:
+            events.append(("key7", old, new))
+
+        data = json.loads(config.path.read_text(encoding="utf-8"))
+        data["db"]["pool_size"] = 20
+        data["new_key"] = True
+        config.path.write_text(json.dumps(data), encoding="utf-8")
+
+        await config.reload()
+
+        assert sorted(events) == [("db", 5, 20), ("db.pool_size", 5, 20)]
+        # 未变化的子树原地保留
+        assert config.db is db
+        assert config.db["pool_size"] == 20
+        assert config.new_key is True
+
+        # 删除字段时新值为 MISSING
+        events.clear()
+        del data["key7"]
+        config.path.write_text(json.dumps(data), encoding="utf-8")
+        await config.reload()
+        assert events == [("key7", 7, MISSING)]
+        assert "key7" not in config.model_dump()
+
+    @pytest.mark.asyncio
+    async def test_cache_lru_eviction_flushes_dirty(self):
+        """测试 LRU 淘汰，并在淘汰前写入未保存的修改"""
+        AivkConfig.setCachePolicy(max_entries=2)
+
+        first = await AivkConfig.getConfig(tree="lru.first", default={"v": 0})
+        first.v = 1
+        await AivkConfig.getConfig(tree="lru.second", default={"v": 0})
+        await AivkConfig.getConfig(tree="lru.first")  # 命中，first 变为最近使用
+        await AivkConfig.getConfig(tree="lru.third", default={"v": 0})
+        assert "lru.second#json" not in AivkConfig.config_dict.entries
+
+        await AivkConfig.getConfig(tree="lru.fourth", default={"v": 0})
+        await AivkConfig.config_dict.drain()
+
+        assert "lru.first#json" not in AivkConfig.config_dict.entries
+        assert json.loads(first.path.read_text(encoding="utf-8"))["v"] == 1
+        stats = AivkConfig.cacheStats()
+        assert stats["size"] == 2
+        assert stats["evictions"] == 2
+        assert stats["hits"] == 1
+        assert stats["misses"] == 4
+        # 被淘汰但仍被持有的配置再次获取时返回同一实例，不会有两个实例互相覆盖
+        assert await AivkConfig.getConfig(tree="lru.first") is first
+
+    @pytest.mark.asyncio
+    async def test_cache_ttl_and_weak_refs(self):
+        """测试 TTL 过期与弱引用保留"""
+        AivkConfig.setCachePolicy(ttl=0.05)
+        config = await AivkConfig.getConfig(tree="ttl.config", default={"v": 0})
+        await asyncio.sleep(0.1)
+        # 过期但仍被持有：返回同一实例
+        assert await AivkConfig.getConfig(tree="ttl.config") is config
+        assert AivkConfig.cacheStats()["expirations"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cache_ttl_reloads_unheld(self, monkeypatch: pytest.MonkeyPatch):
+        """测试过期且未被持有的配置重新加载，未再访问的过期条目被清除"""
+        monkeypatch.setattr(SlowConfig, "delay", 0)
+        SlowConfig.load_count = 0
+        AivkConfig.setCachePolicy(ttl=0.05)
+        await AivkConfig.getConfig(tree="ttl.unheld", default={"v": 0}, base=SlowConfig)
+        await asyncio.sleep(0.1)
+        misses = AivkConfig.cacheStats()["misses"]
+        await AivkConfig.getConfig(tree="ttl.unheld", base=SlowConfig)
+        assert SlowConfig.load_count == 2
+        assert AivkConfig.cacheStats()["misses"] == misses + 1
+
+        for i in range(20):
+            await AivkConfig.getConfig(tree=f"ttl.sweep{i}", default={"v": i})
+        await asyncio.sleep(0.1)
+        await AivkConfig.getConfig(tree="ttl.last", default={"v": 0})
+        assert list(AivkConfig.config_dict.entries) == ["ttl.last#json"]
+
+    @pytest.mark.asyncio
+    async def test_cache_weak_refs(self):
+        """测试淘汰后仍被持有的配置返回同一实例"""
+        AivkConfig.setCachePolicy(max_entries=1, weak=True)
+        held = await AivkConfig.getConfig(tree="weak.held", default={"v": 0})
+        await AivkConfig.getConfig(tree="weak.other", default={"v": 0})
+        assert "weak.held#json" not in AivkConfig.config_dict.entries
+        # 仍被持有的配置返回同一实例
+        assert await AivkConfig.getConfig(tree="weak.held") is held
+
+    @pytest.mark.asyncio
+    async def test_cache_eviction_keeps_shared_engine(self, monkeypatch: pytest.MonkeyPatch):
+        """测试淘汰 SQLite 句柄时不释放共享引擎"""
+        AivkConfig.setCachePolicy(max_entries=1)
+        handle = await AivkConfig.getConfig(tree="evict.engine", format="sqlite")
+
+        disposed: list[AsyncEngine] = []
+        original = AsyncEngine.dispose
+
+        async def dispose(self: AsyncEngine, close: bool = True) -> None:
+            disposed.append(self)
+            await original(self, close)
+
+        monkeypatch.setattr(AsyncEngine, "dispose", dispose)
+        await AivkConfig.getConfig(tree="evict.config", default={"v": 0})
+        await AivkConfig.config_dict.drain()
+        assert disposed == []
+
+        # 被淘汰的句柄仍可使用
+        async with handle.begin() as conn:
+            assert (await conn.execute(text("SELECT 1"))).scalar() == 1
+
+    @pytest.mark.asyncio
+    async def test_sqlite_shared_engine(self):
+        """测试所有配置树共享一个经过调优的 SQLite 引擎"""
+        a = await AivkConfig.getConfig(tree="shared.a", format="sqlite")
+        b = await AivkConfig.getConfig(tree="shared.b", format="sqlite")
+
+        assert a is not b
+        assert a.sync_engine.pool is b.sync_engine.pool
+        assert a.get_execution_options()["aivk_tree"] == "shared.a"
+        assert AivkSqlite.getEngine(AivkFS.root / "aivk.db") is AivkConfig.engine
+        assert AivkSqlite.tablePrefix("shared.a") == "shared__a__"
+
+        async with a.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+        await AivkSqlite.disposeAll()
+
+    @pytest.mark.asyncio
+    async def test_sqlite_kv_format(self, monkeypatch: pytest.MonkeyPatch):
+        """测试 sqlite-kv 格式：与文件格式相同的 load/save/reload 接口，只写入变化的键"""
+        config = await AivkConfig.getConfig(
+            tree="kvapp.db.settings",
+            default={"host": "localhost", "port": 5432, "pool": {"size": 5}},
+            format="sqlite-kv",
+        )
+        assert isinstance(config, AivkConfigV1)
+        assert tree_of(config.path) == "kvapp.db.settings"
+        assert not config.path.exists()
+
+        written: list[int] = []
+        original = AivkKVStore.save.__func__
+
+        async def save(cls, path, data, previous):
+            written.append(await original(cls, path, data, previous))
+            return written[-1]
+
+        monkeypatch.setattr(AivkKVStore, "save", classmethod(save))
+
+        config.port = 6543
+        del config.host
+        await config.save()
+        assert written == [2]
+
+        await config.save()
+        assert written == [2]
+
+        AivkConfig.config_dict.clear()
+        again = await AivkConfig.getConfig(tree="kvapp.db.settings", format="sqlite-kv")
+        assert again is not config
+        assert again.model_dump() == config.model_dump()
+        assert "host" not in again.model_dump()
+
+        await again.reload()
+        assert again.port == 6543
+
+        # 只在首次创建时写入默认配置：所有键被删除后保持为空
+        path = again.path.with_name("empty.sqlite-kv")
+        assert await AivkKVStore.load(path, {"a": 1}) == {"a": 1}
+        await AivkKVStore.save(path, {}, {"a": 1})
+        assert await AivkKVStore.load(path, {"a": 1}) == {}
+
+    @pytest.mark.asyncio
+    async def test_sqlite_kv_module_single_query(self):
+        """测试一次查询读取模块的所有 sqlite-kv 配置"""
+        for name in ("a", "b", "sub.c"):
+            await AivkConfig.getConfig(tree=f"kvmod.{name}", default={"name": name}, format="sqlite-kv")
+        await AivkConfig.getConfig(tree="kvmodx.a", default={"name": "other"}, format="sqlite-kv")
+        AivkConfig.config_dict.clear()
+
+        engine = AivkSqlite.getEngine(AivkFS.root / "aivk.db")
+        selects: list[str] = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                selects.append(statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", count)
+        try:
+            configs = await AivkConfig.getModuleConfigs("kvmod")
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+        assert len(selects) == 1
+        assert sorted(configs) == ["kvmod.a", "kvmod.b", "kvmod.sub.c"]
+        assert configs["kvmod.sub.c"].name == "sub.c"
+        assert await AivkConfig.getConfig(tree="kvmod.a", format="sqlite-kv") is configs["kvmod.a"]
+        assert not AivkKVStore._prefetched
+
+    @pytest.mark.asyncio
+    async def test_codec_registry_custom_format(self):
+        """测试注册新的编解码器后即可作为配置格式使用"""
+
+        class UpperJsonCodec(AivkCodec):
+            suffix = "ujson"
+
+            def encode(self, data: dict[Any, Any]) -> bytes:
+                return json.dumps(data, ensure_ascii=False).upper().encode("utf-8")
+
+            def decode(self, raw: bytes) -> dict[Any, Any]:
+                return {k.lower(): v for k, v in json.loads(raw).items()}
+
+        AivkCodec.register(UpperJsonCodec)
+        try:
+            config = await AivkConfig.getConfig(tree="codec.custom", default={"name": "aivk"}, format="ujson")
+            assert config.path.read_text(encoding="utf-8") == '{"NAME": "AIVK"}'
+            assert config.name == "AIVK"
+
+            config.name = "changed"
+            await config.save()
+            AivkConfig.config_dict.clear()
+            again = await AivkConfig.getConfig(tree="codec.custom", format="ujson")
+            assert again.name == "CHANGED"
+        finally:
+            AivkCodec.codecs.pop("ujson", None)
+            AivkCodec.implementations.pop("ujson", None)
+
+    def test_codec_fallback_when_missing(self):
+        """测试依赖未安装时保持当前实现"""
+
+        class MissingCodec(JsonCodec):
+            name = "missing"
+
+            def __init__(self):
+                raise ImportError("No module named 'missing'")
+
+        AivkCodec.register(MissingCodec)
+        try:
+            assert AivkCodec.use("json", "missing") is False
+            assert AivkCodec.get("json").name == "stdlib"
+            with pytest.raises(ValueError, match="Unknown codec"):
+                AivkCodec.use("json", "nope")
+            with pytest.raises(ValueError, match="Unsupported file format"):
+                AivkCodec.get("yaml")
+        finally:
+            AivkCodec.implementations["json"].pop("missing", None)
+
+    @pytest.mark.asyncio
+    async def test_codec_optional_implementations(self):
+        """测试 orjson / msgpack（已安装时）"""
+        pytest.importorskip("orjson")
+        pytest.importorskip("msgpack")
+
+        # 不同实现写入的内容相同
+        document = {"v": [1, {"a": None}], "s": "中文", "empty": {}, "f": 1.5}
+        assert AivkCodec.implementations["json"]["orjson"]().encode(document) == JsonCodec().encode(document)
+        with pytest.raises(TypeError):
+            AivkCodec()  # type: ignore[abstract]
+
+        assert AivkCodec.use("json", "orjson") is True
+        try:
+            config = await AivkConfig.getConfig(tree="codec.fast", default={"v": [1, 2], "s": "中文"})
+            config.v = [3]
+            await config.save()
+            assert json.loads(config.path.read_text(encoding="utf-8")) == {**config.model_dump()}
+        finally:
+            AivkCodec.use("json", "stdlib")
+
+        packed = await AivkConfig.getConfig(tree="codec.packed", default={"v": 1, "nested": {"a": True}}, format="msgpack")
+        assert packed.path.suffix == ".msgpack"
+        packed.v = 2
+        await packed.save()
+        AivkConfig.config_dict.clear()
+        again = await AivkConfig.getConfig(tree="codec.packed", format="msgpack")
+        assert again.model_dump() == packed.model_dump()
+
+    @pytest.mark.asyncio
+    async def test_atomic_save(self, monkeypatch: pytest.MonkeyPatch):
+        """测试原子写入：并发保存不会交错，失败时保留原文件且不留临时文件"""
+        config = await AivkConfig.getConfig(tree="atomic.config", default={"v": 0, "blob": ""})
+
+        async def save(i: int) -> None:
+            config.v = i
+            config.blob = str(i) * 10000
+            await config.save(force=True)
+
+        await asyncio.gather(*(save(i) for i in range(20)))
+        data = json.loads(config.path.read_text(encoding="utf-8"))
+        assert data["blob"] == str(data["v"]) * 10000
+        assert [p.name for p in config.path.parent.iterdir()] == ["config.json"]
+
+        def broken_replace(src: Any, dst: Any) -> None:
+            raise OSError("disk full")
+
+        before = config.path.read_bytes()
+        monkeypatch.setattr("aivk.config.atomic.os.replace", broken_replace)
+        config.v = -1
+        with pytest.raises(OSError, match="disk full"):
+            await config.save()
+        assert config.path.read_bytes() == before
+        assert [p.name for p in config.path.parent.iterdir()] == ["config.json"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("mode", ["never", "always", "batch"])
+    async def test_fsync_modes(self, mode: str, monkeypatch: pytest.MonkeyPatch):
+        """测试 fsync 策略"""
+        monkeypatch.setattr(AivkAtomicWriter, "stats", type(AivkAtomicWriter.stats)())
+        monkeypatch.setattr(AivkAtomicWriter, "pending", set())
+        monkeypatch.setattr(AivkAtomicWriter, "mode", "never")
+        monkeypatch.setattr(AivkAtomicWriter, "interval", 60)
+        AivkAtomicWriter.configure(mode)
+
+        fsynced: list[int] = []
+        real_fsync = os.fsync
+        monkeypatch.setattr("aivk.config.atomic.os.fsync", lambda fd: fsynced.append(fd) or real_fsync(fd))
+
+        config = await AivkConfig.getConfig(tree="fsync.config", default={"v": 0})
+        for i in range(1, 4):
+            config.v = i
+            await config.save()
+
+        match mode:
+            case "never":
+                assert fsynced == []
+            case "always":
+                # 每次写入 fsync 文件和目录
+                assert len(fsynced) == 2 * AivkAtomicWriter.stats["writes"]
+            case "batch":
+                assert fsynced == []
+                assert AivkAtomicWriter.pending == {config.path}
+                await AivkConfigBase.flushAll()
+                assert len(fsynced) == 2
+                assert AivkAtomicWriter.stats["batches"] == 1
+
+        with pytest.raises(ValueError, match="Unsupported fsync mode"):
+            AivkAtomicWriter.configure("sometimes")  # type: ignore[arg-type]
+
+    @pytest.mark.asyncio
+    async def test_transaction_single_write(self, monkeypatch: pytest.MonkeyPatch):
+        """测试事务：多次修改只写入一次、通知一次，无净变化时不写入"""
+        config = await AivkConfig.getConfig(tree="tx.config", default={"host": "localhost", "port": 80, "debug": False})
+        writes: list[Path] = []
+        real_write = AivkAtomicWriter.write
+
+        async def counting_write(path: Path, data: bytes) -> None:
+            writes.append(path)
+            await real_write(path, data)
+        monkeypatch.setattr(AivkAtomicWriter, "write", counting_write)
+
+        notified: list[tuple[Any, Any]] = []
+
+        @config.onChange("port")
+        async def port_changed(old: Any, new: Any):
+            notified.append((old, new))
+
+        async with config.transaction():
+            config.host = "0.0.0.0"
+            await config.save()
+            config.port = 8080
+            await config.save()
+            # 嵌套事务并入外层
+            async with config.transaction():
+                config.port = 8081
+            assert writes == []
+            assert config.in_transaction
+
+        assert len(writes) == 1
+        assert notified == [(80, 8081)]
+        assert json.loads(config.path.read_text(encoding="utf-8"))["port"] == 8081
+        assert not config.in_transaction
+
+        # 净变化为空：不写入也不通知
+        async with config.transaction():
+            config.port = 1
+            config.port = 8081
+        assert len(writes) == 1
+        assert len(notified) == 1
+
+    @pytest.mark.asyncio
+    async def test_transaction_rollback(self):
+        """测试事务回滚：异常或验证失败时恢复内存，不触碰文件"""
+        path = self.temp_root / "tx" / "port.json"
+        config = await PortConfig.load(path, {"port": 80, "db": {"pool": 5}})
+        before = path.read_bytes()
+
+        with pytest.raises(RuntimeError):
+            async with config.transaction():
+                config.port = 9000
+                config.db["pool"] = 50
+                config.extra_field = True
+                raise RuntimeError("boom")
+        assert config.port == 80
+        assert config.db == {"pool": 5}
+        assert not hasattr(config, "extra_field")
+        assert not config.dirty
+
+        # 提交时统一验证，失败同样回滚
+        with pytest.raises(ValueError):
+            async with config.transaction():
+                config.db["pool"] = 10
+                config.port = "not a port"
+        assert config.port == 80
+        assert config.db == {"pool": 5}
+        assert path.read_bytes() == before
+
+        # 验证通过时应用类型转换
+        async with config.transaction():
+            config.port = "8080"
+        assert config.port == 8080
+        assert json.loads(path.read_text(encoding="utf-8"))["port"] == 8080
+
+    @pytest.mark.asyncio
+    async def test_transaction_concurrent(self):
+        """测试不同任务对同一配置的事务依次执行，互不并入、互不回滚"""
+        config = await AivkConfig.getConfig(tree="tx.concurrent", default={"a": 0, "b": 0})
+        entered = asyncio.Event()
+        release = asyncio.Event()
+
+        async def first():
+            async with config.transaction():
+                config.a = 1
+                entered.set()
+                await release.wait()
+                raise RuntimeError("boom")
+
+        async def second():
+            await entered.wait()
+            async with config.transaction():
+                config.b = 2
+
+        tasks = [asyncio.create_task(first()), asyncio.create_task(second())]
+        await entered.wait()
+        await asyncio.sleep(0.01)
+        # 第二个事务等待第一个结束，尚未修改
+        assert config.b == 0
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert isinstance(results[0], RuntimeError) and results[1] is None
+        assert config.a == 0 and config.b == 2  # type: ignore[attr-defined]
+        saved = json.loads(config.path.read_text(encoding="utf-8"))
+        assert (saved["a"], saved["b"]) == (0, 2)
+        assert not config.in_transaction
+
+    @pytest.mark.asyncio
+    async def test_transaction_outside_save(self):
+        """测试事务之外的任务保存：等待事务结束后写入，其赋值不随事务回滚"""
+        config = await AivkConfig.getConfig(tree="tx.outside", default={"a": 0, "b": 0})
+        entered = asyncio.Event()
+        release = asyncio.Event()
+
+        async def first():
+            async with config.transaction():
+                config.a = 1
+                entered.set()
+                await release.wait()
+                raise RuntimeError("boom")
+
+        async def second():
+            await entered.wait()
+            config.b = 42
+            await config.save()
+
+        tasks = [asyncio.create_task(first()), asyncio.create_task(second())]
+        await entered.wait()
+        await asyncio.sleep(0.01)
+        # 保存等待事务结束，不写入事务的中间状态
+        assert not tasks[1].done()
+        assert json.loads(config.path.read_text(encoding="utf-8"))["a"] == 0
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert isinstance(results[0], RuntimeError) and results[1] is None
+        assert (config.a, config.b) == (0, 42)  # type: ignore[attr-defined]
+        saved = json.loads(config.path.read_text(encoding="utf-8"))
+        assert (saved["a"], saved["b"]) == (0, 42)
+        assert not config.dirty
+
+    @pytest.mark.asyncio
+    async def test_flush_all_report(self):
+        """测试 flushAll 并发写入所有存活配置并报告结果"""
+        clean = await AivkConfig.getConfig(tree="lifecycle.clean", default={"v": 0})
+        dirty = await AivkConfig.getConfig(tree="lifecycle.dirty", default={"v": 0})
+        behind = await AivkConfig.getConfig(tree="lifecycle.behind", default={"v": 0})
+        broken = await AivkConfig.getConfig(tree="lifecycle.broken", default={"v": 0})
+        slow = await SlowWriteConfig.load(self.temp_root / "lifecycle" / "slow.json", {"v": 0})
+
+        dirty.v = 1
+        behind.write_delay = 60
+        behind.v = 1
+        await behind.save()
+        # 父路径是文件，写入必然失败
+        blocker = self.temp_root / "blocker"
+        blocker.write_text("", encoding="utf-8")
+        broken.path = blocker / "broken.json"
+        broken.v = 1
+        slow.v = 1
+
+        report = await AivkConfigBase.flushAll(timeout=0.2)
+
+        assert sorted(report.flushed) == sorted([dirty.path, behind.path])
+        assert list(report.failed) == [broken.path]
+        assert report.timed_out == [slow.path]
+        assert not report.ok
+        assert not AivkConfigBase.pending
+        assert json.loads(dirty.path.read_text(encoding="utf-8"))["v"] == 1
+        assert json.loads(behind.path.read_text(encoding="utf-8"))["v"] == 1
+        # 超时的写入被取消，文件保持旧内容
+        assert json.loads(slow.path.read_text(encoding="utf-8"))["v"] == 0
+        assert not clean.dirty
+
+    @pytest.mark.asyncio
+    async def test_atomic_write_cancelled_in_thread(self, monkeypatch: pytest.MonkeyPatch):
+        """测试 AivkAtomicWriter.write：取消时线程中尚未替换的写入被放弃，原文件保留"""
+        path = self.temp_root / "cancel" / "file.json"
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"old")
+        started, gate = threading.Event(), threading.Event()
+        real_chmod = os.chmod
+
+        def slow_chmod(*args: Any, **kwargs: Any) -> None:
+            started.set()
+            gate.wait(5)
+            real_chmod(*args, **kwargs)
+        monkeypatch.setattr(os, "chmod", slow_chmod)
+
+        task = asyncio.create_task(AivkAtomicWriter.write(path, b"new"))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        gate.set()
+        for _ in range(100):  # 等待线程中的写入结束
+            if AivkIO.running == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert path.read_bytes() == b"old"
+        assert [p.name for p in path.parent.iterdir()] == ["file.json"]
+
+    @pytest.mark.asyncio
+    async def test_gc_does_not_autosave(self):
+        """测试配置被回收时不再自动安排写入，登记表不延长生命周期"""
+        config = await AivkConfig.getConfig(tree="lifecycle.gc", default={"v": 0})
+        path = config.path
+        AivkConfig.config_dict.clear()
+        config.v = 1
+        assert len(AivkLifecycle.live) == 1
+
+        del config
+        gc.collect()
+        await asyncio.sleep(0)
+
+        assert len(AivkLifecycle.live) == 0
+        assert json.loads(path.read_text(encoding="utf-8"))["v"] == 0
+        report = await AivkConfigBase.flushAll()
+        assert report.flushed == []
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not hasattr(signal, "SIGTERM") or os.name == "nt", reason="需要 POSIX 信号")
+    async def test_sigterm_flushes(self, monkeypatch: pytest.MonkeyPatch):
+        """测试收到 SIGTERM 时先写入未保存的配置再退出"""
+        killed: list[int] = []
+        monkeypatch.setattr("aivk.config.lifecycle.os.kill", lambda pid, signum: killed.append(signum))
+        config = await AivkConfig.getConfig(tree="lifecycle.sigterm", default={"v": 0})
+        config.v = 1
+
+        assert AivkLifecycle.installSignals()
+        signal.raise_signal(signal.SIGTERM)
+        for _ in range(100):
+            if killed:
+                break
+            await asyncio.sleep(0.01)
+
+        assert killed == [signal.SIGTERM]
+        assert json.loads(config.path.read_text(encoding="utf-8"))["v"] == 1
+
+    @pytest.mark.asyncio
+    async def test_io_executor_single_hop(self, monkeypatch: pytest.MonkeyPatch):
+        """测试配置读写在专用线程池中各只需一次线程切换"""
+        hops: list[str] = []
+        real_run = AivkIO.run
+
+        async def counting_run(func: Any, *args: Any) -> Any:
+            hops.append(getattr(func, "__name__", repr(func)))
+            return await real_run(func, *args)
+        monkeypatch.setattr(AivkIO, "run", counting_run)
+        AivkIO.resetMetrics()
+
+        # 新建：读取失败后在同一次切换内写入默认配置
+        config = await AivkConfig.getConfig(tree="io.config", default={"v": 0})
+        assert hops == ["_read_or_create"]
+
+        config.v = 1
+        await config.save()
+        assert hops == ["_read_or_create", "write_sync"]
+
+        # 已存在的文件
+        await config.reload(force=True)
+        assert hops[-1] == "_read_or_create" and len(hops) == 3
+
+        threads: set[str] = set()
+        await AivkIO.run(lambda: threads.add(threading.current_thread().name))
+        assert all(name.startswith("aivk-io") for name in threads)
+
+        metrics = AivkIO.metrics()
+        assert metrics["calls"] == 4
+        assert metrics["queued"] == 0 and metrics["running"] == 0
+        assert metrics["workers"] == AivkIO.workers
+        assert metrics["max_wait_ms"] >= 0
+
+    @pytest.mark.asyncio
+    async def test_io_executor_bounded(self):
+        """测试线程池大小限制并发，排队深度计入指标"""
+        workers = AivkIO.workers
+        try:
+            AivkIO.configure(2)
+            AivkIO.resetMetrics()
+            active = 0
+            peak = 0
+            lock = threading.Lock()
+
+            def work() -> None:
+                nonlocal active, peak
+                with lock:
+                    active += 1
+                    peak = max(peak, active)
+                time.sleep(0.02)
+                with lock:
+                    active -= 1
+
+            await asyncio.gather(*(AivkIO.run(work) for _ in range(8)))
+            assert peak == 2
+            metrics = AivkIO.metrics()
+            assert metrics["calls"] == 8
+            assert metrics["peak_queued"] >= 6
+
+            # 开始执行前被取消的调用不会一直计入排队
+            AivkIO.configure(1)
+            blocker = threading.Event()
+            running = asyncio.create_task(AivkIO.run(blocker.wait))
+            queued = asyncio.create_task(AivkIO.run(work))
+            await asyncio.sleep(0.01)
+            assert AivkIO.metrics()["queued"] == 1
+            queued.cancel()
+            await asyncio.sleep(0)
+            blocker.set()
+            await running
+            assert AivkIO.metrics()["queued"] == 0 and queued.cancelled()
+            with pytest.raises(ValueError):
+                AivkIO.configure(0)
+        finally:
+            AivkIO.configure(workers)
+
+    def _restart(self) -> None:
+        """模拟重新启动：清空缓存、存活配置与内存中的快照"""
+        AivkConfig.config_dict.clear()
+        AivkLifecycle.live.clear()
+        AivkSnapshot.reset()
+
+    @pytest.mark.asyncio
+    async def test_startup_snapshot(self):
+        """测试启动快照：指纹未变化的配置从快照加载，变化的回退到文件"""
+        AivkSnapshot.enable()
+        trees = [f"snap{i}.config" for i in range(3)]
+        defaults = {tree: {"name": tree, "nested": {"v": 1}} for tree in trees}
+        configs = await AivkConfig.getConfigs(trees, defaults=defaults)
+        assert AivkSnapshot.stats["misses"] == 3
+        await AivkConfigBase.flushAll()
+        assert AivkSnapshot.stats["saves"] == 1
+        assert AivkSnapshot.file().is_file()
+        # 快照未变化时不重复写入
+        assert not await AivkSnapshot.save()
+
+        changed = configs[2].path
+        del configs
+        self._restart()
+        await asyncio.sleep(0.01)
+        changed.write_text(json.dumps({"name": "edited", "nested": {"v": 2}}), encoding="utf-8")
+
+        configs = await AivkConfig.getConfigs(trees, defaults=defaults)
+        assert AivkSnapshot.stats["hits"] == 2
+        assert AivkSnapshot.stats["stale"] == 1
+        assert configs[0].name == "snap0.config"
+        assert configs[2].name == "edited" and configs[2].nested == {"v": 2}
+        assert not any(config.dirty for config in configs)
+
+        # 命中的配置互不共享可变值
+        configs[0].nested["v"] = 100
+        assert configs[0].dirty
+        await configs[0].save()
+        await AivkConfigBase.flushAll()
+
+        self._restart()
+        configs = await AivkConfig.getConfigs(trees, defaults=defaults)
+        assert AivkSnapshot.stats["hits"] == 3
+        assert configs[0].nested == {"v": 100}
+        assert configs[2].name == "edited"
+
+    @pytest.mark.asyncio
+    async def test_startup_snapshot_corrupt(self):
+        """测试损坏的快照被忽略"""
+        AivkSnapshot.enable(self.temp_root / "broken.snapshot")
+        AivkSnapshot.file().write_bytes(b"not a snapshot")
+        config = await AivkConfig.getConfig(tree="snapbad.config", default={"v": 1})
+        assert config.v == 1
+        assert AivkSnapshot.stats["misses"] == 1
+        await AivkConfigBase.flushAll()
+        self._restart()
+        config = await AivkConfig.getConfig(tree="snapbad.config", default={"v": 1})
+        assert AivkSnapshot.stats["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_startup_snapshot_no_pickle(self):
+        """测试快照以 JSON 保存：pickle 数据不会被加载，不能无损转换为 JSON 的配置不记录"""
+        import pickle
+        AivkSnapshot.enable(self.temp_root / "evil.snapshot")
+
+        class Boom:
+            def __reduce__(self) -> Any:
+                return (os.system, ("touch " + str(self.marker),))  # type: ignore[attr-defined]
+        Boom.marker = self.temp_root / "pwned"  # type: ignore[attr-defined]
+        AivkSnapshot.file().write_bytes(pickle.dumps({"version": 1, "entries": Boom()}))
+        config = await AivkConfig.getConfig(tree="snapjson.config", default={"v": 1})
+        other = await AivkConfig.getConfig(tree="snapjson.other", default={"v": 1})
+        other.when = (1, 2)  # tuple 经 JSON 往返后变为 list
+        await other.save()
+        assert not (self.temp_root / "pwned").exists()
+        await AivkConfigBase.flushAll()
+        snapshot = json.loads(AivkSnapshot.file().read_bytes())
+        assert str(config.path) in snapshot["entries"]
+        assert str(other.path) not in snapshot["entries"]
+
+    @pytest.mark.asyncio
+    async def test_journal_format(self):
+        """测试 journal 格式：保存只追加变化的键，加载时重放"""
+        config = await AivkConfig.getConfig(tree="journal.state", format="journal",
+                                            default={"counter": 0, "cursor": "a", "big": "x" * 1000})
+        assert config.path.suffix == ".journal"
+        size = config.path.stat().st_size
+
+        for i in range(1, 11):
+            config.counter = i
+            await config.save()
+        del config.cursor
+        config.seen = True
+        await config.save()
+
+        lines = config.path.read_bytes().splitlines()
+        assert len(lines) == 12
+        assert json.loads(lines[1]) == {"s": {"counter": 1}}
+        assert json.loads(lines[-1]) == {"s": {"seen": True}, "d": ["cursor"]}
+        # 每次追加远小于完整文档
+        assert config.path.stat().st_size - size < 11 * 64
+
+        AivkConfig.config_dict.clear()
+        reloaded = await AivkConfig.getConfig(tree="journal.state", format="journal")
+        assert reloaded.counter == 10
+        assert reloaded.seen is True
+        assert not hasattr(reloaded, "cursor")
+        assert reloaded.big == "x" * 1000
+        assert not reloaded.dirty
+
+    @pytest.mark.asyncio
+    async def test_journal_compaction(self, monkeypatch: pytest.MonkeyPatch):
+        """测试 journal 超过阈值后在后台压缩为检查点，并丢弃不完整的尾部记录"""
+        monkeypatch.setattr(AivkJournal, "threshold", 512)
+        config = await AivkConfig.getConfig(tree="journal.compact", format="journal", default={"counter": 0})
+        config.watch(polling=True)
+        reloads: list[int] = []
+
+        @config.onReload
+        async def reloaded(config: Any):
+            reloads.append(config.counter)
+
+        for i in range(1, 101):
+            config.counter = i
+            await config.save()
+        await AivkJournal.drain()
+
+        assert AivkJournal.stats["compactions"] >= 1
+        assert len(config.path.read_bytes()) < 512 + 64
+        assert not config.stale  # 压缩不被视为外部修改
+        config.unwatch()
+
+        # 崩溃留下的半条记录
+        with open(config.path, "ab") as f:
+            f.write(b'{"s":{"counter":')
+        AivkConfig.config_dict.clear()
+        reloaded_config = await AivkConfig.getConfig(tree="journal.compact", format="journal")
+        assert reloaded_config.counter == 100
+        assert AivkJournal.stats["torn"] == 1
+        reloaded_config.counter = 101
+        await reloaded_config.save()
+        AivkConfig.config_dict.clear()
+        assert (await AivkConfig.getConfig(tree="journal.compact", format="journal")).counter == 101
+        assert reloads == []
+
+    @pytest.mark.asyncio
+    async def test_snapshot_view(self):
+        """测试只读快照：保存、事务提交时发布新版本，旧视图保持不变"""
+        config = await AivkConfig.getConfig(tree="view.config", default={"db": {"pool": 5}, "tags": ["a"]})
+        first = config.snapshot
+        assert isinstance(first, AivkConfigView)
+        assert first.db.pool == 5 and first["db"]["pool"] == 5
+        assert first.tags == ("a",)
+
+        with pytest.raises(TypeError):
+            first.db = {}  # type: ignore[misc]
+        with pytest.raises(TypeError):
+            first.db["pool"] = 1  # type: ignore[index]
+        with pytest.raises(AttributeError):
+            first.missing
+
+        # 未保存的修改不可见
+        config.db["pool"] = 10
+        assert config.snapshot is first
+        await config.save()
+        second = config.snapshot
+        assert second.version == first.version + 1
+        assert second.db.pool == 10
+        assert first.db.pool == 5
+
+        # 延迟写入时事务提交即发布
+        config.write_delay = 60
+        async with config.transaction():
+            config.db["pool"] = 20
+            config.tags = ["a", "b"]
+            assert config.snapshot is second
+        assert config.snapshot.db.pool == 20
+        assert config.snapshot.tags == ("a", "b")
+        plain = config.snapshot.toDict()
+        assert plain["db"] == {"pool": 20} and plain["tags"] == ["a", "b"]
+        await config.flush()
+
+    @pytest.mark.asyncio
+    async def test_snapshot_view_concurrent_reload(self):
+        """测试工作线程读取快照时不会看到应用到一半的重新加载"""
+        config = await AivkConfig.getConfig(tree="view.reload", default={"a": 0, "b": 0})
+        stop = threading.Event()
+        torn: list[tuple[Any, Any]] = []
+        reads = 0
+
+        def reader() -> None:
+            nonlocal reads
+            while not stop.is_set():
+                view = config.snapshot
+                if view.a != view.b:
+                    torn.append((view.a, view.b))
+                reads += 1
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        try:
+            for i in range(1, 51):
+                config.path.write_text(json.dumps({"a": i, "b": i}), encoding="utf-8")
+                await config.reload(force=True)
+                await asyncio.sleep(0)
+        finally:
+            stop.set()
+            thread.join()
+        assert torn == []
+        assert reads > 0
+        assert config.snapshot.a == 50
+
+    @pytest.mark.asyncio
+    async def test_compact_config(self):
+        """测试紧凑配置：共享形状与默认配置，属性访问与保存"""
+        default = {"quota": 100, "region": "eu"}
+        trees = [f"tenant{i}.config" for i in range(3)]
+        configs = await AivkConfig.getConfigs(trees, defaults={tree: default for tree in trees}, base=AivkCompactConfig)
+        assert all(isinstance(config, AivkCompactConfig) for config in configs)
+        first, second, third = configs
+        assert first.quota == 100 and first["region"] == "eu"
+        assert first._shape is second._shape
+        assert first.default is second.default
+        assert not hasattr(first, "__dict__")
+        assert dict(first.default) == default
+        with pytest.raises(TypeError):
+            first.default["quota"] = 1  # type: ignore[index]
+        with pytest.raises(AttributeError):
+            first.missing
+
+        # 修改后登记到存活配置表，由 flushAll 写入
+        first.quota = 200
+        first.owner = "alice"
+        del second.region
+        assert first.dirty and first._shape is not third._shape
+        report = await AivkConfigBase.flushAll()
+        assert sorted(report.flushed) == sorted([first.path, second.path])
+        assert json.loads(first.path.read_text(encoding="utf-8")) == {"quota": 200, "region": "eu", "owner": "alice"}
+        assert json.loads(second.path.read_text(encoding="utf-8")) == {"quota": 100}
+        assert not first.dirty
+
+        # 与完整配置类互相转换
+        full = first.toConfig()
+        assert isinstance(full, AivkConfigV1)
+        assert full.owner == "alice" and full.path == first.path and not full.dirty
+        back = AivkCompactConfig.fromConfig(full)
+        assert {key: back[key] for key in first} == first.model_dump()
+
+        # 形状与默认配置随配置释放，登记表不会持续增长
+        shape_keys = first._shape.keys
+        default_key = json.dumps(default, sort_keys=True)
+        assert shape_keys in AivkCompactConfig.shapes and default_key in AivkCompactConfig.defaults
+        AivkConfig.config_dict.clear()  # 缓存持有已加载的配置
+        del configs, first, second, third, back
+        gc.collect()
+        assert shape_keys not in AivkCompactConfig.shapes
+        assert default_key not in AivkCompactConfig.defaults
+
+    @pytest.mark.asyncio
+    async def test_layered_resolve(self, monkeypatch: pytest.MonkeyPatch):
+        """测试分层解析：类默认值 -> 默认配置 -> 文件 -> 环境变量，缓存与来源"""
+        for name in [k for k in os.environ if k.startswith("AIVK_LAYER_")]:
+            monkeypatch.delenv(name)
+        config = await AivkConfig.getConfig(tree="layer.config", base=PortConfig,
+                                            default={"host": "localhost", "db": {"pool": 5, "timeout": 30}})
+        config.path.write_text(json.dumps({"db": {"pool": 10}, "name": "file"}), encoding="utf-8")
+        await config.reload(force=True)
+
+        resolved = config.resolve()
+        assert resolved.port == 0 and resolved.source("port") == "class"
+        assert resolved.host == "localhost" and resolved.source("host") == "default"
+        assert resolved.db.pool == 10 and resolved.source("db.pool") == "file"
+        assert resolved.db.timeout == 30 and resolved.source("db.timeout") == "default"
+        assert resolved.source("db") == "file"
+        # 各层未变化时返回缓存
+        assert config.resolve() is resolved
+
+        monkeypatch.setenv("AIVK_LAYER__CONFIG___DB__POOL", "20")
+        monkeypatch.setenv("AIVK_LAYER__CONFIG___PORT", "8080")
+        monkeypatch.setenv("AIVK_LAYER__CONFIG___NAME", "from env")
+        # 环境变量每轮事件循环检查一次：同一轮内仍返回缓存，不重新扫描
+        assert config.resolve() is resolved
+        await asyncio.sleep(0)
+        resolved = config.resolve()
+        assert resolved.db.pool == 20 and resolved.source("db.pool") == "env"
+        assert resolved.port == 8080 and resolved.name == "from env"
+        assert resolved.db.timeout == 30
+        assert config.resolve() is resolved
+        # 解析不修改配置本身
+        assert config.db == {"pool": 10} and config.port == 0
+
+        # 文件层变化（保存后发布新快照）时重新合并
+        config.db = {"pool": 1, "timeout": 5}
+        assert config.resolve() is resolved
+        await config.save()
+        resolved = config.resolve()
+        assert resolved.db.timeout == 5 and resolved.source("db.timeout") == "file"
+        assert resolved.db.pool == 20
+
+        monkeypatch.delenv("AIVK_LAYER__CONFIG___DB__POOL")
+        await asyncio.sleep(0)
+        assert config.resolve().db.pool == 1
+
+        # 配置树之间互不冲突：a_b.c / a.b_c，以及嵌套的配置树 layer.config.sub
+        assert env_prefix("a_b.c") != env_prefix("a.b_c")
+        monkeypatch.setenv("AIVK_LAYER__CONFIG__SUB___PORT", "9090")
+        await asyncio.sleep(0)
+        assert config.resolve().port == 8080
+
+    @pytest.mark.asyncio
+    async def test_ctx_venv_cached(self, monkeypatch: pytest.MonkeyPatch):
+        """测试 AivkFS.ctx：异步创建虚拟环境，标记有效时跳过，重复进入不访问文件系统"""
+        monkeypatch.setattr(AivkFS, "_venv_ready", set())
+        monkeypatch.setattr(AivkFS, "_activation", {})
+        commands: list[tuple[str, ...]] = []
+
+        async def fake_run(*cmd: str) -> None:
+            commands.append(cmd)
+            if cmd[0] == "uv" and fail_uv:
+                raise FileNotFoundError("uv")
+            venv = Path(cmd[-1])
+            (venv / "bin").mkdir(parents=True)
+            (venv / "lib" / "python3" / "site-packages").mkdir(parents=True)
+            (venv / "pyvenv.cfg").write_text("home = /usr/bin\n", encoding="utf-8")
+        monkeypatch.setattr(AivkFS, "_run", staticmethod(fake_run))
+        fail_uv = False
+        venv = AivkFS.getFS("aivk").venv
+        cwd = Path.cwd()
+        path_before = list(sys.path)
+
+        async with AivkFS.ctx():
+            assert os.environ["VIRTUAL_ENV"] == str(venv)
+            assert sys.path[0].endswith("site-packages")
+        assert [cmd[0] for cmd in commands] == ["uv"]
+        assert (venv / AivkFS.VENV_MARKER).is_file()
+        assert "VIRTUAL_ENV" not in os.environ or os.environ["VIRTUAL_ENV"] != str(venv)
+        assert sys.path == path_before and Path.cwd() == cwd
+
+        # 重复进入：不执行子进程，也不经过 I/O 线程池
+        hops: list[Any] = []
+        real_run = AivkIO.run
+
+        async def counting_run(func: Any, *args: Any) -> Any:
+            hops.append(func)
+            return await real_run(func, *args)
+        monkeypatch.setattr(AivkIO, "run", counting_run)
+        async with AivkFS.ctx():
+            assert os.environ["VIRTUAL_ENV"] == str(venv)
+        assert len(commands) == 1
+        assert hops == []
+
+        # 新进程：标记有效，跳过创建
+        AivkFS._venv_ready.clear()
+        AivkFS._activation.clear()
+        assert not await AivkFS.ensureVenv(venv)
+        assert len(commands) == 1
+
+        # 解释器不一致：删除重建，uv 不可用时回退到 venv 模块
+        (venv / AivkFS.VENV_MARKER).write_text(json.dumps({"executable": "/old/python", "version": "2.7"}), encoding="utf-8")
+        AivkFS._venv_ready.clear()
+        fail_uv = True
+        assert await AivkFS.ensureVenv(venv)
+        assert commands[-1] == (sys.executable, "-m", "venv", str(venv))
+        assert AivkFS._venv_valid(venv)
+
+    @pytest.mark.asyncio
+    async def test_envs_shared_store(self, monkeypatch: pytest.MonkeyPatch):
+        """测试 AivkEnvs：多个模块并发安装，文件以硬链接共享同一份内容"""
+        monkeypatch.setattr(AivkFS, "_venv_ready", set())
+        commands: list[tuple[str, ...]] = []
+
+        async def fake_run(*cmd: str) -> None:
+            commands.append(cmd)
+            venv = Path(cmd[-1])
+            AivkEnvs.site_packages(venv).mkdir(parents=True)
+            (venv / "pyvenv.cfg").write_text("home = /usr/bin\n", encoding="utf-8")
+        monkeypatch.setattr(AivkFS, "_run", staticmethod(fake_run))
+        monkeypatch.setattr(AivkEnvs, "stats", {"linked": 0, "copied": 0, "objects": 0, "skipped": 0})
+
+        wheel = self.temp_root / "demo-1.0-py3-none-any.whl"
+        with zipfile.ZipFile(wheel, "w") as zf:
+            zf.writestr("demo/__init__.py", "VALUE = 1\n")
+            zf.writestr("demo/util.py", "VALUE = 1\n")  # 内容相同，共享一个对象
+            zf.writestr("demo-1.0.dist-info/METADATA", "Name: demo\nVersion: 1.0\n")
+            zf.writestr("demo-1.0.data/scripts/demo-cli", "#!python\n")
+            zf.writestr("demo-1.0.data/headers/demo.h", "")
+
+        results = await AivkEnvs.provisionAll({f"mod{i}": [wheel] for i in range(3)})
+        assert all(isinstance(venv, Path) for venv in results.values())
+        assert AivkEnvs.stats["objects"] == 3
+        assert all("--without-pip" in cmd or cmd[0] == "uv" for cmd in commands)
+
+        inodes = set()
+        for venv in results.values():
+            site = AivkEnvs.site_packages(venv)  # type: ignore[arg-type]
+            assert (site / "demo" / "__init__.py").read_text() == "VALUE = 1\n"
+            assert (site / "demo-1.0.dist-info" / "METADATA").is_file()
+            assert os.access(venv / "bin" / "demo-cli", os.X_OK)  # type: ignore[operator]
+            assert not (site / "demo-1.0.data").exists()
+            inodes.add(os.stat(site / "demo" / "__init__.py").st_ino)
+            inodes.add(os.stat(site / "demo" / "util.py").st_ino)
+        assert len(inodes) == 1
+        assert not os.access(site / "demo" / "__init__.py", os.W_OK) or os.geteuid() == 0
+
+        usage = AivkEnvs.footprint()
+        assert usage["actual"] < usage["apparent"]
+
+        # 已安装相同的包：跳过
+        await AivkEnvs.provision("mod0", [wheel])
+        assert AivkEnvs.stats["skipped"] == 1 and AivkEnvs.stats["objects"] == 3
+
+        # 硬链接不可用时回退到复制
+        monkeypatch.setattr(os, "link", lambda *args: (_ for _ in ()).throw(OSError("EXDEV")))
+        monkeypatch.setattr("aivk.base.envs._reflink", lambda *args: (_ for _ in ()).throw(OSError("EOPNOTSUPP")))
+        venv = await AivkEnvs.provision("mod3", [wheel])
+        assert AivkEnvs.stats["copied"] == 4
+        assert (AivkEnvs.site_packages(venv) / "demo" / "util.py").read_text() == "VALUE = 1\n"
+
+    @pytest.mark.asyncio
+    async def test_ctx_reentrant(self, monkeypatch: pytest.MonkeyPatch):
+        """测试 AivkFS.ctx：全局可重入，只恢复修改过的键，最后一个退出时执行钩子"""
+        venv = AivkFS.getFS("aivk").venv
+        monkeypatch.setattr(AivkFS, "_venv_ready", {venv})
+        monkeypatch.setattr(AivkFS, "_activation", {venv: ({"VIRTUAL_ENV": str(venv), "AIVK_TEST_CTX": "1"}, ["/venv/site-packages"], str(venv))})
+        monkeypatch.setenv("AIVK_TEST_CTX", "0")
+        exits: list[int] = []
+
+        async def hook() -> None:
+            exits.append(AivkFS._depth)
+        monkeypatch.setattr(AivkFS, "exit_hooks", [hook])
+        cwd, prefix = Path.cwd(), sys.prefix
+        entered = asyncio.Event()
+        release = asyncio.Event()
+
+        async def worker() -> None:
+            async with AivkFS.ctx():
+                entered.set()
+                await release.wait()
+
+        task = asyncio.create_task(worker())
+        await entered.wait()
+        assert os.environ["AIVK_TEST_CTX"] == "1" and sys.prefix == str(venv)
+        async with AivkFS.ctx() as fs:
+            async with AivkFS.ctx():
+                assert AivkFS._depth == 3
+                assert sys.path.count("/venv/site-packages") == 1
+            assert Path.cwd() == fs.home
+            # 其他代码在上下文中设置的环境变量不会被清除
+            os.environ["AIVK_TEST_OTHER"] = "x"
+        assert exits == [] and os.environ["AIVK_TEST_CTX"] == "1"
+        release.set()
+        await task
+
+        assert exits == [0]
+        assert AivkFS._depth == 0 and AivkFS._saved is None
+        assert os.environ["AIVK_TEST_CTX"] == "0"
+        assert os.environ.get("VIRTUAL_ENV") != str(venv)
+        assert os.environ.pop("AIVK_TEST_OTHER") == "x"
+        assert "/venv/site-packages" not in sys.path
+        assert Path.cwd() == cwd and sys.prefix == prefix
+
+    @pytest.mark.asyncio
+    async def test_multi_root(self):
+        """测试 AivkRoot：一个进程内多个相互隔离的根目录"""
+        tenants = [AivkRoot.get(self.temp_root / f"tenant{i}") for i in range(3)]
+        assert AivkRoot.get(self.temp_root / "tenant0") is tenants[0]
+
+        async def work(tenant: AivkRoot, i: int) -> AivkConfigBase:
+            with tenant.use():
+                assert AivkFS.root == tenant.path
+                config = await AivkConfig.getConfig(tree="app.settings", default={"tenant": i})
+                kv = await AivkConfig.getConfig(tree="app.kv", default={"tenant": i}, format="sqlite-kv")
+                kv.tenant = i * 10  # 修改后在上下文之外写入
+                await asyncio.sleep(0)
+                assert AivkFS.getFS("app").home == tenant.path / "home" / "app"
+                return config
+
+        configs = await asyncio.gather(*(work(tenant, i) for i, tenant in enumerate(tenants)))
+        assert [config.tenant for config in configs] == [0, 1, 2]  # type: ignore[attr-defined]
+        assert len({id(config) for config in configs}) == 3
+        for i, tenant in enumerate(tenants):
+            assert configs[i].path == tenant.path / "home" / "app" / "etc" / "settings.json"
+            assert "app.settings#json" in tenant.state["config.cache"]
+        # 默认根目录不受影响
+        assert AivkFS.root == self.temp_root
+        assert "app.settings#json" not in AivkConfig.config_dict
+        assert "app" not in AivkFS.fs
+
+        # 关闭：写入该根目录下未保存的配置并释放其引擎
+        engines = {key for key in AivkSqlite.engines if key.is_relative_to(tenants[1].path)}
+        assert len(engines) == 1
+        await tenants[1].close()
+        assert not any(key.is_relative_to(tenants[1].path) for key in AivkSqlite.engines)
+        assert any(key.is_relative_to(tenants[0].path) for key in AivkSqlite.engines)
+        assert tenants[1].state == {} and AivkRoot.get(tenants[1].path) is not tenants[1]
+        with AivkRoot.get(tenants[1].path).use():
+            kv = await AivkConfig.getConfig(tree="app.kv", format="sqlite-kv")
+            assert kv.tenant == 10  # type: ignore[attr-defined]
+        for tenant in (*tenants, AivkRoot.get(tenants[1].path)):
+            await tenant.close()
+
+    @pytest.mark.asyncio
+    async def test_multi_root_nested(self):
+        """测试嵌套的根目录：写入与启动快照只包括属于该根目录的配置"""
+        AivkSnapshot.enable()
+        outer = AivkRoot.default
+        inner = AivkRoot.get(self.temp_root / "home" / "tenant")
+        config = await AivkConfig.getConfig(tree="app.outer", default={"v": 1})
+        with inner.use():
+            nested = await AivkConfig.getConfig(tree="app.inner", default={"v": 1})
+        assert AivkRoot.of(nested.path) is inner and AivkRoot.of(config.path) is outer
+        config.v = 2  # type: ignore[attr-defined]
+        nested.v = 2  # type: ignore[attr-defined]
+
+        report = await AivkConfigBase.flushAll(root=outer)
+        assert report.flushed == [config.path]
+        assert nested.dirty
+
+        await AivkConfigBase.flushAll()
+        assert set(AivkSnapshot.entries(outer)) == {str(config.path)}
+        assert set(AivkSnapshot.entries(inner)) == {str(nested.path)}
+        assert AivkSnapshot.file(inner) == inner.path / "cache" / "config.snapshot"
+        assert AivkSnapshot.file(inner).exists() and AivkSnapshot.file(outer).exists()
+        await inner.close()
+
+    @pytest.mark.asyncio
+    async def test_cache_store(self, monkeypatch: pytest.MonkeyPatch):
+        """测试 AivkCache：按内容去重、模块与全局预算、LRU 淘汰、索引重启后保留、mmap 读取"""
+        monkeypatch.setattr(AivkCache, "limit", 10_000)
+        monkeypatch.setattr(AivkCache, "mmap_threshold", 2_000)
+        monkeypatch.setattr(AivkCache, "stats", Counter())
+        a, b = AivkFS.getFS("moda").blobs, AivkFS.getFS("modb").blobs
+        assert AivkFS.getFS("moda").blobs is a
+
+        # 内容相同的数据只保存一份
+        digest = await a.put("same", b"x" * 1000)
+        assert await b.put("same", b"x" * 1000) == digest
+        assert AivkCache.stats["dedup"] == 1
+        assert len(list((self.temp_root / "cache" / "objects").rglob("*"))) == 2  # 子目录 + 数据
+        assert (await a.usage())["total"] == 1000
+        assert await a.get("same") == b"x" * 1000
+        assert await a.get("missing") is None
+
+        # 大的条目以 mmap 读取
+        await a.put("big", b"b" * 3000)
+        big = await a.get("big")
+        assert isinstance(big, memoryview) and big.readonly and bytes(big) == b"b" * 3000
+        big.release()
+
+        # 模块预算：淘汰最近最少使用的条目
+        a.budget = 4500
+        await a.get("same")  # 比 big 更近访问
+        await a.put("new", b"n" * 1000)
+        assert await a.get("big") is None
+        assert await a.get("same") == b"x" * 1000
+        assert (await a.usage())["module"] == 2000
+
+        # 删除最后一个引用时删除数据
+        await b.delete("same")
+        await a.delete("same")
+        assert not (self.temp_root / "cache" / "objects" / digest[:2] / digest).exists()
+
+        # 全局预算
+        for i in range(12):
+            await b.put(f"k{i}", bytes([i]) * 1000)
+        usage = await b.usage()
+        assert usage["total"] <= AivkCache.limit
+        assert await b.get("k11") is not None and await b.get("k0") is None
+        assert AivkCache.stats["evictions"] >= 3
+
+        # 重启：关闭根目录后从索引恢复
+        await AivkCache.flushAll()
+        await AivkRoot.current().close()
+        again = AivkFS.getFS("modb").blobs
+        assert again is not b
+        assert await again.usage() == usage
+        assert await again.get("k11") == bytes([11]) * 1000
+
+        # 超出预算的条目被拒绝，不淘汰其他条目
+        a2 = AivkFS.getFS("moda").blobs
+        a2.budget = 4500
+        evictions = AivkCache.stats["evictions"]
+        with pytest.raises(ValueError):
+            await again.put("huge", b"h" * 10_001)
+        with pytest.raises(ValueError):
+            await a2.put("huge", b"h" * 4501)
+        assert AivkCache.stats["evictions"] == evictions
+        assert await again.get("k11") == bytes([11]) * 1000
+
+        # 事务回滚时不删除仍被索引引用的数据
+        await a2.put("keep", b"k" * 500)
+        real_evict = _CacheIndex._evict
+
+        def failing_evict(self: Any, module: str, budget: int | None) -> None:
+            raise RuntimeError("boom")
+        monkeypatch.setattr(_CacheIndex, "_evict", failing_evict)
+        with pytest.raises(RuntimeError):
+            await a2.put("keep", b"m" * 500)
+        monkeypatch.setattr(_CacheIndex, "_evict", real_evict)
+        assert await a2.get("keep") == b"k" * 500
+
+        # 读取时数据丢失：只删除读到的条目，不删除其间并发写入的新数据
+        index = a2.index
+        old = await a2.put("race", b"r" * 100)
+        index.blob(old).unlink()
+        real_blob = _CacheIndex.blob
+        replaced: list[str] = []
+
+        def racing_blob(self: Any, digest: str) -> Path:
+            if digest == old and not replaced:
+                # 读取数据前，另一个写入替换了该条目
+                replaced.append(digest)
+                self.put(a2.module, "race", b"s" * 100, None)
+            return real_blob(self, digest)
+        monkeypatch.setattr(_CacheIndex, "blob", racing_blob)
+        assert await a2.get("race") is None
+        monkeypatch.setattr(_CacheIndex, "blob", real_blob)
+        assert replaced and await a2.get("race") == b"s" * 100
+
+    @pytest.mark.asyncio
+    async def test_ctx_venv_without_marker(self, monkeypatch: pytest.MonkeyPatch):
+        """测试 AivkFS.ensureVenv：旧版本创建的虚拟环境（没有标记文件）解释器一致时保留"""
+        monkeypatch.setattr(AivkFS, "_venv_ready", set())
+        commands: list[tuple[str, ...]] = []
+
+        async def fake_run(*cmd: str) -> None:
+            commands.append(cmd)
+            Path(cmd[-1]).mkdir(parents=True, exist_ok=True)
+            (Path(cmd[-1]) / "pyvenv.cfg").write_text("home = /usr/bin\n", encoding="utf-8")
+        monkeypatch.setattr(AivkFS, "_run", staticmethod(fake_run))
+        venv = AivkFS.getFS("legacy").venv
+        site_packages = venv / "lib" / "python3" / "site-packages"
+        site_packages.mkdir(parents=True)
+        (site_packages / "installed.py").write_text("", encoding="utf-8")
+        home = os.path.dirname(getattr(sys, "_base_executable", sys.executable))
+        version = ".".join(map(str, sys.version_info[:3]))
+        (venv / "pyvenv.cfg").write_text(f"home = {home}\nversion_info = {version}\n", encoding="utf-8")
+
+        assert not await AivkFS.ensureVenv(venv)
+        assert commands == []
+        assert (site_packages / "installed.py").is_file()
+        assert AivkFS._venv_valid(venv) and (venv / AivkFS.VENV_MARKER).is_file()
+
+        # 解释器不一致：旧虚拟环境移至一旁（不删除已安装的包）后重建
+        other = AivkFS.getFS("legacy2").venv
+        other.mkdir(parents=True)
+        (other / "pyvenv.cfg").write_text(f"home = {home}\nversion = 2.7.18\n", encoding="utf-8")
+        (other / "installed.py").write_text("", encoding="utf-8")
+        assert await AivkFS.ensureVenv(other)
+        assert len(commands) == 1
+        assert not (other / "installed.py").exists()
+        [old] = other.parent.glob(f"{other.name}.old-*")
+        assert (old / "installed.py").is_file() and "2.7.18" in (old / "pyvenv.cfg").read_text(encoding="utf-8")
+
+        # 不是虚拟环境的目录拒绝覆盖
+        plain = AivkFS.getFS("legacy3").venv
+        plain.mkdir(parents=True)
+        with pytest.raises(RuntimeError):
+            await AivkFS.ensureVenv(plain)
+
+    @pytest.mark.asyncio
+    async def test_ctx_venv_creator_cancelled(self, monkeypatch: pytest.MonkeyPatch):
+        """测试创建虚拟环境的调用方被取消时，等待同一虚拟环境的调用方重新创建而不是收到 CancelledError"""
+        monkeypatch.setattr(AivkFS, "_venv_ready", set())
+        calls: list[Path] = []
+
+        async def slow_ensure(cls: type[AivkFS], venv: Path, pip: bool) -> bool:
+            calls.append(venv)
+            await asyncio.sleep(0.05)
+            cls._venv_ready.add(venv)
+            return True
+        monkeypatch.setattr(AivkFS, "_ensure_venv", classmethod(slow_ensure))
+
+        venv = AivkFS.getFS("cancelled").venv
+        creator = asyncio.create_task(AivkFS.ensureVenv(venv))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(AivkFS.ensureVenv(venv))
+        await asyncio.sleep(0)
+        creator.cancel()
+        assert await waiter is True
+        assert creator.cancelled()
+        assert calls == [venv, venv]
+        assert not AivkFS._venv_pending
+
+    @pytest.mark.asyncio
+    async def test_envs_concurrent_download_and_import(self, monkeypatch: pytest.MonkeyPatch):
+        """测试 AivkEnvs：相同的需求集合并发下载只运行一次 pip，导入方被取消时等待者重新导入"""
+        downloads: list[tuple[str, ...]] = []
+
+        async def fake_run(*cmd: str) -> None:
+            downloads.append(cmd)
+            dest = Path(cmd[cmd.index("-d") + 1])
+            dest.mkdir(parents=True, exist_ok=True)
+            await asyncio.sleep(0.02)
+            with zipfile.ZipFile(dest / "dl-1.0-py3-none-any.whl", "w") as zf:
+                zf.writestr("dl/__init__.py", "")
+        monkeypatch.setattr(AivkFS, "_run", staticmethod(fake_run))
+
+        results = await asyncio.gather(*(AivkEnvs._download(["dl==1.0"]) for _ in range(3)))
+        assert len(downloads) == 1
+        assert all(len(wheels) == 1 and wheels == results[0] for wheels in results)
+        assert not AivkEnvs._downloads
+
+        wheel = results[0][0]
+        importer = asyncio.create_task(AivkEnvs._import(wheel))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(AivkEnvs._import(wheel))
+        await asyncio.sleep(0)
+        importer.cancel()
+        digest = await waiter
+        assert (AivkEnvs.store() / "packages" / f"{digest}.json").is_file()
+        assert not AivkEnvs._imports
+
+    @pytest.mark.asyncio
+    async def test_envs_update_and_errors(self, monkeypatch: pytest.MonkeyPatch):
+        """测试 AivkEnvs：依赖变化时删除旧文件，拒绝不安全的路径，链接全部失败时不记录为已安装"""
+        monkeypatch.setattr(AivkFS, "_venv_ready", set())
+
+        async def fake_run(*cmd: str) -> None:
+            venv = Path(cmd[-1])
+            AivkEnvs.site_packages(venv).mkdir(parents=True)
+            (venv / "pyvenv.cfg").write_text("home = /usr/bin\n", encoding="utf-8")
+        monkeypatch.setattr(AivkFS, "_run", staticmethod(fake_run))
+
+        def wheel(name: str, files: dict[str, str]) -> Path:
+            path = self.temp_root / f"{name}-1.0-py3-none-any.whl"
+            with zipfile.ZipFile(path, "w") as zf:
+                for filename, content in files.items():
+                    zf.writestr(filename, content)
+            return path
+
+        old = wheel("old", {"old/__init__.py": "", "shared.py": "1"})
+        new = wheel("new", {"new/__init__.py": "", "shared.py": "1"})
+        venv = await AivkEnvs.provision("upd", [old])
+        site = AivkEnvs.site_packages(venv)
+        assert (site / "old" / "__init__.py").is_file()
+        await AivkEnvs.provision("upd", [new])
+        assert not (site / "old" / "__init__.py").exists()
+        assert (site / "new" / "__init__.py").is_file() and (site / "shared.py").is_file()
+
+        # zip slip
+        for name in ("../../escape.py", "/tmp/abs.py", "pkg/../../escape.py"):
+            bad = wheel("bad", {name: "x"})
+            with pytest.raises(ValueError):
+                await AivkEnvs.provision("bad", [bad])
+        assert not (self.temp_root / "escape.py").exists()
+
+        # 链接与复制都失败：抛出异常，不写入安装记录
+        def fail(*args: Any, **kwargs: Any) -> None:
+            raise OSError(28, "No space left on device")
+        monkeypatch.setattr(os, "link", fail)
+        monkeypatch.setattr("aivk.base.envs._reflink", fail)
+        monkeypatch.setattr(shutil, "copy2", fail)
+        with pytest.raises(OSError):
+            await AivkEnvs.provision("full", [new])
+        assert not (AivkFS.getFS("full").venv / ".aivk-packages.json").exists()
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])